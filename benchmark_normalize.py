@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark text normalization throughput
+Compares text_normalize against the regex passes it replaced
+(clean_text_content and the /scrape-url clean-up)
+
+Usage: python benchmark_normalize.py [file.txt ...]
+Without files, a synthetic ~100 KB terms document is used.
+"""
+
+import re
+import sys
+import time
+
+from text_normalize import normalize_text, TextNormalizer
+
+
+def legacy_clean_text_content(text):
+    """clean_text_content as it was in server.py"""
+    if not text:
+        return text
+    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
+    text = re.sub(r' {3,}', ' ', text)
+    text = text.replace('\t', ' ')
+    text = re.sub(r'\r\n', '\n', text)
+    text = re.sub(r'[\u200b-\u200f\u202a-\u202e\ufeff]', '', text)
+    return text.strip()
+
+
+def legacy_scrape_pipeline(text):
+    """/scrape-url clean-up followed by clean_text_content, as scrape_url ran them"""
+    text = re.sub(r'\n\s*\n', '\n\n', text)
+    text = re.sub(r' +', ' ', text)
+    return legacy_clean_text_content(text.strip())
+
+
+def normalize_in_chunks(text, chunk_size=16 * 1024):
+    normalizer = TextNormalizer()
+    parts = [normalizer.feed(text[i:i + chunk_size]) for i in range(0, len(text), chunk_size)]
+    parts.append(normalizer.finish())
+    return ''.join(parts)
+
+
+def normalize_scraped(text):
+    """normalize_text as extract_html_page runs it on scraped pages"""
+    return normalize_text(text, strip_boilerplate=False, collapse_whitespace=True)
+
+
+def synthetic_document(target_chars=100_000):
+    """Terms-like text with CRLF, tabs, runs of spaces, invisible characters and page furniture"""
+    clause = ("{n}.\tLIMITATION OF LIABILITY.   To the maximum extent permitted by law,\xa0the Company\u200b "
+              "shall not be liable for any indirect, incidental   or consequential damages.\r\n")
+    parts = []
+    page = 1
+    while sum(len(part) for part in parts) < target_chars:
+        parts.append("ACME Corp Terms of Service\r\n\r\n\r\n")
+        for n in range(12):
+            parts.append(clause.format(n=page * 12 + n))
+            parts.append("   \r\n" if n % 3 else "\r\n\r\n\r\n")
+        parts.append(f"Page {page} of 40\r\n\f")
+        page += 1
+    return ''.join(parts)
+
+
+def throughput(fn, text, min_seconds=1.0):
+    """MB/s of fn over text, repeated for at least min_seconds"""
+    runs = 0
+    started = time.perf_counter()
+    while True:
+        fn(text)
+        runs += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return runs * len(text.encode('utf-8')) / elapsed / (1024 * 1024)
+
+
+def main():
+    if len(sys.argv) > 1:
+        samples = []
+        for path in sys.argv[1:]:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                samples.append((path, f.read()))
+    else:
+        samples = [('synthetic terms', synthetic_document())]
+
+    candidates = [
+        ('clean_text_content (old)', legacy_clean_text_content),
+        ('scrape clean-up + clean_text_content (old)', legacy_scrape_pipeline),
+        ('normalize_text', normalize_text),
+        ('TextNormalizer, 16 KB chunks', normalize_in_chunks),
+        ('normalize_text, scraping', normalize_scraped),
+    ]
+
+    for name, text in samples:
+        print("=" * 70)
+        print(f"{name}: {len(text):,} characters")
+        print("=" * 70)
+        for label, fn in candidates:
+            output = fn(text)
+            print(f"{label:<45} {throughput(fn, text):8.1f} MB/s  -> {len(output):,} chars")
+        print()
+
+
+if __name__ == "__main__":
+    main()
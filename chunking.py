@@ -0,0 +1,181 @@
+"""
+Document chunking for ClauseCode AI
+Splits long contracts on clause/section boundaries for map-reduce analysis and
+merges the per-chunk structured results back into the /analyze schema
+"""
+import re
+from typing import Dict, List, Optional, Any
+
+SEVERITY_ORDER = ["low", "medium", "high", "critical"]
+
+# A line that starts a new clause/section: "Section 4", "ARTICLE IV", "12.3 ", "§ 5", "(a) "
+_NUMBERED_HEADING_RE = re.compile(
+    r"^[ \t]*(?:"
+    r"(?:section|article|clause|part|schedule|exhibit|appendix)\s+[\dIVXLC]+\b"
+    r"|\d{1,3}(?:\.\d{1,3})*[.)]?\s+\S"
+    r"|§+\s*\d"
+    r"|\([a-z0-9]{1,3}\)\s+\S"
+    r")",
+    re.IGNORECASE,
+)
+# ...or a short all-caps heading line such as "LIMITATION OF LIABILITY"
+_CAPS_HEADING_RE = re.compile(r"^[ \t]*[A-Z][A-Z0-9 ,&'\-]{3,80}$")
+_PARAGRAPH_RE = re.compile(r"\n[ \t]*\n")
+_SENTENCE_END_RE = re.compile(r"(?<=[.;:!?])\s+")
+
+
+def is_heading(block: str) -> bool:
+    """True if the block starts with a clause/section heading line"""
+    first_line = block.lstrip("\n").split("\n", 1)[0]
+    return bool(_NUMBERED_HEADING_RE.match(first_line) or _CAPS_HEADING_RE.match(first_line))
+
+
+def split_blocks(text: str) -> List[str]:
+    """Split text into paragraph blocks, also breaking before heading lines"""
+    blocks: List[str] = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        if not paragraph.strip():
+            continue
+        current: List[str] = []
+        for line in paragraph.split("\n"):
+            if current and is_heading(line):
+                blocks.append("\n".join(current))
+                current = []
+            current.append(line)
+        if current:
+            blocks.append("\n".join(current))
+    return blocks
+
+
+def _hard_split(block: str, max_chars: int) -> List[str]:
+    """Split an oversized block on sentence boundaries, then on whitespace"""
+    pieces: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_END_RE.split(block):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_document(text: str, max_chars: int, min_chars: Optional[int] = None) -> List[str]:
+    """
+    Pack blocks into chunks of at most max_chars
+
+    Once a chunk holds at least min_chars (default half of max_chars), it is
+    closed at the next heading so clauses are not split across chunks.
+    """
+    if len(text) <= max_chars:
+        return [text]
+    if min_chars is None:
+        min_chars = max_chars // 2
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_len = 0
+
+    def flush():
+        nonlocal current, current_len
+        if current:
+            chunks.append("\n\n".join(current))
+        current = []
+        current_len = 0
+
+    for block in split_blocks(text):
+        parts = [block] if len(block) <= max_chars else _hard_split(block, max_chars)
+        for part in parts:
+            added = len(part) + (2 if current else 0)
+            if current and (current_len + added > max_chars
+                            or (current_len >= min_chars and is_heading(part))):
+                flush()
+                added = len(part)
+            current.append(part)
+            current_len += added
+    flush()
+    return chunks
+
+
+def _dedupe(items: List[Any], key=None) -> List[Any]:
+    seen = set()
+    result = []
+    for item in items:
+        marker = key(item) if key else item
+        if isinstance(marker, str):
+            marker = marker.strip().lower()
+        try:
+            if marker in seen:
+                continue
+            seen.add(marker)
+        except TypeError:
+            pass
+        result.append(item)
+    return result
+
+
+def _normalized(value: Any) -> str:
+    return " ".join(str(value or "").lower().split())
+
+
+def _item_key(*fields: str):
+    """Dedupe key for dict items: the given fields together, so only true repeats are dropped"""
+    def key(item: Any) -> Any:
+        if isinstance(item, dict):
+            return tuple(_normalized(item.get(field)) for field in fields)
+        return item
+    return key
+
+
+_section_key = _item_key("title", "content")
+_case_key = _item_key("title", "description")
+
+
+def merge_analyses(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge per-chunk structured results (in document order) into one result
+
+    The summary is the chunk summaries joined; callers that can afford a model
+    call replace it with a consolidated one (see server.consolidate_summary).
+    """
+    merged: Dict[str, Any] = {
+        "summary": "",
+        "severity": "low",
+        "sections": [],
+        "key_findings": [],
+        "recommendations": [],
+        "case_examples": [],
+    }
+    summaries = []
+    severity_rank = 0
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        summary = result.get("summary")
+        if isinstance(summary, str) and summary.strip():
+            summaries.append(summary.strip())
+        severity = str(result.get("severity", "")).lower()
+        if severity in SEVERITY_ORDER:
+            severity_rank = max(severity_rank, SEVERITY_ORDER.index(severity))
+        for field in ("sections", "key_findings", "recommendations", "case_examples"):
+            values = result.get(field)
+            if isinstance(values, list):
+                merged[field].extend(values)
+
+    merged["summary"] = " ".join(_dedupe(summaries))
+    merged["severity"] = SEVERITY_ORDER[severity_rank]
+    merged["sections"] = _dedupe(merged["sections"], key=_section_key)
+    merged["key_findings"] = _dedupe(merged["key_findings"])
+    merged["recommendations"] = _dedupe(merged["recommendations"])
+    merged["case_examples"] = _dedupe(merged["case_examples"], key=_case_key)
+    return merged
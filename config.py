@@ -65,7 +65,99 @@ class AppConfig:
     
     # ElevenLabs TTS API
     ELEVENLABS_API_KEY = get_env_or_secret("ELEVENLABS_API_KEY", "ELEVENLABS_API_KEY")
-    
+
+    # Pooled outbound HTTP clients (one pool per upstream, per worker)
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30.0))
+    HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+
+    # /analyze result cache (memory LRU + optional disk tier; empty dir disables disk)
+    ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() == "true"
+    ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", 256))
+    ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", 24 * 3600))
+    ANALYSIS_CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR", "")
+
+    # Map-reduce analysis of long documents (threshold 0 disables automatic chunking)
+    ANALYSIS_CHUNK_SIZE = int(os.getenv("ANALYSIS_CHUNK_SIZE", 12000))
+    ANALYSIS_CHUNK_THRESHOLD = int(os.getenv("ANALYSIS_CHUNK_THRESHOLD", 30000))
+    ANALYSIS_CHUNK_CONCURRENCY = int(os.getenv("ANALYSIS_CHUNK_CONCURRENCY", 8))
+
+    # Incremental re-analysis: a URL's first analysis is a whole-document one; when it is
+    # analyzed again, only new/changed clauses go to the model (documents shorter than
+    # INCREMENTAL_MIN_CHARS are always analyzed whole)
+    INCREMENTAL_ANALYSIS_ENABLED = os.getenv("INCREMENTAL_ANALYSIS_ENABLED", "true").lower() == "true"
+    INCREMENTAL_MIN_CHARS = int(os.getenv("INCREMENTAL_MIN_CHARS", 8000))
+    INCREMENTAL_UNIT_CHARS = int(os.getenv("INCREMENTAL_UNIT_CHARS", 6000))
+    # Re-analyze the whole document when more than this share of it changed
+    INCREMENTAL_FULL_PASS_RATIO = float(os.getenv("INCREMENTAL_FULL_PASS_RATIO", 0.5))
+    # Snapshots kept in memory when Firestore isn't configured
+    INCREMENTAL_MAX_LOCAL_SNAPSHOTS = int(os.getenv("INCREMENTAL_MAX_LOCAL_SNAPSHOTS", 256))
+
+    # Multi-persona /analyze/batch
+    ANALYSIS_BATCH_MAX_ITEMS = int(os.getenv("ANALYSIS_BATCH_MAX_ITEMS", 10))
+    ANALYSIS_BATCH_CONCURRENCY = int(os.getenv("ANALYSIS_BATCH_CONCURRENCY", 5))
+
+    # Server-side /conversations (history beyond the token budget is summarized)
+    CONVERSATION_MAX_ENTRIES = int(os.getenv("CONVERSATION_MAX_ENTRIES", 1000))
+    CONVERSATION_TTL = float(os.getenv("CONVERSATION_TTL", 2 * 3600))
+    CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", 3000))
+    CONVERSATION_KEEP_MESSAGES = int(os.getenv("CONVERSATION_KEEP_MESSAGES", 4))
+
+    # Server-side document store for extracted text (referenced by doc_id)
+    DOCUMENT_STORE_MAX_ENTRIES = int(os.getenv("DOCUMENT_STORE_MAX_ENTRIES", 500))
+    DOCUMENT_STORE_MAX_CHARS = int(os.getenv("DOCUMENT_STORE_MAX_CHARS", 50_000_000))
+    DOCUMENT_STORE_TTL = float(os.getenv("DOCUMENT_STORE_TTL", 2 * 3600))
+    DOCUMENT_PREVIEW_CHARS = int(os.getenv("DOCUMENT_PREVIEW_CHARS", 500))
+    # /analyze only ever looks at this many characters of a document
+    ANALYSIS_MAX_CHARS = int(os.getenv("ANALYSIS_MAX_CHARS", 100000))
+
+    # Streaming uploads: spooled in memory up to UPLOAD_SPOOL_BYTES, then to a temp file
+    UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 50 * 1024 * 1024))
+    UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", 1024 * 1024))
+    UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR", "")
+
+    # PDF/DOCX extraction pool (0 workers runs extraction in a single thread)
+    EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", 2))
+    EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", 60.0))
+    EXTRACTION_MAX_BYTES = int(os.getenv("EXTRACTION_MAX_BYTES", 50 * 1024 * 1024))
+    EXTRACTION_MAX_PAGES = int(os.getenv("EXTRACTION_MAX_PAGES", 500))
+    # PDFs at least this large are split into page ranges across the workers
+    PDF_PARALLEL_MIN_BYTES = int(os.getenv("PDF_PARALLEL_MIN_BYTES", 1024 * 1024))
+    PDF_STREAM_BATCH_PAGES = int(os.getenv("PDF_STREAM_BATCH_PAGES", 4))
+    # Scraped pages are parsed in their own pool (0 workers parses in a single thread)
+    HTML_PARSE_WORKERS = int(os.getenv("HTML_PARSE_WORKERS", 1))
+
+    # Extracted-text cache for /upload, keyed by file digest + extractor version
+    EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+    EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", 128))
+    EXTRACTION_CACHE_TTL = float(os.getenv("EXTRACTION_CACHE_TTL", 7 * 24 * 3600))
+    EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", "")
+
+    # /scrape-url cache; stale pages are revalidated with If-None-Match / If-Modified-Since
+    SCRAPE_CACHE_ENABLED = os.getenv("SCRAPE_CACHE_ENABLED", "true").lower() == "true"
+    SCRAPE_CACHE_MAX_ENTRIES = int(os.getenv("SCRAPE_CACHE_MAX_ENTRIES", 500))
+    SCRAPE_CACHE_TTL = float(os.getenv("SCRAPE_CACHE_TTL", 3600))
+    # Per-URL TTLs, e.g. "united.com/terms=86400,example.com=600" (0 disables caching)
+    SCRAPE_CACHE_TTL_RULES = os.getenv("SCRAPE_CACHE_TTL_RULES", "")
+    # Largest page /scrape-url will download (enforced while streaming)
+    SCRAPE_MAX_BYTES = int(os.getenv("SCRAPE_MAX_BYTES", 5 * 1024 * 1024))
+    # Keep only the page body (drop nav, banners, footers); clients can override per request
+    SCRAPE_MAIN_CONTENT = os.getenv("SCRAPE_MAIN_CONTENT", "true").lower() == "true"
+
+    # Outbound limits for /scrape-url/batch (single /scrape-url requests are not throttled)
+    SCRAPE_MAX_CONCURRENCY = int(os.getenv("SCRAPE_MAX_CONCURRENCY", 20))
+    SCRAPE_PER_HOST_CONCURRENCY = int(os.getenv("SCRAPE_PER_HOST_CONCURRENCY", 2))
+    # Minimum seconds between request starts to the same host
+    SCRAPE_PER_HOST_INTERVAL = float(os.getenv("SCRAPE_PER_HOST_INTERVAL", 1.0))
+    SCRAPE_BATCH_MAX_URLS = int(os.getenv("SCRAPE_BATCH_MAX_URLS", 100))
+
+    # Event loop lag sampling for /metrics (interval 0 disables the monitor)
+    LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", 0.1))
+    LOOP_LAG_WINDOW = int(os.getenv("LOOP_LAG_WINDOW", 600))
+    # Lag at least this long is logged as a stall
+    LOOP_LAG_WARN_SECONDS = float(os.getenv("LOOP_LAG_WARN_SECONDS", 0.25))
+
     # CSV storage path - disable on cloud deployments (ephemeral filesystem)
     IS_CLOUD_DEPLOYMENT = bool(os.getenv('RAILWAY_ENVIRONMENT_NAME') or os.getenv('K_SERVICE'))
     USE_CSV = not IS_CLOUD_DEPLOYMENT  # Disable CSV on cloud
@@ -82,6 +174,24 @@ class AppConfig:
     # Feature flags
     USE_FIRESTORE = os.getenv("USE_FIRESTORE", "true").lower() == "true"
     
+    # Saved analyses backend: "firestore", "sqlite", or "auto" (Firestore if it
+    # initializes, otherwise SQLite when not on a cloud deployment)
+    DB_BACKEND = os.getenv("DB_BACKEND", "auto").lower()
+    SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join(csv_dir, 'analysis_data.db'))
+    # Reader connections (writes always go through a single writer connection)
+    SQLITE_READERS = int(os.getenv("SQLITE_READERS", 4))
+    
+    # Write-behind /save queue (flushed in batches of up to SAVE_BATCH_SIZE records)
+    SAVE_QUEUE_MAX_SIZE = int(os.getenv("SAVE_QUEUE_MAX_SIZE", 1000))
+    SAVE_BATCH_SIZE = int(os.getenv("SAVE_BATCH_SIZE", 100))
+    SAVE_FLUSH_INTERVAL = float(os.getenv("SAVE_FLUSH_INTERVAL", 0.5))
+    SAVE_MAX_RETRIES = int(os.getenv("SAVE_MAX_RETRIES", 5))
+    SAVE_RETRY_BACKOFF = float(os.getenv("SAVE_RETRY_BACKOFF", 0.5))
+    # Batches that still fail after retries are appended here as JSON lines
+    SAVE_DEAD_LETTER_FILE = os.getenv("SAVE_DEAD_LETTER_FILE", os.path.join(csv_dir, 'save_dead_letter.jsonl'))
+    # Seconds graceful shutdown waits for queued saves before dead-lettering them
+    SAVE_SHUTDOWN_TIMEOUT = float(os.getenv("SAVE_SHUTDOWN_TIMEOUT", 20.0))
+    
     # Google OAuth (prioritize .env, fallback to Secret Manager for Cloud Run)
     GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID") or get_secret_from_gcp("GOOGLE_CLIENT_ID")
     GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET") or get_secret_from_gcp("GOOGLE_CLIENT_SECRET")
@@ -0,0 +1,46 @@
+"""
+Compression for stored page content
+Page text is stored once per distinct content (keyed by its hash) and
+compressed with zstd when the zstandard package is installed, zlib otherwise.
+The codec name is stored next to the data so either can be read back.
+"""
+import zlib
+import hashlib
+import logging
+from typing import Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD = "zstd"
+ZLIB = "zlib"
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 6
+
+
+def content_hash(text: str) -> str:
+    """Key for a page's content (identical text from any user or persona shares it)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compress_text(text: str) -> Tuple[bytes, str]:
+    """Returns: (compressed bytes, codec name)"""
+    raw = text.encode("utf-8")
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw), ZSTD
+    return zlib.compress(raw, ZLIB_LEVEL), ZLIB
+
+
+def decompress_text(data: bytes, codec: str) -> str:
+    """Raises: ValueError for an unknown codec, or zstd data without zstandard installed"""
+    if codec == ZLIB:
+        return zlib.decompress(data).decode("utf-8")
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ValueError("Page content is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown page content codec {codec!r}")
@@ -0,0 +1,153 @@
+"""
+Server-side conversation sessions for ClauseCode AI
+Keeps the stable prompt prefix (document + analysis) and the chat turns on the
+server so follow-up questions only send the new question. Older turns are
+compacted into a rolling summary once they exceed a token budget.
+"""
+import time
+import asyncio
+import secrets
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Any
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+# Rough average for English text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class Conversation:
+    """One chat about a single document/analysis"""
+
+    def __init__(self, conversation_id: str, prefix: List[Dict[str, str]]):
+        self.id = conversation_id
+        self.prefix = prefix
+        self.summary = ""
+        self.turns: List[Dict[str, str]] = []
+        self.turn_count = 0
+        self.lock = asyncio.Lock()
+        self.compacting = False
+        self.created_at = time.time()
+        self.last_used = self.created_at
+
+    def messages(self, question: str) -> List[Dict[str, str]]:
+        """Full message list for the next completion"""
+        messages = list(self.prefix)
+        if self.summary:
+            messages.append({"role": "system", "content": SUMMARY_PREFIX + self.summary})
+        messages.extend(self.turns)
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    def add_turn(self, question: str, answer: str):
+        self.turns.append({"role": "user", "content": question})
+        self.turns.append({"role": "assistant", "content": answer})
+        self.turn_count += 1
+
+    def history_tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(estimate_tokens(t["content"]) for t in self.turns)
+
+    def needs_compaction(self) -> bool:
+        return (not self.compacting
+                and len(self.turns) > config.CONVERSATION_KEEP_MESSAGES
+                and self.history_tokens() > config.CONVERSATION_TOKEN_BUDGET)
+
+    async def compact(self, summarize: Callable[[List[Dict[str, str]]], Awaitable[str]]):
+        """
+        Fold all but the most recent turns into the rolling summary
+
+        summarize(messages) must return the new summary text. Turns appended
+        while the summary is being generated are kept.
+        """
+        if self.compacting:
+            return
+        self.compacting = True
+        try:
+            cut = len(self.turns) - config.CONVERSATION_KEEP_MESSAGES
+            cut -= cut % 2  # keep question/answer pairs together
+            if cut <= 0:
+                return
+            older = self.turns[:cut]
+            to_summarize = []
+            if self.summary:
+                to_summarize.append({"role": "system", "content": SUMMARY_PREFIX + self.summary})
+            to_summarize.extend(older)
+            new_summary = await summarize(to_summarize)
+            self.summary = new_summary.strip()
+            self.turns = self.turns[cut:]
+            logger.info(f"Compacted {cut} messages of conversation {self.id}")
+        except Exception as e:
+            logger.warning(f"Conversation compaction failed for {self.id}: {e}")
+        finally:
+            self.compacting = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "conversation_id": self.id,
+            "turns": self.turn_count,
+            "summary": self.summary,
+            "recent_messages": self.turns,
+        }
+
+
+class ConversationStore:
+    """Bounded, expiring in-memory store of conversations (per worker process)"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self.counters = {"created": 0, "expired": 0, "evicted": 0, "compactions": 0}
+
+    def create(self, prefix: List[Dict[str, str]]) -> Conversation:
+        conversation = Conversation(secrets.token_urlsafe(16), prefix)
+        self.conversations[conversation.id] = conversation
+        self.counters["created"] += 1
+        while len(self.conversations) > self.max_entries:
+            self.conversations.popitem(last=False)
+            self.counters["evicted"] += 1
+        return conversation
+
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        conversation = self.conversations.get(conversation_id)
+        if conversation is None:
+            return None
+        if self.ttl > 0 and time.time() - conversation.last_used > self.ttl:
+            del self.conversations[conversation_id]
+            self.counters["expired"] += 1
+            return None
+        conversation.last_used = time.time()
+        self.conversations.move_to_end(conversation_id)
+        return conversation
+
+    def delete(self, conversation_id: str) -> bool:
+        return self.conversations.pop(conversation_id, None) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "active": len(self.conversations), "max_entries": self.max_entries}
+
+
+# Global store instance (one per worker process)
+_store: Optional[ConversationStore] = None
+
+
+def get_conversations() -> ConversationStore:
+    """Get the conversation store (singleton)"""
+    global _store
+    if _store is None:
+        _store = ConversationStore(
+            max_entries=config.CONVERSATION_MAX_ENTRIES,
+            ttl=config.CONVERSATION_TTL,
+        )
+    return _store
@@ -1,20 +1,140 @@
 """
 Database module for ClauseCode AI
 Uses Firebase Firestore for cloud storage of analysis data
+All calls go through Firestore's async client, so network I/O never blocks
+the worker's event loop
 """
 import os
+import json
+import asyncio
+import base64
 import logging
 from datetime import datetime
-from typing import Dict, Optional, Any
+from typing import Dict, List, Optional, Tuple, Any
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials, firestore, firestore_async
+from google.api_core.exceptions import FailedPrecondition
+
+from config import config
+from content_codec import content_hash, compress_text, decompress_text
 
 logger = logging.getLogger(__name__)
 
 
+# Most writes Firestore accepts in one WriteBatch
+FIRESTORE_BATCH_LIMIT = 500
+# Compressed page content larger than this isn't stored (Firestore documents max out at 1 MiB)
+PAGE_CONTENT_MAX_BYTES = 1_000_000
+
+ANALYSES_COLLECTION = "clausecode_analyses"
+# Page content shared by analyses, keyed by content hash
+PAGE_CONTENTS_COLLECTION = "clausecode_page_contents"
+
+# Fields of an analysis document that listings can project
+ANALYSIS_FIELDS = (
+    "timestamp", "agent", "analysis_type", "page_title", "page_url", "result_text",
+    "created_at", "page_content", "page_content_ref", "page_content_chars", "user_id", "metadata",
+)
+# What a list view needs (view=summary)
+SUMMARY_FIELDS = ("timestamp", "agent", "analysis_type", "page_title", "page_url", "user_id", "page_content_chars")
+
+
+def projection(fields: Optional[List[str]]) -> Optional[List[str]]:
+    """
+    Validated field list for a listing select(), or None for whole documents
+    
+    timestamp is always included because page cursors are built from it.
+    Raises: ValueError for a field analyses don't have
+    """
+    if not fields:
+        return None
+    unknown = [field for field in fields if field not in ANALYSIS_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(["timestamp", *fields]))
+
+
+def analysis_document(timestamp: str,
+                      agent: str,
+                      analysis_type: str,
+                      page_title: str,
+                      page_url: str,
+                      result_text: str,
+                      page_content_ref: Optional[str] = None,
+                      page_content_chars: int = 0,
+                      user_id: Optional[str] = None,
+                      metadata: Optional[Dict[str, Any]] = None,
+                      created_at: Optional[datetime] = None) -> Dict[str, Any]:
+    """Firestore document for a saved analysis (page content is referenced, not inline)"""
+    # Parse timestamp or use current time
+    try:
+        timestamp_dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    except:
+        timestamp_dt = datetime.utcnow()
+    
+    doc_data = {
+        "timestamp": timestamp_dt,
+        "agent": agent,
+        "analysis_type": analysis_type,
+        "page_title": page_title,
+        "page_url": page_url,
+        "result_text": result_text,
+        "created_at": created_at or datetime.utcnow(),
+    }
+    
+    # Add optional fields
+    if page_content_ref:
+        doc_data["page_content_ref"] = page_content_ref
+        doc_data["page_content_chars"] = page_content_chars
+    
+    if user_id:
+        doc_data["user_id"] = user_id
+    
+    if metadata:
+        doc_data["metadata"] = metadata
+    
+    return doc_data
+
+
+def page_content_document(page_content: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """(content hash, compressed content document), or None if it's too large to store"""
+    data, codec = compress_text(page_content)
+    if len(data) > PAGE_CONTENT_MAX_BYTES:
+        logger.warning(f"Page content is {len(data)} bytes compressed, not storing it")
+        return None
+    return content_hash(page_content), {
+        "data": data,
+        "codec": codec,
+        "chars": len(page_content),
+        "created_at": datetime.utcnow(),
+    }
+
+
+def encode_cursor(timestamp: Any, doc_id: str) -> str:
+    """Opaque /analyses page cursor for the last document of a page"""
+    value = timestamp.isoformat() if hasattr(timestamp, "isoformat") else timestamp
+    raw = json.dumps({"t": value, "id": doc_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    """(timestamp, document ID) from encode_cursor; raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        timestamp = data["t"]
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        return timestamp, str(data["id"])
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
 class AnalysisDB:
     """Database service for storing analysis data in Firestore"""
     
+    backend = "firestore"
+    
     def __init__(self):
         self.db = None
         self.initialized = False
@@ -44,9 +164,9 @@ class AnalysisDB:
                         logger.warning("Continuing without Firestore (CSV-only mode)")
                         return
             
-            self.db = firestore.client()
+            self.db = firestore_async.client()
             self.initialized = True
-            logger.info("Firestore client initialized successfully")
+            logger.info("Firestore async client initialized successfully")
             
         except Exception as e:
             logger.error(f"Failed to initialize Firestore: {e}", exc_info=True)
@@ -76,36 +196,18 @@ class AnalysisDB:
             return None
         
         try:
-            # Parse timestamp or use current time
-            try:
-                timestamp_dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            except:
-                timestamp_dt = datetime.utcnow()
-            
-            # Prepare document data
-            doc_data = {
-                "timestamp": timestamp_dt,
+            doc_id = self.new_analysis_id()
+            await self.save_analyses_batch([(doc_id, {
+                "timestamp": timestamp,
                 "agent": agent,
                 "analysis_type": analysis_type,
                 "page_title": page_title,
                 "page_url": page_url,
                 "result_text": result_text,
-                "created_at": datetime.utcnow(),
-            }
-            
-            # Add optional fields
-            if page_content:
-                doc_data["page_content"] = page_content
-            
-            if user_id:
-                doc_data["user_id"] = user_id
-            
-            if metadata:
-                doc_data["metadata"] = metadata
-            
-            # Save to Firestore collection
-            doc_ref = self.db.collection("clausecode_analyses").add(doc_data)
-            doc_id = doc_ref[1].id
+                "page_content": page_content,
+                "user_id": user_id,
+                "metadata": metadata,
+            })])
             
             logger.info(f"✅ Saved analysis to Firestore: {doc_id}")
             return doc_id
@@ -114,18 +216,110 @@ class AnalysisDB:
             logger.error(f"Failed to save to Firestore: {e}", exc_info=True)
             return None
     
-    async def get_analysis(self, doc_id: str) -> Optional[Dict[str, Any]]:
-        """Get a single analysis by document ID"""
+    def new_analysis_id(self) -> Optional[str]:
+        """Reserve a document ID for an analysis that will be written later (no I/O)"""
+        if not self.db:
+            return None
+        return self.db.collection(ANALYSES_COLLECTION).document().id
+    
+    def _analysis_writes(self, doc_id: str, fields: Dict[str, Any], stored: set) -> list:
+        """
+        (document reference, data) writes for one analysis; stored holds content hashes already planned
+
+        A page content write comes first and is only a candidate: save_analyses_batch
+        drops it if the content document already exists.
+        """
+        fields = dict(fields)
+        page_content = fields.pop("page_content", None)
+        writes = []
+        if page_content:
+            content = page_content_document(page_content)
+            if content:
+                content_ref, content_data = content
+                fields["page_content_ref"] = content_ref
+                fields["page_content_chars"] = len(page_content)
+                if content_ref not in stored:
+                    stored.add(content_ref)
+                    writes.append((self.db.collection(PAGE_CONTENTS_COLLECTION).document(content_ref), content_data))
+        writes.append((self.db.collection(ANALYSES_COLLECTION).document(doc_id), analysis_document(**fields)))
+        return writes
+    
+    async def _existing_page_contents(self, refs: list) -> set:
+        """Content hashes among refs that already have a clausecode_page_contents document"""
+        if not refs:
+            return set()
+        return {snapshot.id async for snapshot in self.db.get_all(refs, field_paths=["chars"]) if snapshot.exists}
+    
+    async def save_analyses_batch(self, analyses: List[Tuple[str, Dict[str, Any]]]):
+        """
+        Write (document ID, save_analysis fields) pairs in WriteBatches
+        
+        Page content is stored once per distinct text in clausecode_page_contents
+        and committed in the same batch as the analyses that reference it. Content
+        that already exists isn't rewritten, only its referenced_at is touched, which
+        also keeps delete_analysis from removing it mid-save. New content is written
+        with create, so a batch that races another save or a delete fails, and the
+        retry sees the content's current state. Analyses are idempotent sets.
+        Raises: the Firestore error if a commit fails
+        """
+        if not self.db:
+            raise RuntimeError("Firestore not available")
+        
+        stored = set()
+        planned = [self._analysis_writes(doc_id, fields, stored) for doc_id, fields in analyses]
+        content_refs = [ref for writes in planned for ref, _ in writes[:-1]]
+        existing = await self._existing_page_contents(content_refs)
+        
+        batch, size = self.db.batch(), 0
+        for writes in planned:
+            if size + len(writes) > FIRESTORE_BATCH_LIMIT:
+                await batch.commit()
+                batch, size = self.db.batch(), 0
+            for ref, data in writes[:-1]:
+                if ref.id in existing:
+                    batch.update(ref, {"referenced_at": firestore.SERVER_TIMESTAMP})
+                else:
+                    batch.create(ref, data)
+            ref, data = writes[-1]
+            batch.set(ref, data)
+            size += len(writes)
+        if size:
+            await batch.commit()
+        logger.info(f"✅ Saved {len(analyses)} analyses to Firestore in a batch")
+    
+    async def get_page_content(self, content_ref: str) -> Optional[str]:
+        """Decompressed page content by content hash"""
         if not self.db:
             return None
         
         try:
-            doc_ref = self.db.collection("clausecode_analyses").document(doc_id)
-            doc = doc_ref.get()
+            doc = await self.db.collection(PAGE_CONTENTS_COLLECTION).document(content_ref).get()
+            if not doc.exists:
+                return None
+            data = doc.to_dict()
+            return decompress_text(data["data"], data["codec"])
             
-            if doc.exists:
-                return doc.to_dict()
+        except Exception as e:
+            logger.error(f"Failed to get page content: {e}")
             return None
+    
+    async def get_analysis(self, doc_id: str, include_content: bool = True) -> Optional[Dict[str, Any]]:
+        """Get a single analysis by document ID (with its page content unless include_content=False)"""
+        if not self.db:
+            return None
+        
+        try:
+            doc_ref = self.db.collection(ANALYSES_COLLECTION).document(doc_id)
+            doc = await doc_ref.get()
+            
+            if not doc.exists:
+                return None
+            
+            data = doc.to_dict()
+            # Older analyses store page_content inline
+            if include_content and data.get("page_content_ref") and "page_content" not in data:
+                data["page_content"] = await self.get_page_content(data["page_content_ref"])
+            return data
             
         except Exception as e:
             logger.error(f"Failed to get analysis: {e}")
@@ -135,89 +329,204 @@ class AnalysisDB:
                            limit: int = 50,
                            agent: Optional[str] = None,
                            analysis_type: Optional[str] = None,
-                           user_id: Optional[str] = None) -> list:
+                           user_id: Optional[str] = None,
+                           fields: Optional[List[str]] = None) -> list:
         """
-        List analyses with optional filtering
+        List analyses with optional filtering (first page only, see list_analyses_page)
         
         Args:
             limit: Maximum number of results
             agent: Filter by agent/persona
             analysis_type: Filter by analysis type
             user_id: Filter by user ID
+            fields: Only return these fields (e.g. SUMMARY_FIELDS)
+        """
+        results, _ = await self.list_analyses_page(
+            limit=limit, agent=agent, analysis_type=analysis_type, user_id=user_id, fields=fields
+        )
+        return results
+    
+    async def list_analyses_page(self,
+                                limit: int = 50,
+                                agent: Optional[str] = None,
+                                analysis_type: Optional[str] = None,
+                                user_id: Optional[str] = None,
+                                cursor: Optional[str] = None,
+                                fields: Optional[List[str]] = None) -> Tuple[list, Optional[str]]:
+        """
+        One page of analyses, newest first, filtered server-side
+        
+        Each combination of filters needs a composite index (firestore.indexes.json).
+        
+        Args:
+            limit: Page size
+            agent / analysis_type / user_id: Equality filters
+            cursor: next_cursor from the previous page
+            fields: Only read these fields (a Firestore projection); "id" is always included
+        
+        Returns: (analyses, next_cursor); next_cursor is None on the last page
+        Raises: ValueError for a malformed cursor or unknown field
         """
         if not self.db:
-            return []
+            return [], None
+        
+        after = decode_cursor(cursor) if cursor else None
+        selected = projection(fields)
         
         try:
-            # Start with base query - fetch more than limit for client-side filtering
-            fetch_limit = limit * 10 if (agent or analysis_type or user_id) else limit
-            query = self.db.collection("clausecode_analyses")
+            query = self.db.collection(ANALYSES_COLLECTION)
+            if selected:
+                query = query.select(selected)
+            for field, value in (("agent", agent), ("analysis_type", analysis_type), ("user_id", user_id)):
+                if value:
+                    query = query.where(filter=firestore.FieldFilter(field, "==", value))
+            # Document ID breaks timestamp ties so cursors never skip or repeat
             query = query.order_by("timestamp", direction=firestore.Query.DESCENDING)
-            query = query.limit(fetch_limit)
+            query = query.order_by("__name__", direction=firestore.Query.DESCENDING)
+            if after:
+                query = query.start_after({"timestamp": after[0], "__name__": after[1]})
+            # One extra document tells us whether there is another page
+            query = query.limit(limit + 1)
             
-            # Execute query
-            docs = query.stream()
             results = []
-            
-            # Client-side filtering (works without indexes)
-            for doc in docs:
+            async for doc in query.stream():
                 data = doc.to_dict()
                 data["id"] = doc.id
-                
-                # Apply filters
-                if agent and data.get("agent") != agent:
-                    continue
-                
-                if analysis_type and data.get("analysis_type") != analysis_type:
-                    continue
-                
-                if user_id and data.get("user_id") != user_id:
-                    continue
-                
                 results.append(data)
-                
-                # Stop if we have enough results
-                if len(results) >= limit:
-                    break
+            
+            next_cursor = None
+            if len(results) > limit:
+                results = results[:limit]
+                last = results[-1]
+                next_cursor = encode_cursor(last.get("timestamp"), last["id"])
             
             logger.info(f"Retrieved {len(results)} analyses from Firestore")
-            return results
+            return results, next_cursor
             
         except Exception as e:
             logger.error(f"Failed to list analyses: {e}")
-            return []
+            return [], None
+    
+    async def get_clause_snapshot(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get the clause fingerprints and per-unit results of the last incremental analysis"""
+        if not self.db:
+            return None
+        
+        try:
+            doc = await self.db.collection("clausecode_clause_snapshots").document(key).get()
+            return doc.to_dict() if doc.exists else None
+            
+        except Exception as e:
+            logger.error(f"Failed to get clause snapshot: {e}")
+            return None
+    
+    async def save_clause_snapshot(self, key: str, snapshot: Dict[str, Any]) -> bool:
+        """Replace the clause snapshot for an incremental analysis key"""
+        if not self.db:
+            return False
+        
+        try:
+            await self.db.collection("clausecode_clause_snapshots").document(key).set({
+                **snapshot,
+                "updated_at": datetime.utcnow(),
+            })
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to save clause snapshot: {e}")
+            return False
     
     async def delete_analysis(self, doc_id: str) -> bool:
-        """Delete a single analysis by document ID"""
+        """Delete a single analysis by document ID, and its page content if nothing else uses it"""
         if not self.db:
             return False
         
         try:
-            doc_ref = self.db.collection("clausecode_analyses").document(doc_id)
-            doc_ref.delete()
+            doc_ref = self.db.collection(ANALYSES_COLLECTION).document(doc_id)
+            doc = await doc_ref.get(field_paths=["page_content_ref"])
+            await doc_ref.delete()
             logger.info(f"✅ Deleted analysis from Firestore: {doc_id}")
+            content_ref = (doc.to_dict() or {}).get("page_content_ref") if doc.exists else None
+            if content_ref:
+                await self._delete_orphaned_content(content_ref)
             return True
             
         except Exception as e:
             logger.error(f"Failed to delete analysis: {e}")
             return False
+    
+    async def _delete_orphaned_content(self, content_ref: str):
+        """
+        Delete a page content document no analysis references any more
+        
+        The delete is conditional on the document's update time, so a save that
+        referenced the content after it was read here (touching referenced_at)
+        keeps it.
+        """
+        content_doc = self.db.collection(PAGE_CONTENTS_COLLECTION).document(content_ref)
+        snapshot = await content_doc.get(field_paths=["chars"])
+        if not snapshot.exists:
+            return
+        query = self.db.collection(ANALYSES_COLLECTION).where(
+            filter=firestore.FieldFilter("page_content_ref", "==", content_ref)
+        ).limit(1)
+        if await query.get():
+            return
+        try:
+            await content_doc.delete(option=self.db.write_option(last_update_time=snapshot.update_time))
+            logger.info(f"Deleted orphaned page content: {content_ref}")
+        except FailedPrecondition:
+            logger.debug(f"Page content {content_ref} was referenced again, keeping it")
 
 
 # Global database instance
 _db_instance: Optional[AnalysisDB] = None
+# Set once a backend was opened or failed to; a failure isn't retried on every call
+_db_opened = False
+_db_lock = asyncio.Lock()
+
+
+async def _open_backend() -> Optional[AnalysisDB]:
+    """
+    Open the backend chosen by config.DB_BACKEND
+    
+    "auto" uses Firestore when it initializes, and otherwise SQLite outside
+    cloud deployments (whose filesystem is ephemeral).
+    """
+    backend = config.DB_BACKEND
+    if backend in ("auto", "firestore") and config.USE_FIRESTORE:
+        db = AnalysisDB()
+        await db.initialize()
+        if db.initialized or backend == "firestore":
+            return db
+    if backend == "sqlite" or (backend == "auto" and not config.IS_CLOUD_DEPLOYMENT):
+        from sqlite_db import SQLiteAnalysisDB
+        db = SQLiteAnalysisDB(config.SQLITE_PATH, readers=config.SQLITE_READERS)
+        await db.initialize()
+        return db
+    return None
 
 
 async def get_db() -> Optional[AnalysisDB]:
     """
-    Get database instance (singleton)
+    Get database instance (singleton): Firestore or SQLite with the same API
     Returns None if database is not available (allows fallback to CSV-only)
     """
-    global _db_instance
-    if _db_instance is None:
-        _db_instance = AnalysisDB()
-        try:
-            await _db_instance.initialize()
-        except Exception as e:
-            logger.warning(f"Database initialization failed: {e}")
-            return None
-    return _db_instance if _db_instance.initialized else None
+    global _db_instance, _db_opened
+    if not _db_opened:
+        async with _db_lock:
+            if not _db_opened:
+                try:
+                    _db_instance = await _open_backend()
+                except Exception as e:
+                    logger.warning(f"Database initialization failed: {e}")
+                _db_opened = True
+                if _db_instance is None:
+                    logger.warning("No analyses database available; continuing without one")
+    return _db_instance if _db_instance and _db_instance.initialized else None
+
+
+async def close_db():
+    """Close the database instance, if one was opened"""
+    if _db_instance is not None:
+        await _db_instance.close()
@@ -0,0 +1,119 @@
+"""
+Document store for ClauseCode AI
+Keeps normalized text extracted by /upload and /scrape-url on the server and
+hands out a doc_id, so the browser doesn't have to post the same text back to
+/analyze, /save and /ask-question
+"""
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Any
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentNotFound(Exception):
+    """Raised when a doc_id is unknown or has expired"""
+
+
+class StoredDocument:
+    """Normalized text plus where it came from"""
+
+    def __init__(self, doc_id: str, text: str, metadata: Dict[str, Any]):
+        self.doc_id = doc_id
+        self.text = text
+        self.metadata = metadata
+        self.stored_at = time.time()
+
+    def describe(self, preview_chars: int) -> Dict[str, Any]:
+        return {
+            "doc_id": self.doc_id,
+            "length": len(self.text),
+            "preview": self.text[:preview_chars],
+            **self.metadata,
+        }
+
+
+class DocumentStore:
+    """Bounded (entry count and total characters), expiring in-memory store"""
+
+    def __init__(self, max_entries: int, max_chars: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.ttl = ttl
+        self.documents: "OrderedDict[str, StoredDocument]" = OrderedDict()
+        self.total_chars = 0
+        self.counters = {"stored": 0, "reused": 0, "hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def put(self, text: str, **metadata: Any) -> StoredDocument:
+        """Store text and return its document (identical text shares one doc_id)"""
+        doc_id = hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+        existing = self.documents.get(doc_id)
+        if existing is not None:
+            existing.stored_at = time.time()
+            existing.metadata.update(metadata)
+            self.documents.move_to_end(doc_id)
+            self.counters["reused"] += 1
+            return existing
+
+        document = StoredDocument(doc_id, text, metadata)
+        self.documents[doc_id] = document
+        self.total_chars += len(text)
+        self.counters["stored"] += 1
+        while len(self.documents) > 1 and (
+            len(self.documents) > self.max_entries or self.total_chars > self.max_chars
+        ):
+            _, evicted = self.documents.popitem(last=False)
+            self.total_chars -= len(evicted.text)
+            self.counters["evictions"] += 1
+        return document
+
+    def get(self, doc_id: str) -> Optional[StoredDocument]:
+        document = self.documents.get(doc_id)
+        if document is None:
+            self.counters["misses"] += 1
+            return None
+        if self.ttl > 0 and time.time() - document.stored_at > self.ttl:
+            del self.documents[doc_id]
+            self.total_chars -= len(document.text)
+            self.counters["expirations"] += 1
+            self.counters["misses"] += 1
+            return None
+        self.documents.move_to_end(doc_id)
+        self.counters["hits"] += 1
+        return document
+
+    def require(self, doc_id: str) -> StoredDocument:
+        """Like get(), but raises DocumentNotFound"""
+        document = self.get(doc_id)
+        if document is None:
+            raise DocumentNotFound(doc_id)
+        return document
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "documents": len(self.documents),
+            "total_chars": self.total_chars,
+            "max_entries": self.max_entries,
+            "max_chars": self.max_chars,
+        }
+
+
+# Global store instance (one per worker process)
+_store: Optional[DocumentStore] = None
+
+
+def get_documents() -> DocumentStore:
+    """Get the document store (singleton)"""
+    global _store
+    if _store is None:
+        _store = DocumentStore(
+            max_entries=config.DOCUMENT_STORE_MAX_ENTRIES,
+            max_chars=config.DOCUMENT_STORE_MAX_CHARS,
+            ttl=config.DOCUMENT_STORE_TTL,
+        )
+    return _store
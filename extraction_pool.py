@@ -0,0 +1,297 @@
+"""
+Extraction pools for ClauseCode AI
+Run CPU-bound PDF/DOCX extraction and scraped-HTML parsing in worker
+processes so large documents don't block the Sanic event loop, with per-job
+timeouts, size/page limits and metrics. Uploads and scraped pages use
+separate pools, so a stuck upload can't hold up (or take down) a scrape.
+"""
+import os
+import time
+import signal
+import asyncio
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional, Set, Tuple, Any
+
+from config import config
+from extractors import Source, extract_document, extract_html_page, extract_pdf_pages, pdf_page_count
+from text_normalize import PAGE_BREAK
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionError(Exception):
+    """Extraction rejected (too large) or failed (timeout, worker crash)"""
+
+
+def source_size(source: Source) -> int:
+    """Size in bytes of file bytes or a spooled upload path"""
+    return os.path.getsize(source) if isinstance(source, str) else len(source)
+
+
+class _Worker:
+    """One worker: a single-process executor (a thread for workers=0) and its process ID"""
+
+    def __init__(self, executor: Executor):
+        self.executor = executor
+        self.pid: Optional[int] = None
+
+
+class ExtractionPool:
+    """
+    Worker processes for document extraction (workers=0 uses a thread instead)
+
+    Each worker runs one job at a time, and a job is only handed to an idle
+    worker, so the timeout covers the job itself and not time spent queued.
+    A job that times out has its worker process killed and replaced; jobs on
+    the other workers are unaffected.
+    """
+
+    def __init__(self, name: str, workers: int, timeout: float, max_bytes: int, max_pages: int,
+                 parallel_min_bytes: int, stream_batch_pages: int):
+        self.name = name
+        self.workers = workers
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_pages = max_pages or None
+        self.parallel_min_bytes = parallel_min_bytes
+        self.stream_batch_pages = max(1, stream_batch_pages)
+        self.idle: Optional[asyncio.Queue] = None
+        self.live: Set[_Worker] = set()
+        self.pending = 0
+        self.running = 0
+        self.counters = {"jobs": 0, "completed": 0, "failed": 0, "timeouts": 0, "rejected": 0, "recycles": 0}
+        self.total_duration_ms = 0.0
+        self.max_duration_ms = 0.0
+
+    def start(self):
+        """Start the workers (call from the event loop)"""
+        if self.idle is not None:
+            return
+        self.idle = asyncio.Queue()
+        for _ in range(max(self.workers, 1)):
+            asyncio.ensure_future(self._add_worker())
+        logger.info(f"{self.name} pool started ({self.workers or 'thread'} workers)")
+
+    def shutdown(self):
+        for worker in list(self.live):
+            self._stop_worker(worker, kill=False)
+        self.idle = None
+
+    async def _add_worker(self):
+        if self.workers > 0:
+            # spawn: don't fork a process that already runs an event loop and sockets
+            executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="extract")
+        worker = _Worker(executor)
+        self.live.add(worker)
+        idle = self.idle
+        if self.workers > 0:
+            # Start the process now, so its startup isn't charged to the first job
+            try:
+                worker.pid = await asyncio.get_running_loop().run_in_executor(executor, os.getpid)
+            except Exception as e:
+                logger.error(f"{self.name} worker failed to start: {e}")
+        self._release(worker, idle)
+
+    def _stop_worker(self, worker: _Worker, kill: bool):
+        self.live.discard(worker)
+        worker.executor.shutdown(wait=False, cancel_futures=True)
+        if kill and worker.pid is not None:
+            try:
+                os.kill(worker.pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+            except OSError:
+                pass  # Already gone
+
+    def _check_size(self, source: Source):
+        if self.max_bytes and source_size(source) > self.max_bytes:
+            self.counters["rejected"] += 1
+            raise ExtractionError(
+                f"File is too large ({source_size(source) // (1024 * 1024)} MB). "
+                f"Maximum size is {self.max_bytes // (1024 * 1024)} MB."
+            )
+
+    async def _run(self, fn: Callable, *args: Any) -> Any:
+        """Run one job on the next idle worker, with the per-job timeout and metrics"""
+        self.start()
+        self.counters["jobs"] += 1
+        self.pending += 1
+        try:
+            worker = await self.idle.get()
+        finally:
+            self.pending -= 1
+        loop = asyncio.get_running_loop()
+        self.running += 1
+        started = time.perf_counter()
+        idle = self.idle
+        job = None
+        try:
+            job = worker.executor.submit(fn, *args)
+            result = await asyncio.wait_for(asyncio.wrap_future(job), timeout=self.timeout or None)
+            self.counters["completed"] += 1
+            return result
+        except asyncio.TimeoutError:
+            # Kill the worker rather than leave it busy with a job nobody is waiting for
+            self.counters["timeouts"] += 1
+            self._replace_worker(worker)
+            raise ExtractionError(f"Document extraction timed out after {self.timeout:.0f} seconds")
+        except BrokenExecutor as e:
+            self.counters["failed"] += 1
+            self._replace_worker(worker)
+            raise ExtractionError(f"Document extraction failed: {e}")
+        except Exception as e:
+            self.counters["failed"] += 1
+            raise ExtractionError(f"Document extraction failed: {e}")
+        finally:
+            self.running -= 1
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.total_duration_ms += duration_ms
+            self.max_duration_ms = max(self.max_duration_ms, duration_ms)
+            if job is None:
+                self._release(worker, idle)
+            else:
+                # A cancelled caller's job may still be running: the worker is idle once it ends
+                job.add_done_callback(lambda _job: loop.is_closed() or loop.call_soon_threadsafe(self._release, worker, idle))
+
+    def _release(self, worker: _Worker, idle: asyncio.Queue):
+        if worker in self.live and idle is self.idle:
+            idle.put_nowait(worker)
+
+    def _replace_worker(self, worker: _Worker):
+        self.counters["recycles"] += 1
+        self._stop_worker(worker, kill=True)
+        logger.warning(f"{self.name} worker {worker.pid} replaced")
+        asyncio.ensure_future(self._add_worker())
+
+    def _page_limit(self, max_pages: Optional[int]) -> Optional[int]:
+        limits = [limit for limit in (self.max_pages, max_pages) if limit]
+        return min(limits) if limits else None
+
+    def _page_ranges(self, page_count: int, pages_per_job: int) -> List[Tuple[int, int]]:
+        return [(start, min(start + pages_per_job, page_count))
+                for start in range(0, page_count, pages_per_job)]
+
+    async def _pdf_page_count(self, source: Source, max_pages: Optional[int]) -> int:
+        page_count = await self._run(pdf_page_count, source)
+        limit = self._page_limit(max_pages)
+        return min(page_count, limit) if limit else page_count
+
+    async def extract(self, kind: str, source: Source,
+                      max_pages: Optional[int] = None, max_chars: Optional[int] = None) -> str:
+        """
+        Extract text without blocking the event loop
+
+        max_pages / max_chars enable early exit when only the start of the document is needed.
+        Raises: ExtractionError if the file is too large, the job times out or the worker fails
+        """
+        self._check_size(source)
+        if kind == 'pdf' and self.workers > 1 and source_size(source) >= self.parallel_min_bytes:
+            return await self._extract_pdf_parallel(source, max_pages, max_chars)
+        return await self._run(extract_document, kind, source, self._page_limit(max_pages), max_chars)
+
+    async def extract_html(self, content: bytes, main_content: bool = False) -> Dict[str, Any]:
+        """
+        Parse a scraped page off the event loop (see extractors.extract_html_page)
+
+        Raises: ExtractionError if parsing fails or times out
+        """
+        return await self._run(extract_html_page, content, main_content)
+
+    async def _extract_pdf_parallel(self, source: Source,
+                                    max_pages: Optional[int], max_chars: Optional[int]) -> str:
+        """Split a large PDF into one page range per worker and join the results once"""
+        page_count = await self._pdf_page_count(source, max_pages)
+        if page_count == 0:
+            return ''
+        pages_per_job = max(1, -(-page_count // self.workers))
+        ranges = self._page_ranges(page_count, pages_per_job)
+        parts = await asyncio.gather(*(
+            self._run(extract_pdf_pages, source, start, end, max_chars)
+            for start, end in ranges
+        ))
+        text = PAGE_BREAK.join(page for pages in parts for page in pages).strip()
+        return text[:max_chars] if max_chars else text
+
+    async def stream_pdf_pages(self, source: Source, max_pages: Optional[int] = None,
+                               max_chars: Optional[int] = None) -> AsyncIterator[Tuple[int, List[str]]]:
+        """
+        Yield (first_page_index, [page texts]) for small page batches, in page order
+
+        At most one batch per worker is in flight: the next batch is started
+        as each one is yielded, so a long PDF streams instead of queueing every
+        batch at once. Stops early once max_chars characters were yielded.
+        """
+        self._check_size(source)
+        page_count = await self._pdf_page_count(source, max_pages)
+        ranges = self._page_ranges(page_count, self.stream_batch_pages)
+        window = max(self.workers, 1)
+        in_flight: Deque[Tuple[int, "asyncio.Task"]] = deque()
+        next_range = 0
+        yielded_chars = 0
+        try:
+            while next_range < len(ranges) or in_flight:
+                while next_range < len(ranges) and len(in_flight) < window:
+                    start, end = ranges[next_range]
+                    task = asyncio.ensure_future(self._run(extract_pdf_pages, source, start, end, max_chars))
+                    in_flight.append((start, task))
+                    next_range += 1
+                batch_start, task = in_flight.popleft()
+                batch = await task
+                yield batch_start, batch
+                yielded_chars += sum(len(page) + 1 for page in batch)
+                if max_chars and yielded_chars >= max_chars:
+                    return
+        finally:
+            for _, task in in_flight:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        finished = self.counters["completed"] + self.counters["failed"] + self.counters["timeouts"]
+        return {
+            **self.counters,
+            "workers": self.workers,
+            "in_flight": self.running + self.pending,
+            "queue_depth": self.pending,
+            "avg_duration_ms": round(self.total_duration_ms / finished, 3) if finished else 0.0,
+            "max_duration_ms": round(self.max_duration_ms, 3),
+        }
+
+
+# Global pool instances (one per worker process)
+_pool: Optional[ExtractionPool] = None
+_html_pool: Optional[ExtractionPool] = None
+
+
+def get_extraction_pool() -> ExtractionPool:
+    """Get the upload extraction pool (singleton)"""
+    global _pool
+    if _pool is None:
+        _pool = ExtractionPool(
+            name="Extraction",
+            workers=config.EXTRACTION_WORKERS,
+            timeout=config.EXTRACTION_TIMEOUT,
+            max_bytes=config.EXTRACTION_MAX_BYTES,
+            max_pages=config.EXTRACTION_MAX_PAGES,
+            parallel_min_bytes=config.PDF_PARALLEL_MIN_BYTES,
+            stream_batch_pages=config.PDF_STREAM_BATCH_PAGES,
+        )
+    return _pool
+
+
+def get_html_pool() -> ExtractionPool:
+    """Get the scraped-HTML parsing pool (singleton)"""
+    global _html_pool
+    if _html_pool is None:
+        _html_pool = ExtractionPool(
+            name="HTML parsing",
+            workers=config.HTML_PARSE_WORKERS,
+            timeout=config.EXTRACTION_TIMEOUT,
+            max_bytes=0,
+            max_pages=0,
+            parallel_min_bytes=0,
+            stream_batch_pages=1,
+        )
+    return _html_pool
@@ -0,0 +1,289 @@
+"""
+Document text extractors for ClauseCode AI
+Pure, CPU-bound functions (PyPDF2 / lxml / python-docx) that run inside the
+extraction worker processes, for uploaded documents and scraped HTML pages.
+Keep this module free of server/config imports.
+
+Every extractor takes a "source": the file bytes, or the path of an upload
+spooled to disk (memory-mapped, so it's never copied into the pickled job).
+"""
+import re
+import mmap
+import time
+import zipfile
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Any, Dict, Iterator, List, Optional, Union
+import PyPDF2
+from lxml import etree
+from lxml import html as lxml_html
+from docx import Document as DocxDocument
+
+from main_content import extract_main_content
+from text_normalize import normalize_text, PAGE_BREAK
+
+
+# Bump whenever extraction output changes, so cached extracted text is invalidated
+EXTRACTOR_VERSION = "4"
+
+# WordprocessingML
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_P, _W_TC, _W_TR = f"{_W}p", f"{_W}tc", f"{_W}tr"
+_W_RUN_TEXT = {f"{_W}t": None, f"{_W}tab": "\t", f"{_W}br": "\n", f"{_W}cr": "\n"}
+# Text boxes are written twice: as DrawingML (mc:Choice) and as VML (mc:Fallback)
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+_DOCX_BODY_PART = "word/document.xml"
+_DOCX_EXTRA_PARTS_RE = re.compile(r"word/(header|footer|footnotes|endnotes)(\d*)\.xml$")
+_DOCX_EXTRA_PARTS_ORDER = {"header": 0, "footer": 1, "footnotes": 2, "endnotes": 3}
+
+# Scraped HTML
+_HTML_DROP_XPATH = '//script | //style | //noscript | //iframe'
+
+Source = Union[bytes, str]
+
+
+@contextmanager
+def open_source(source: Source) -> Iterator:
+    """Readable, seekable stream over bytes or a memory-mapped file path"""
+    if isinstance(source, str):
+        with open(source, 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+    else:
+        yield BytesIO(source)
+
+
+def pdf_page_count(source: Source) -> int:
+    """Number of pages in a PDF"""
+    with open_source(source) as stream:
+        return len(PyPDF2.PdfReader(stream).pages)
+
+
+def extract_pdf_pages(source: Source, start: int = 0, end: Optional[int] = None,
+                      max_chars: Optional[int] = None) -> List[str]:
+    """
+    Text of pages [start, end) as a list (one string per page)
+
+    Stops early once max_chars characters have been collected.
+    """
+    with open_source(source) as stream:
+        pages = PyPDF2.PdfReader(stream).pages
+        end = len(pages) if end is None else min(end, len(pages))
+        texts: List[str] = []
+        collected = 0
+        for index in range(start, end):
+            page_text = pages[index].extract_text() or ''
+            texts.append(page_text)
+            collected += len(page_text) + 1
+            if max_chars is not None and collected >= max_chars:
+                break
+        return texts
+
+
+def extract_pdf_text(source: Source, max_pages: Optional[int] = None, max_chars: Optional[int] = None):
+    """Extract text from PDF file (optionally only the first max_pages pages / max_chars characters)"""
+    try:
+        text = PAGE_BREAK.join(extract_pdf_pages(source, 0, max_pages, max_chars=max_chars)).strip()
+        return text[:max_chars] if max_chars else text
+    except Exception as e:
+        print(f"PDF extraction error: {e}")
+        return ''
+
+
+def _paragraph_text(paragraph) -> str:
+    parts = []
+    for node in paragraph.iter(*_W_RUN_TEXT):
+        replacement = _W_RUN_TEXT[node.tag]
+        parts.append((node.text or '') if replacement is None else replacement)
+    return ''.join(parts).strip()
+
+
+def iter_docx_part(stream) -> Iterator[str]:
+    """
+    Yield the paragraphs of one WordprocessingML part in document order
+
+    Each table row is yielded once, as its cell texts joined by tabs. A text
+    box's paragraphs follow the paragraph it is anchored in (its mc:Fallback
+    copy is skipped). Nodes are cleared as soon as they're read, so memory
+    stays flat for large documents.
+    """
+    cells: List[List[str]] = []  # one text buffer per open table cell (tables nest)
+    rows: List[List[str]] = []   # finished cell texts per open table row
+    boxes: List[List[str]] = []  # text box paragraphs per open paragraph
+    fallback = 0                 # depth of open mc:Fallback elements
+    context = etree.iterparse(stream, events=("start", "end"), tag=(_W_P, _W_TC, _W_TR, _MC_FALLBACK),
+                              resolve_entities=False, no_network=True)
+    for event, elem in context:
+        if elem.tag == _MC_FALLBACK:
+            if event == "start":
+                fallback += 1
+            else:
+                fallback -= 1
+                elem.clear()
+            continue
+        if fallback:
+            continue
+
+        if event == "start":
+            if elem.tag == _W_TR:
+                rows.append([])
+            elif elem.tag == _W_TC:
+                cells.append([])
+            else:
+                boxes.append([])
+            continue
+
+        if elem.tag == _W_P:
+            text = _paragraph_text(elem)
+            lines = ([text] if text else []) + boxes.pop()
+            if boxes:
+                # A text box paragraph: read out after the paragraph it sits in
+                boxes[-1].extend(lines)
+                elem.clear()
+                continue
+            if cells:
+                cells[-1].extend(lines)
+            else:
+                yield from lines
+        elif elem.tag == _W_TC:
+            cell_text = ' '.join(cells.pop())
+            if rows:
+                rows[-1].append(cell_text)
+        elif elem.tag == _W_TR:
+            row_text = '\t'.join(cell for cell in rows.pop() if cell)
+            if cells:
+                # Nested table: the row belongs to the enclosing cell
+                if row_text:
+                    cells[-1].append(row_text)
+            elif row_text:
+                yield row_text
+        else:
+            continue
+
+        # Only clear top-level content; nested paragraphs/cells are read by their container
+        if not cells:
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+
+def _docx_extra_parts(names: List[str]) -> List[str]:
+    """Header, footer, footnote and endnote parts, grouped by kind in numeric order"""
+    found = []
+    for name in names:
+        match = _DOCX_EXTRA_PARTS_RE.match(name)
+        if match:
+            kind, number = match.groups()
+            found.append((_DOCX_EXTRA_PARTS_ORDER[kind], int(number or 0), name))
+    return [name for _, _, name in sorted(found)]
+
+
+def extract_docx_xml(source: Source, max_chars: Optional[int] = None) -> str:
+    """
+    Extract text by streaming the .docx XML parts with lxml iterparse
+
+    Reads the body, then headers, footers, footnotes and endnotes. Header and
+    footer lines repeated across sections are kept once. Raises on anything
+    that isn't a readable .docx.
+    """
+    # zipfile reads only the parts it needs, straight from the spooled file
+    zip_file = source if isinstance(source, str) else BytesIO(source)
+    with zipfile.ZipFile(zip_file) as archive:
+        names = archive.namelist()
+        if _DOCX_BODY_PART not in names:
+            raise ValueError(f"{_DOCX_BODY_PART} not found")
+
+        lines: List[str] = []
+        collected = 0
+        seen_extra = set()
+        for part in [_DOCX_BODY_PART] + _docx_extra_parts(names):
+            is_body = part == _DOCX_BODY_PART
+            with archive.open(part) as part_stream:
+                for line in iter_docx_part(part_stream):
+                    if not is_body:
+                        if line in seen_extra:
+                            continue
+                        seen_extra.add(line)
+                    lines.append(line)
+                    collected += len(line) + 1
+                    if max_chars is not None and collected >= max_chars:
+                        return '\n'.join(lines)[:max_chars]
+        return '\n'.join(lines)
+
+
+def extract_docx_text(source: Source, max_chars: Optional[int] = None):
+    """Extract text from Word document (XML fast path, python-docx as fallback)"""
+    try:
+        return extract_docx_xml(source, max_chars=max_chars).strip()
+    except Exception as e:
+        print(f"DOCX XML extraction failed, falling back to python-docx: {e}")
+
+    try:
+        # python-docx opens paths lazily through zipfile
+        doc_file = source if isinstance(source, str) else BytesIO(source)
+        doc = DocxDocument(doc_file)
+        text = '\n'.join([paragraph.text for paragraph in doc.paragraphs]).strip()
+        return text[:max_chars] if max_chars else text
+    except Exception as e:
+        print(f"DOCX extraction error: {e}")
+        return ''
+
+
+def extract_html_page(content: bytes, main_content: bool = False) -> Dict[str, Any]:
+    """
+    Parse a scraped page and return {"text", "title", "main_content", "full_chars", "timings_ms"}
+
+    With main_content, text is only the page body (see main_content.py) when a
+    convincing body was found; "main_content" says whether it was, and
+    full_chars is the length of the whole page text for comparison.
+    timings_ms has one entry per stage (parse, strip, text, main_content, clean).
+    Raises if the page can't be parsed.
+    """
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+
+    def lap(stage: str):
+        nonlocal started
+        now = time.perf_counter()
+        timings[stage] = round((now - started) * 1000, 3)
+        started = now
+
+    tree = lxml_html.fromstring(content)
+    lap('parse')
+
+    # Remove script and style elements
+    for element in tree.xpath(_HTML_DROP_XPATH):
+        element.getparent().remove(element)
+    lap('strip')
+
+    text = tree.text_content()
+    title_elements = tree.xpath('//title/text()')
+    lap('text')
+
+    main_text = None
+    if main_content:
+        main_text = extract_main_content(tree)
+        lap('main_content')
+
+    text = normalize_text(text, strip_boilerplate=False, collapse_whitespace=True)
+    full_chars = len(text)
+    if main_text is not None:
+        text = normalize_text(main_text, strip_boilerplate=False, collapse_whitespace=True)
+    lap('clean')
+
+    return {
+        'text': text,
+        'title': title_elements[0].strip() if title_elements else '',
+        'main_content': main_text is not None,
+        'full_chars': full_chars,
+        'timings_ms': timings,
+    }
+
+
+def extract_document(kind: str, source: Source, max_pages: Optional[int] = None,
+                     max_chars: Optional[int] = None) -> str:
+    """Entry point for pool jobs: kind is 'pdf' or 'docx'"""
+    if kind == 'pdf':
+        return extract_pdf_text(source, max_pages=max_pages, max_chars=max_chars)
+    if kind == 'docx':
+        return extract_docx_text(source, max_chars=max_chars)
+    raise ValueError(f"Unsupported document kind: {kind}")
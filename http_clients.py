@@ -0,0 +1,185 @@
+"""
+HTTP client registry for ClauseCode AI
+Keeps one long-lived httpx.AsyncClient per upstream (OpenAI, SerpAPI, scraping)
+so every request reuses pooled keep-alive connections instead of paying
+TCP+TLS setup each time
+"""
+import logging
+import time
+from typing import Dict, Optional, Any
+import httpx
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Upstream names used throughout the server
+OPENAI = "openai"
+SERPAPI = "serpapi"
+SCRAPE = "scrape"
+
+# Trace events that mean the request got a connection from the pool
+_CONNECTION_ACQUIRED_EVENTS = (
+    "connection.connect_tcp.started",
+    "http11.send_request_headers.started",
+    "http2.send_request_headers.started",
+)
+
+
+class PoolStats:
+    """Counters for a single upstream connection pool"""
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.new_connections = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def record_wait(self, wait_ms: float):
+        self.total_wait_ms += wait_ms
+        if wait_ms > self.max_wait_ms:
+            self.max_wait_ms = wait_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "new_connections": self.new_connections,
+            "avg_wait_ms": round(self.total_wait_ms / self.requests, 3) if self.requests else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+        }
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """
+    AsyncHTTPTransport that measures how long each request waits for a pooled
+    connection, using httpcore's trace extension
+    """
+
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        stats = self.stats
+        started = time.perf_counter()
+        acquired = False
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            nonlocal acquired
+            if event_name == "connection.connect_tcp.started":
+                stats.new_connections += 1
+            if not acquired and event_name in _CONNECTION_ACQUIRED_EVENTS:
+                acquired = True
+                stats.record_wait((time.perf_counter() - started) * 1000)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        stats.requests += 1
+        stats.in_flight += 1
+        try:
+            return await super().handle_async_request(request)
+        finally:
+            stats.in_flight -= 1
+
+    def connection_counts(self) -> Dict[str, int]:
+        """Open/idle connection counts from the underlying httpcore pool"""
+        connections = list(getattr(self._pool, "connections", []))
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {"open_connections": len(connections), "idle_connections": idle}
+
+
+class ClientRegistry:
+    """One pooled AsyncClient per upstream, per worker process"""
+
+    # Default per-upstream client options (matching the old per-request clients)
+    UPSTREAMS = {
+        OPENAI: {"timeout": 60.0},
+        SERPAPI: {"timeout": 30.0},
+        SCRAPE: {"timeout": 45.0, "follow_redirects": True, "max_redirects": 10},
+    }
+
+    def __init__(self):
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.transports: Dict[str, InstrumentedTransport] = {}
+        self.stats: Dict[str, PoolStats] = {}
+        self.http2 = False
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+        )
+
+    def _build_transport(self, stats: PoolStats) -> InstrumentedTransport:
+        limits = self._limits()
+        if config.HTTP2_ENABLED:
+            try:
+                transport = InstrumentedTransport(stats, http2=True, limits=limits, verify=True)
+                self.http2 = True
+                return transport
+            except ImportError:
+                logger.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+        return InstrumentedTransport(stats, limits=limits, verify=True)
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        stats = PoolStats()
+        transport = self._build_transport(stats)
+        client = httpx.AsyncClient(transport=transport, **self.UPSTREAMS[name])
+        self.clients[name] = client
+        self.transports[name] = transport
+        self.stats[name] = stats
+        return client
+
+    async def start(self):
+        """Create every upstream client (called from before_server_start)"""
+        for name in self.UPSTREAMS:
+            if name not in self.clients:
+                self._create(name)
+        logger.info(f"HTTP client pools ready: {', '.join(self.clients)} (http2={self.http2})")
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Get the pooled client for an upstream, creating it lazily if needed"""
+        client = self.clients.get(name)
+        if client is None or client.is_closed:
+            client = self._create(name)
+        return client
+
+    async def close(self):
+        """Close all pooled clients (called on server shutdown)"""
+        for name, client in list(self.clients.items()):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Error closing {name} HTTP client: {e}")
+        self.clients.clear()
+        self.transports.clear()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Per-upstream pool statistics"""
+        result = {}
+        for name, stats in self.stats.items():
+            entry = stats.to_dict()
+            transport = self.transports.get(name)
+            if transport is not None:
+                entry.update(transport.connection_counts())
+            result[name] = entry
+        return result
+
+
+# Global registry instance (one per worker process)
+_registry: Optional[ClientRegistry] = None
+
+
+def get_clients() -> ClientRegistry:
+    """Get the HTTP client registry (singleton)"""
+    global _registry
+    if _registry is None:
+        _registry = ClientRegistry()
+    return _registry
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """Shortcut for get_clients().get(name)"""
+    return get_clients().get(name)
@@ -0,0 +1,240 @@
+"""
+Incremental clause-level re-analysis for ClauseCode AI
+Splits a document into clauses and fingerprints each one. The first analysis
+of a (URL, prompt) is an ordinary whole-document analysis, saved as the base
+of a snapshot along with the clause fingerprints. When the same URL is
+analyzed again, only new or changed clauses go to the model (in units of a
+few consecutive clauses, also kept in the snapshot), and a "what changed"
+diff is returned alongside the merged result. If most of the document
+changed, it is analyzed whole again instead.
+"""
+import os
+import re
+import hashlib
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Any
+
+from config import config
+from chunking import split_blocks, merge_analyses, is_heading
+from result_cache import ResultCache, make_cache_key
+from scrape_cache import normalize_url
+from database import get_db
+
+logger = logging.getLogger(__name__)
+
+# Bump when clause splitting or fingerprinting changes (old snapshots are ignored)
+CLAUSE_VERSION = "2"
+
+# Leading enumeration ("12.3", "(a)", "Section 4", "§ 5") is ignored by fingerprints,
+# so renumbering a clause doesn't count as a change
+_ENUMERATION_RE = re.compile(
+    r"^(?:(?:section|article|clause|part)\s+[\dIVXLC]+[.:)]?|\d{1,3}(?:\.\d{1,3})*[.)]?|§+\s*\d+[.)]?|\([a-z0-9]{1,3}\))\s*",
+    re.IGNORECASE,
+)
+HEADING_PREVIEW_CHARS = 120
+
+
+class Clause:
+    """One clause of a document and its fingerprint"""
+
+    def __init__(self, text: str):
+        self.text = text
+        body = _ENUMERATION_RE.sub("", text.strip(), count=1)
+        self.fingerprint = hashlib.sha256(" ".join(body.lower().split()).encode("utf-8")).hexdigest()[:20]
+        first_line = text.strip().split("\n", 1)[0]
+        self.heading = first_line[:HEADING_PREVIEW_CHARS]
+        self.heading_key = " ".join(_ENUMERATION_RE.sub("", first_line, count=1).lower().split())[:HEADING_PREVIEW_CHARS]
+
+
+def split_clauses(text: str) -> List[Clause]:
+    """Group paragraph blocks into clauses, each starting at a heading"""
+    clauses: List[Clause] = []
+    current: List[str] = []
+    for block in split_blocks(text):
+        if current and is_heading(block):
+            clauses.append(Clause("\n\n".join(current)))
+            current = []
+        current.append(block)
+    if current:
+        clauses.append(Clause("\n\n".join(current)))
+    return clauses
+
+
+def pack_units(clauses: List[Clause], max_chars: int) -> List[List[Clause]]:
+    """Pack consecutive clauses into units of at most max_chars (a long clause is its own unit)"""
+    units: List[List[Clause]] = []
+    current: List[Clause] = []
+    size = 0
+    for clause in clauses:
+        if current and size + len(clause.text) > max_chars:
+            units.append(current)
+            current, size = [], 0
+        current.append(clause)
+        size += len(clause.text) + 2
+    if current:
+        units.append(current)
+    return units
+
+
+def diff_clauses(previous: List[Dict[str, str]], current: List[Clause]) -> Dict[str, Any]:
+    """
+    What changed between two versions of a document
+
+    previous is the snapshot's [{"fingerprint", "heading", "heading_key"}] list.
+    A removed and an added clause with the same heading count as one changed clause.
+    """
+    previous_prints = {clause["fingerprint"] for clause in previous}
+    current_prints = {clause.fingerprint for clause in current}
+    added = [clause for clause in current if clause.fingerprint not in previous_prints]
+    removed = [clause for clause in previous if clause["fingerprint"] not in current_prints]
+
+    removed_by_heading: Dict[str, List[Dict[str, str]]] = {}
+    for clause in removed:
+        removed_by_heading.setdefault(clause["heading_key"], []).append(clause)
+    changed, new = [], []
+    for clause in added:
+        candidates = removed_by_heading.get(clause.heading_key)
+        if clause.heading_key and candidates:
+            candidates.pop(0)
+            changed.append(clause.heading)
+        else:
+            new.append(clause.heading)
+    return {
+        "added": new,
+        "changed": changed,
+        "removed": [clause["heading"] for group in removed_by_heading.values() for clause in group],
+        "unchanged": len(current) - len(added),
+    }
+
+
+def snapshot_key(url: str, system_prompt: str, model: str) -> str:
+    return make_cache_key("clauses", CLAUSE_VERSION, normalize_url(url), system_prompt, model)
+
+
+# Used when Firestore isn't configured (one per worker process)
+_local_snapshots: Optional[ResultCache] = None
+
+
+def _local_store() -> ResultCache:
+    global _local_snapshots
+    if _local_snapshots is None:
+        disk_dir = os.path.join(config.ANALYSIS_CACHE_DIR, "clauses") if config.ANALYSIS_CACHE_DIR else None
+        _local_snapshots = ResultCache(
+            max_entries=config.INCREMENTAL_MAX_LOCAL_SNAPSHOTS,
+            ttl=config.ANALYSIS_CACHE_TTL,
+            disk_dir=disk_dir,
+        )
+    return _local_snapshots
+
+
+async def load_snapshot(key: str) -> Optional[Dict[str, Any]]:
+    db = await get_db()
+    if db:
+        return await db.get_clause_snapshot(key)
+    return await _local_store().get(key)
+
+
+async def save_snapshot(key: str, snapshot: Dict[str, Any]):
+    db = await get_db()
+    if db:
+        await db.save_clause_snapshot(key, snapshot)
+    else:
+        await _local_store().set(key, snapshot)
+
+
+Analyze = Callable[[str], Awaitable[Optional[Dict[str, Any]]]]
+
+
+async def analyze_incrementally(url: str, text: str, system_prompt: str, model: str,
+                                analyze_unit: Analyze, analyze_document: Analyze) -> Dict[str, Any]:
+    """
+    Analyze text, reusing the results from the last analysis of url
+
+    analyze_document(text) analyzes a whole document and analyze_unit(unit_text)
+    a run of clauses; both return the structured result (or None if the model
+    didn't return JSON) and may raise.
+    Returns: {'structured': merged result, 'changes': diff and reuse counts}
+    """
+    clauses = split_clauses(text)
+    key = snapshot_key(url, system_prompt, model)
+    snapshot = await load_snapshot(key)
+
+    present = {clause.fingerprint for clause in clauses}
+    covered = set(snapshot["base"]["clauses"]) if snapshot else set()
+    reused: List[Dict[str, Any]] = []
+    for unit in (snapshot or {}).get("units", []):
+        # Units whose clauses are all still present are reused as they are
+        if unit.get("clauses") and all(fingerprint in present for fingerprint in unit["clauses"]):
+            reused.append(unit)
+            covered.update(unit["clauses"])
+    pending = [clause for clause in clauses if clause.fingerprint not in covered]
+    analyzed_chars = sum(len(clause.text) for clause in pending)
+
+    full_pass = snapshot is None or analyzed_chars > len(text) * config.INCREMENTAL_FULL_PASS_RATIO
+    new_units: List[List[Clause]] = []
+    units: List[Dict[str, Any]] = []
+    fresh: List[Dict[str, Any]] = []
+    failed: List[BaseException] = []
+    if full_pass:
+        structured = await analyze_document(text)
+        if structured is None:
+            raise ValueError("Analysis returned no structured result")
+        base = {"clauses": [clause.fingerprint for clause in clauses], "structured": structured}
+        reused = []
+        analyzed_chars = len(text)
+        merged = structured
+    else:
+        base = snapshot["base"]
+        new_units = pack_units(pending, config.INCREMENTAL_UNIT_CHARS)
+        semaphore = asyncio.Semaphore(config.ANALYSIS_CHUNK_CONCURRENCY)
+
+        async def run_unit(unit: List[Clause]) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                return await analyze_unit("\n\n".join(clause.text for clause in unit))
+
+        outcomes = await asyncio.gather(*(run_unit(unit) for unit in new_units), return_exceptions=True)
+        for unit, outcome in zip(new_units, outcomes):
+            if isinstance(outcome, BaseException):
+                failed.append(outcome)
+            elif outcome is not None:
+                fresh.append({"clauses": [clause.fingerprint for clause in unit], "structured": outcome})
+        for error in failed:
+            logger.warning(f"Clause unit analysis failed: {error}")
+
+        # The base result first, then the clause units in document order
+        position = {clause.fingerprint: index for index, clause in enumerate(clauses)}
+        units = sorted(reused + fresh, key=lambda unit: min(position[fingerprint] for fingerprint in unit["clauses"]))
+        merged = merge_analyses([base["structured"]] + [unit["structured"] for unit in units])
+        # The base summary describes the whole document; unit summaries would only repeat parts of it
+        merged["summary"] = base["structured"].get("summary", merged["summary"])
+
+    await save_snapshot(key, {
+        "url": url,
+        "clauses": [
+            {"fingerprint": clause.fingerprint, "heading": clause.heading, "heading_key": clause.heading_key}
+            for clause in clauses
+        ],
+        "base": base,
+        "units": units,
+        "analyzed_at": datetime.utcnow().isoformat(),
+    })
+
+    changes = diff_clauses(snapshot["clauses"], clauses) if snapshot else {
+        "added": [], "changed": [], "removed": [], "unchanged": 0,
+    }
+    changes.update({
+        "first_analysis": snapshot is None,
+        "full_pass": full_pass,
+        "clauses": len(clauses),
+        "reused_units": len(reused),
+        "analyzed_units": len(new_units),
+        "failed_units": len(failed),
+        "analyzed_chars": analyzed_chars,
+        "total_chars": len(text),
+    })
+    if fresh:
+        # What the model found in the new/changed clauses alone
+        changes["new_findings"] = merge_analyses([unit["structured"] for unit in fresh])
+    return {"structured": merged, "changes": changes}
@@ -0,0 +1,136 @@
+"""
+Incremental JSON scanner for streamed LLM output
+Feeds partial text of a top-level JSON object and reports each top-level field
+and each element of selected top-level arrays as soon as it is complete
+"""
+import json
+import logging
+from typing import Dict, List, Optional, Tuple, Any, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Arrays in the analysis schema whose elements are emitted one at a time
+ANALYSIS_ARRAY_FIELDS = ("sections", "key_findings", "recommendations", "case_examples")
+
+
+class StreamingJSONParser:
+    """
+    Character-level scanner over a streamed JSON object
+
+    feed() returns a list of events:
+      ("field", key, value)        - a complete top-level value (not a watched array)
+      ("item", key, index, value)  - a complete element of a watched top-level array
+    """
+
+    def __init__(self, array_fields: Iterable[str] = ANALYSIS_ARRAY_FIELDS):
+        self.array_fields = set(array_fields)
+        self.stack: List[str] = []
+        self.in_string = False
+        self.escape = False
+        self.expect_key = False
+        self.reading_key = False
+        self.key_chars: List[str] = []
+        self.key: Optional[str] = None
+        self.awaiting_value = False
+        self.value_level = 0
+        self.capture: Optional[List[str]] = None
+        self.capture_level = 0
+        self.item_counts: Dict[str, int] = {}
+
+    def _finish(self, events: list):
+        text = ''.join(self.capture)
+        level = self.capture_level
+        self.capture = None
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            logger.debug(f"Skipping unparseable streamed value for {self.key}: {text[:80]}")
+            return
+        if level == 1:
+            events.append(("field", self.key, value))
+        else:
+            index = self.item_counts.get(self.key, 0)
+            self.item_counts[self.key] = index + 1
+            events.append(("item", self.key, index, value))
+
+    def feed(self, chunk: str) -> List[Tuple[Any, ...]]:
+        """Consume the next piece of text and return any completed values"""
+        events: list = []
+        for ch in chunk:
+            if self.in_string:
+                if self.capture is not None:
+                    self.capture.append(ch)
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.reading_key:
+                        self.reading_key = False
+                        self.key = json.loads('"' + ''.join(self.key_chars) + '"')
+                    elif self.capture is not None and self.capture_level == len(self.stack):
+                        self._finish(events)
+                    continue
+                if self.reading_key:
+                    self.key_chars.append(ch)
+                continue
+
+            if ch.isspace():
+                if self.capture is not None:
+                    self.capture.append(ch)
+                continue
+
+            depth = len(self.stack)
+
+            # First character of a value we want to capture
+            if self.awaiting_value and depth == self.value_level and ch not in ',]}':
+                self.awaiting_value = False
+                watched_array = depth == 1 and ch == '[' and self.key in self.array_fields
+                if not watched_array:
+                    self.capture = []
+                    self.capture_level = depth
+
+            if self.capture is not None:
+                self.capture.append(ch)
+
+            if ch == '"':
+                self.in_string = True
+                if depth == 1 and self.expect_key:
+                    self.expect_key = False
+                    self.reading_key = True
+                    self.key_chars = []
+            elif ch in '{[':
+                self.stack.append(ch)
+                if len(self.stack) == 1:
+                    self.expect_key = True
+                elif (len(self.stack) == 2 and ch == '[' and self.capture is None
+                      and self.key in self.array_fields):
+                    self.awaiting_value = True
+                    self.value_level = 2
+            elif ch in '}]':
+                self.awaiting_value = False
+                # A bare scalar (number/true/false/null) ends at the closing bracket
+                if self.capture is not None and self.capture_level == depth:
+                    self.capture.pop()
+                    self._finish(events)
+                if self.stack:
+                    self.stack.pop()
+                # A container value ends when we return to its level
+                if self.capture is not None and self.capture_level == len(self.stack):
+                    self._finish(events)
+            elif ch == ',':
+                if self.capture is not None and self.capture_level == depth:
+                    self.capture.pop()
+                    self._finish(events)
+                if depth == 1:
+                    self.expect_key = True
+                elif (depth == 2 and self.capture is None and self.stack[-1] == '['
+                      and self.key in self.array_fields):
+                    self.awaiting_value = True
+                    self.value_level = 2
+            elif ch == ':':
+                if depth == 1:
+                    self.awaiting_value = True
+                    self.value_level = 1
+        return events
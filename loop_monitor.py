@@ -0,0 +1,87 @@
+"""
+Event loop lag monitor for ClauseCode AI
+A background task sleeps for a fixed interval and measures how late it wakes
+up. Anything that blocks the worker's event loop (synchronous I/O, heavy
+parsing) shows up as lag in /metrics.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, Optional, Any
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """Samples event loop lag every interval seconds and keeps the most recent samples"""
+
+    def __init__(self, interval: float, window: int, warn_seconds: float):
+        self.interval = interval
+        self.warn_seconds = warn_seconds
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.task: Optional["asyncio.Task"] = None
+
+    def start(self):
+        if self.task is None and self.interval > 0:
+            self.task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if self.warn_seconds and lag >= self.warn_seconds:
+                self.stalls += 1
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms")
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self.samples)
+
+        def percentile(fraction: float) -> float:
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 2)
+
+        return {
+            "running": self.task is not None,
+            "samples": len(ordered),
+            "interval_ms": round(self.interval * 1000, 2),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0,
+            "p50_ms": percentile(0.5),
+            "p99_ms": percentile(0.99),
+            "window_max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+            "max_ms": round(self.max_lag * 1000, 2),
+            "stalls": self.stalls,
+        }
+
+
+# Global monitor instance (one per worker process)
+_monitor: Optional[LoopLagMonitor] = None
+
+
+def get_loop_monitor() -> LoopLagMonitor:
+    """Get the event loop lag monitor (singleton)"""
+    global _monitor
+    if _monitor is None:
+        _monitor = LoopLagMonitor(
+            interval=config.LOOP_LAG_INTERVAL,
+            window=config.LOOP_LAG_WINDOW,
+            warn_seconds=config.LOOP_LAG_WARN_SECONDS,
+        )
+    return _monitor
@@ -0,0 +1,164 @@
+"""
+Main-content extraction for scraped pages
+Scores blocks of an lxml tree by text density and link density to find the
+container holding the page body (the terms themselves), then prunes link
+lists and boilerplate inside it. Pure lxml, no server/config imports, so it
+can run inside the extraction process pool.
+"""
+import re
+from typing import Dict, Optional
+
+# Interactive widgets, never part of the body wherever they are
+_WIDGET_TAGS = ('button', 'select', 'svg', 'dialog')
+_WIDGET_XPATH = ' | '.join(f'//{tag}' for tag in _WIDGET_TAGS)
+# Page chrome, dropped only at page level (outside article/main/section)
+_CHROME_TAGS = frozenset(('nav', 'aside', 'form', 'menu', 'header', 'footer'))
+# Content regions: nothing inside them is dropped as chrome (a terms page can
+# have a "Cookie Policy" section or a per-clause <header>)
+_CONTENT_REGION_TAGS = frozenset(('article', 'main', 'section'))
+# id/class/role hints for cookie banners, menus, sharing widgets and the like
+_BOILERPLATE_HINT_RE = re.compile(
+    r'(^|[\s_-])(cookie|consent|gdpr|banner|navbar|nav|menu|breadcrumbs?|sidebar|social|share|'
+    r'newsletter|subscribe|promo|popup|modal|skip-link|site-header|site-footer|navigation)($|[\s_-])',
+    re.IGNORECASE,
+)
+# Leaf-ish blocks whose text is scored and credited to their ancestors
+_TEXT_BLOCK_TAGS = frozenset(('p', 'li', 'td', 'dd', 'dt', 'pre', 'blockquote',
+                              'h1', 'h2', 'h3', 'h4', 'h5', 'h6'))
+# Containers that can hold the body
+_CONTAINER_TAGS = frozenset(('div', 'section', 'article', 'main', 'td', 'body', 'ol', 'ul', 'table'))
+# Semantic containers get a head start
+_CONTAINER_BONUS = {'main': 1.5, 'article': 1.3}
+
+# Blocks that start a new line in the extracted text
+_LINE_BREAK_TAGS = ('p', 'li', 'tr', 'dd', 'dt', 'pre', 'blockquote', 'br', 'div', 'section',
+                    'h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+
+# A block with more link text than this share is navigation, not content
+MAX_LINK_DENSITY = 0.5
+# Blocks shorter than this carry no signal on their own
+MIN_BLOCK_CHARS = 25
+# If the chosen container has less than this share of the page text, the
+# guess is probably wrong and the full text is used instead
+MIN_KEPT_RATIO = 0.2
+MIN_KEPT_CHARS = 200
+
+
+def _text_length(element) -> int:
+    return len(' '.join(element.text_content().split()))
+
+
+def link_density(element, text_chars: Optional[int] = None) -> float:
+    """Share of the element's text that sits inside links"""
+    text_chars = _text_length(element) if text_chars is None else text_chars
+    if not text_chars:
+        return 0.0
+    link_chars = sum(_text_length(link) for link in element.iter('a'))
+    return min(1.0, link_chars / text_chars)
+
+
+def _hinted_boilerplate(element) -> bool:
+    hints = ' '.join(filter(None, (element.get('id'), element.get('class'), element.get('role'))))
+    return bool(hints) and bool(_BOILERPLATE_HINT_RE.search(hints))
+
+
+def _drop(element):
+    parent = element.getparent()
+    if parent is not None:
+        # Keep the tail text, which belongs to the parent
+        element.drop_tree()
+
+
+def _in_content_region(element) -> bool:
+    return any(ancestor.tag in _CONTENT_REGION_TAGS for ancestor in element.iterancestors())
+
+
+def remove_boilerplate(tree):
+    """
+    Drop widgets anywhere, and page-level chrome: nav/aside/form/header/footer
+    and elements hinted as banners or menus that aren't inside article, main
+    or section. Content regions are left alone so clauses named "Cookies" or
+    "Consent" survive.
+    """
+    for element in tree.xpath(_WIDGET_XPATH):
+        _drop(element)
+    for element in tree.xpath('//*'):
+        if element.getparent() is None or element.tag in ('html', 'body', 'main', 'article'):
+            continue
+        if element.tag in _CHROME_TAGS:
+            if not _in_content_region(element):
+                _drop(element)
+        elif _hinted_boilerplate(element) and not _in_content_region(element):
+            # Only drop what reads like chrome: short or link-heavy
+            text_chars = _text_length(element)
+            if text_chars < 1000 or link_density(element, text_chars) > MAX_LINK_DENSITY:
+                _drop(element)
+
+
+def best_container(tree):
+    """The element whose text blocks score highest (text length x (1 - link density))"""
+    scores: Dict = {}
+    for block in tree.iter(*_TEXT_BLOCK_TAGS):
+        text_chars = _text_length(block)
+        if text_chars < MIN_BLOCK_CHARS:
+            continue
+        density = link_density(block, text_chars)
+        if density > MAX_LINK_DENSITY:
+            continue
+        score = text_chars * (1.0 - density)
+        # Credit the enclosing containers, decaying with distance
+        weight = 1.0
+        for ancestor in block.iterancestors():
+            if ancestor.tag in _CONTAINER_TAGS:
+                scores[ancestor] = scores.get(ancestor, 0.0) + score * weight
+                weight *= 0.5
+                if weight < 0.1:
+                    break
+    if not scores:
+        return None
+
+    def final_score(element) -> float:
+        return scores[element] * _CONTAINER_BONUS.get(element.tag, 1.0)
+
+    best = max(scores, key=final_score)
+    # A parent that scores nearly as well holds body text split across siblings
+    parent = best.getparent()
+    while parent is not None and parent in scores and final_score(parent) >= 0.8 * final_score(best):
+        best, parent = parent, parent.getparent()
+    return best
+
+
+def prune_links(container):
+    """Drop link lists and other link-heavy blocks inside the chosen container"""
+    for element in list(container.iter('ul', 'ol', 'div', 'section', 'table', 'p', 'li')):
+        if element is container:
+            continue
+        text_chars = _text_length(element)
+        if text_chars and link_density(element, text_chars) > MAX_LINK_DENSITY:
+            _drop(element)
+
+
+def _separate_blocks(container):
+    """Put block elements on their own lines so text_content() keeps clause boundaries"""
+    for element in container.iter(*_LINE_BREAK_TAGS):
+        element.tail = '\n' + (element.tail or '')
+
+
+def extract_main_content(tree) -> Optional[str]:
+    """
+    Text of the page body, or None when no convincing body was found
+
+    Modifies the tree. Call after script/style removal.
+    """
+    full_chars = _text_length(tree)
+    remove_boilerplate(tree)
+    container = best_container(tree)
+    if container is None:
+        return None
+    prune_links(container)
+    _separate_blocks(container)
+    text = container.text_content()
+    kept_chars = len(' '.join(text.split()))
+    if kept_chars < MIN_KEPT_CHARS or kept_chars < MIN_KEPT_RATIO * full_chars:
+        return None
+    return text
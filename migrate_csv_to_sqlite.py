@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Import analysis_data.csv files into the SQLite analyses database
+Rows get IDs derived from their contents, so importing the same file
+again doesn't create duplicates.
+
+Usage: python migrate_csv_to_sqlite.py [--db analysis_data.db] [file.csv ...]
+Without files, config.CSV_FILE is imported into config.SQLITE_PATH.
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import sys
+
+from config import config
+from sqlite_db import SQLiteAnalysisDB
+
+BATCH_SIZE = 500
+
+# CSV header (config.HEADERS) -> save_analysis field
+COLUMNS = {
+    'Timestamp': 'timestamp',
+    'Agent': 'agent',
+    'Analysis Type': 'analysis_type',
+    'Page Title': 'page_title',
+    'Page URL': 'page_url',
+    'Result Text': 'result_text',
+}
+
+
+def row_id(fields):
+    """Stable ID for a CSV row"""
+    key = '\x1f'.join(fields[name] for name in COLUMNS.values())
+    return 'csv-' + hashlib.sha256(key.encode('utf-8')).hexdigest()[:24]
+
+
+def read_rows(path):
+    """save_analysis fields for each row of an analysis_data.csv file"""
+    csv.field_size_limit(sys.maxsize)
+    with open(path, 'r', newline='', encoding='utf-8', errors='replace') as f:
+        for row in csv.DictReader(f):
+            fields = {name: (row.get(header) or '') for header, name in COLUMNS.items()}
+            if any(fields.values()):
+                yield row_id(fields), fields
+
+
+async def migrate(db_path, paths):
+    db = SQLiteAnalysisDB(db_path)
+    await db.initialize()
+    if not db.initialized:
+        print(f"❌ Could not open {db_path}")
+        return 1
+    try:
+        total = 0
+        for path in paths:
+            imported = 0
+            batch = []
+            for item in read_rows(path):
+                batch.append(item)
+                if len(batch) >= BATCH_SIZE:
+                    await db.save_analyses_batch(batch)
+                    imported += len(batch)
+                    batch = []
+            if batch:
+                await db.save_analyses_batch(batch)
+                imported += len(batch)
+            print(f"✅ {path}: {imported} rows imported")
+            total += imported
+        print(f"Imported {total} analyses into {db_path}")
+        return 0
+    finally:
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import analysis_data.csv files into SQLite')
+    parser.add_argument('files', nargs='*', help=f'CSV files (default: {config.CSV_FILE})')
+    parser.add_argument('--db', default=config.SQLITE_PATH, help=f'SQLite database (default: {config.SQLITE_PATH})')
+    args = parser.parse_args()
+    return asyncio.run(migrate(args.db, args.files or [config.CSV_FILE]))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
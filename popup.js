@@ -108,7 +108,7 @@ function displayAlternatives(alternatives) {
   
   section.style.display = "block";
 }
-async function callAI(pageText, systemPrompt, agent = null, analysisType = null) {
+async function callAI(pageText, systemPrompt, agent = null, analysisType = null, pageUrl = null) {
   const response = await fetch(`${SERVER_URL}/analyze`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
@@ -116,7 +116,9 @@ async function callAI(pageText, systemPrompt, agent = null, analysisType = null)
       pageText,
       systemPrompt,
       agent,
-      analysisType
+      analysisType,
+      // Lets the server reuse results for clauses unchanged since the last visit
+      pageUrl
     })
   });
 
@@ -291,7 +293,7 @@ async function analyzePage(selectedAgent, analysisType) {
       // For alternatives, get from SerpAPI and also use AI
       const serviceName = await extractServiceName(pageText, pageData.title, pageData.url);
       const [agentResponse, alternatives] = await Promise.allSettled([
-        callAI(pageText, systemPrompt, selectedAgent, analysisType),
+        callAI(pageText, systemPrompt, selectedAgent, analysisType, pageData.url),
         searchAlternatives(serviceName).catch(() => [])
       ]);
 
@@ -317,7 +319,7 @@ async function analyzePage(selectedAgent, analysisType) {
       // Hide the separate alternatives section since it's included in the response
       document.getElementById("alternativesSection").style.display = "none";
     } else {
-      const responseData = await callAI(pageText, systemPrompt, selectedAgent, analysisType);
+      const responseData = await callAI(pageText, systemPrompt, selectedAgent, analysisType, pageData.url);
       answerContentEl.innerHTML = responseData.html;
       lastResultText = responseData.raw;
       lastPageData = pageData;
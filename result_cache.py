@@ -0,0 +1,169 @@
+"""
+Result cache for ClauseCode AI
+Content-addressed caches (/analyze results, extracted upload text) with a
+bounded in-memory LRU tier and an optional on-disk tier that survives restarts
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Any
+import aiofiles
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Hash the given parts into a stable hex key"""
+    hasher = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, str):
+            part = json.dumps(part, sort_keys=True, separators=(',', ':'))
+        hasher.update(part.encode('utf-8'))
+        hasher.update(b'\x00')
+    return hasher.hexdigest()
+
+
+class ResultCache:
+    """Two-tier (memory LRU + optional disk) cache with a TTL"""
+
+    def __init__(self, max_entries: int, ttl: float, disk_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir or None
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.counters = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+        if self.disk_dir:
+            try:
+                os.makedirs(self.disk_dir, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"Result cache disk tier disabled ({self.disk_dir}): {e}")
+                self.disk_dir = None
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl > 0 and time.time() - stored_at > self.ttl
+
+    def _remember(self, key: str, value: Dict[str, Any], stored_at: float):
+        self.entries[key] = (stored_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    async def _read_disk(self, key: str) -> Optional[tuple]:
+        path = self._disk_path(key)
+        try:
+            async with aiofiles.open(path, 'r', encoding='utf-8') as f:
+                record = json.loads(await f.read())
+            return record["stored_at"], record["value"]
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not read result cache entry {key}: {e}")
+            return None
+
+    async def _write_disk(self, key: str, value: Dict[str, Any], stored_at: float):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            async with aiofiles.open(tmp_path, 'w', encoding='utf-8') as f:
+                await f.write(json.dumps({"stored_at": stored_at, "value": value}))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Could not write result cache entry {key}: {e}")
+
+    def _remove_disk(self, key: str):
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached value for key, or None on a miss"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            if not self._expired(stored_at):
+                self.entries.move_to_end(key)
+                self.counters["hits"] += 1
+                self.counters["memory_hits"] += 1
+                return value
+            del self.entries[key]
+            self.counters["expirations"] += 1
+
+        if self.disk_dir:
+            record = await self._read_disk(key)
+            if record is not None:
+                stored_at, value = record
+                if not self._expired(stored_at):
+                    self._remember(key, value, stored_at)
+                    self.counters["hits"] += 1
+                    self.counters["disk_hits"] += 1
+                    return value
+                self._remove_disk(key)
+                self.counters["expirations"] += 1
+
+        self.counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        """Store value under key in both tiers"""
+        stored_at = time.time()
+        self._remember(key, value, stored_at)
+        if self.disk_dir:
+            await self._write_disk(key, value, stored_at)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "disk_enabled": bool(self.disk_dir),
+        }
+
+
+# Global cache instance (one per worker process)
+_analysis_cache: Optional[ResultCache] = None
+
+
+def get_analysis_cache() -> ResultCache:
+    """Get the /analyze result cache (singleton)"""
+    global _analysis_cache
+    if _analysis_cache is None:
+        _analysis_cache = ResultCache(
+            max_entries=config.ANALYSIS_CACHE_MAX_ENTRIES,
+            ttl=config.ANALYSIS_CACHE_TTL,
+            disk_dir=config.ANALYSIS_CACHE_DIR,
+        )
+    return _analysis_cache
+
+
+_extraction_cache: Optional[ResultCache] = None
+
+
+def get_extraction_cache() -> ResultCache:
+    """Get the extracted-text cache for /upload, keyed by file digest (singleton)"""
+    global _extraction_cache
+    if _extraction_cache is None:
+        _extraction_cache = ResultCache(
+            max_entries=config.EXTRACTION_CACHE_MAX_ENTRIES,
+            ttl=config.EXTRACTION_CACHE_TTL,
+            disk_dir=config.EXTRACTION_CACHE_DIR,
+        )
+    return _extraction_cache
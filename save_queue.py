@@ -0,0 +1,237 @@
+"""
+Write-behind persistence for /save
+Records go into a bounded in-process queue and /save answers immediately
+with the record's ID. A background writer drains the queue in batches: one
+CSV append and one database batch (a Firestore WriteBatch or a SQLite
+transaction) per batch, retried with exponential backoff. Batches that
+still fail are appended to a dead-letter file (JSON lines) so they can be
+replayed. close() flushes everything still queued.
+"""
+import csv
+import json
+import uuid
+import asyncio
+import logging
+from io import StringIO
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+import aiofiles
+
+from config import config
+from database import get_db
+
+logger = logging.getLogger(__name__)
+
+# Columns written to the CSV file (config.HEADERS)
+CSV_FIELDS = ("timestamp", "agent", "analysis_type", "page_title", "page_url", "result_text")
+
+
+class SaveQueueFull(Exception):
+    """The write-behind queue is at capacity"""
+
+
+class SaveQueue:
+    """
+    Bounded write-behind queue with a single background writer
+
+    A record is the save_analysis keyword arguments plus "id" and
+    "created_at". IDs come from the database when one is available, so the
+    ID returned by /save is the eventual document ID.
+    """
+
+    def __init__(self, max_size: int, batch_size: int, flush_interval: float,
+                 max_retries: int, retry_backoff: float, dead_letter_file: str,
+                 csv_file: Optional[str] = None):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.dead_letter_file = dead_letter_file
+        self.csv_file = csv_file
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional["asyncio.Task"] = None
+        self.closing = False
+        # Batch the writer is flushing right now (dead-lettered if shutdown times out)
+        self.in_flight: List[Dict[str, Any]] = []
+        self.counters = {
+            "accepted": 0,
+            "rejected": 0,
+            "written": 0,
+            "batches": 0,
+            "retries": 0,
+            "dead_lettered": 0,
+            "csv_errors": 0,
+        }
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+        self.flush_seconds_last = 0.0
+
+    def start(self):
+        if self.task is None:
+            self.queue = asyncio.Queue(maxsize=self.max_size)
+            self.closing = False
+            self.task = asyncio.ensure_future(self._run())
+
+    async def enqueue(self, **fields: Any) -> str:
+        """
+        Queue an analysis for writing and return its ID
+
+        Raises: SaveQueueFull when the queue is at capacity or shutting down
+        """
+        if self.task is None or self.closing:
+            raise SaveQueueFull("Save queue is not accepting records")
+        db = await get_db()
+        record_id = (db.new_analysis_id() if db else None) or uuid.uuid4().hex
+        record = {**fields, "id": record_id, "created_at": datetime.utcnow().isoformat()}
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            raise SaveQueueFull("Save queue is full, please retry shortly")
+        self.counters["accepted"] += 1
+        return record_id
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            record = await self.queue.get()
+            if record is None:
+                return
+            batch = [record]
+            stop = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        record = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+            self.in_flight = batch
+            await self._flush(batch)
+            self.in_flight = []
+            if stop:
+                return
+
+    async def _flush(self, batch: List[Dict[str, Any]]):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        if self.csv_file:
+            await self._write_csv(batch)
+        await self._write_db(batch)
+        elapsed = loop.time() - started
+        self.counters["batches"] += 1
+        self.flush_seconds_total += elapsed
+        self.flush_seconds_last = elapsed
+        self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+
+    async def _write_csv(self, batch: List[Dict[str, Any]]):
+        output = StringIO()
+        writer = csv.writer(output)
+        for record in batch:
+            writer.writerow([record.get(field, "") for field in CSV_FIELDS])
+        try:
+            async with aiofiles.open(self.csv_file, "a", encoding="utf-8") as f:
+                await f.write(output.getvalue())
+        except Exception as e:
+            self.counters["csv_errors"] += 1
+            logger.warning(f"Could not save {len(batch)} records to CSV: {e}")
+
+    async def _write_db(self, batch: List[Dict[str, Any]]):
+        db = await get_db()
+        if not db:
+            logger.debug("Database not available, skipping batch save")
+            return
+        analyses = [(record["id"], self._fields(record)) for record in batch]
+        for attempt in range(self.max_retries + 1):
+            try:
+                await db.save_analyses_batch(analyses)
+                self.counters["written"] += len(batch)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Failed to save {len(batch)} analyses after {attempt + 1} attempts: {e}")
+                    break
+                self.counters["retries"] += 1
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"Batch save failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        await self._dead_letter(batch)
+
+    @staticmethod
+    def _fields(record: Dict[str, Any]) -> Dict[str, Any]:
+        fields = {key: value for key, value in record.items() if key != "id"}
+        fields["created_at"] = datetime.fromisoformat(record["created_at"])
+        return fields
+
+    async def _dead_letter(self, batch: List[Dict[str, Any]]):
+        self.counters["dead_lettered"] += len(batch)
+        lines = "".join(json.dumps(record, default=str) + "\n" for record in batch)
+        try:
+            async with aiofiles.open(self.dead_letter_file, "a", encoding="utf-8") as f:
+                await f.write(lines)
+            logger.error(f"Wrote {len(batch)} unsaved analyses to {self.dead_letter_file}")
+        except Exception as e:
+            logger.error(f"Could not write dead-letter file, {len(batch)} analyses lost: {e}")
+
+    async def close(self, timeout: float):
+        """Stop accepting records and flush what is queued (dead-lettering it after timeout)"""
+        if self.task is None:
+            return
+        self.closing = True
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            self.task.cancel()
+            leftover = list(self.in_flight)
+            while not self.queue.empty():
+                record = self.queue.get_nowait()
+                if record is not None:
+                    leftover.append(record)
+            if leftover:
+                await self._dead_letter(leftover)
+        self.task = None
+
+    async def _drain(self):
+        await self.queue.put(None)
+        await asyncio.shield(self.task)
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self.counters["batches"]
+        return {
+            **self.counters,
+            "depth": self.queue.qsize() if self.queue else 0,
+            "max_size": self.max_size,
+            "flush_ms_last": round(self.flush_seconds_last * 1000, 2),
+            "flush_ms_mean": round(self.flush_seconds_total / batches * 1000, 2) if batches else 0.0,
+            "flush_ms_max": round(self.flush_seconds_max * 1000, 2),
+        }
+
+
+# Global queue instance (one per worker process)
+_queue: Optional[SaveQueue] = None
+
+
+def get_save_queue() -> SaveQueue:
+    """Get the /save write-behind queue (singleton)"""
+    global _queue
+    if _queue is None:
+        _queue = SaveQueue(
+            max_size=config.SAVE_QUEUE_MAX_SIZE,
+            batch_size=config.SAVE_BATCH_SIZE,
+            flush_interval=config.SAVE_FLUSH_INTERVAL,
+            max_retries=config.SAVE_MAX_RETRIES,
+            retry_backoff=config.SAVE_RETRY_BACKOFF,
+            dead_letter_file=config.SAVE_DEAD_LETTER_FILE,
+            csv_file=config.CSV_FILE if config.USE_CSV else None,
+        )
+    return _queue
@@ -0,0 +1,163 @@
+"""
+Scrape cache for ClauseCode AI
+Per-URL cache of cleaned /scrape-url text with HTTP validators (ETag /
+Last-Modified), so fresh entries are served without a fetch and stale ones
+are revalidated with a conditional request (a 304 costs no parsing)
+"""
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Any
+from urllib.parse import urlsplit, urlunsplit
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# cache_status values returned by /scrape-url
+HIT = "hit"                  # fresh entry, no request made
+REVALIDATED = "revalidated"  # stale entry confirmed by a 304
+REFRESHED = "refreshed"      # stale entry replaced by a new 200
+MISS = "miss"                # nothing cached
+STALE = "stale"              # stale entry served because the site failed
+BYPASS = "bypass"            # cache disabled or response not cacheable
+
+
+def normalize_url(url: str) -> str:
+    """Lowercased scheme/host, no fragment"""
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", parts.query, ""))
+
+
+def cache_key(url: str, variant: str = "") -> str:
+    """Cache key for a URL; variant separates different extractions of the same page"""
+    return f"{variant}|{normalize_url(url)}"
+
+
+def parse_ttl_rules(spec: str) -> List[Tuple[str, str, float]]:
+    """
+    Parse "host[/path]=seconds" rules separated by commas, most specific first
+
+    e.g. "united.com/terms=86400, example.com=600"
+    A host rule also matches its subdomains.
+    """
+    rules = []
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        target, seconds = item.rsplit("=", 1)
+        target = target.strip().lower()
+        try:
+            ttl = float(seconds)
+        except ValueError:
+            logger.warning(f"Ignoring scrape cache TTL rule {item.strip()!r}")
+            continue
+        host, _, path = target.partition("/")
+        rules.append((host.removeprefix("www."), "/" + path, ttl))
+    rules.sort(key=lambda rule: (len(rule[0]), len(rule[1])), reverse=True)
+    return rules
+
+
+class ScrapeEntry:
+    """Cleaned page text plus the validators needed to revalidate it"""
+
+    def __init__(self, text: str, title: str, etag: Optional[str], last_modified: Optional[str], ttl: float):
+        self.text = text
+        self.title = title
+        self.etag = etag
+        self.last_modified = last_modified
+        self.ttl = ttl
+        self.fetched_at = time.time()
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def is_fresh(self, max_age: Optional[float] = None) -> bool:
+        ttl = self.ttl if max_age is None else min(self.ttl, max_age)
+        return self.age <= ttl
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ScrapeCache:
+    """LRU of ScrapeEntry by normalized URL (and variant) with per-URL TTL rules"""
+
+    def __init__(self, max_entries: int, default_ttl: float, ttl_rules: str = ""):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.rules = parse_ttl_rules(ttl_rules)
+        self.entries: "OrderedDict[str, ScrapeEntry]" = OrderedDict()
+        self.counters = {HIT: 0, REVALIDATED: 0, REFRESHED: 0, MISS: 0, STALE: 0, BYPASS: 0, "evictions": 0}
+
+    def ttl_for(self, url: str) -> float:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").removeprefix("www.")
+        path = parts.path or "/"
+        for rule_host, rule_path, ttl in self.rules:
+            if (host == rule_host or host.endswith("." + rule_host)) and path.startswith(rule_path):
+                return ttl
+        return self.default_ttl
+
+    def get(self, url: str, variant: str = "") -> Optional[ScrapeEntry]:
+        """Entry for url (fresh or stale), or None"""
+        key = cache_key(url, variant)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, url: str, text: str, title: str, response_headers, variant: str = "") -> Optional[ScrapeEntry]:
+        """Cache a freshly parsed page; returns None if the site forbids storing it"""
+        cache_control = response_headers.get("cache-control", "").lower()
+        ttl = self.ttl_for(url)
+        if "no-store" in cache_control or ttl <= 0:
+            return None
+        entry = ScrapeEntry(text, title, response_headers.get("etag"), response_headers.get("last-modified"), ttl)
+        key = cache_key(url, variant)
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.counters["evictions"] += 1
+        return entry
+
+    def revalidated(self, entry: ScrapeEntry, response_headers):
+        """A 304 confirmed entry: restart its TTL and pick up updated validators"""
+        entry.fetched_at = time.time()
+        entry.etag = response_headers.get("etag") or entry.etag
+        entry.last_modified = response_headers.get("last-modified") or entry.last_modified
+
+    def record(self, status: str):
+        self.counters[status] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "default_ttl_seconds": self.default_ttl,
+            "ttl_rules": len(self.rules),
+        }
+
+
+# Global cache instance (one per worker process)
+_cache: Optional[ScrapeCache] = None
+
+
+def get_scrape_cache() -> ScrapeCache:
+    """Get the /scrape-url cache (singleton)"""
+    global _cache
+    if _cache is None:
+        _cache = ScrapeCache(
+            max_entries=config.SCRAPE_CACHE_MAX_ENTRIES,
+            default_ttl=config.SCRAPE_CACHE_TTL,
+            ttl_rules=config.SCRAPE_CACHE_TTL_RULES,
+        )
+    return _cache
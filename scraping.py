@@ -0,0 +1,158 @@
+"""
+Page fetching for ClauseCode AI's /scrape-url
+Streams the response body with the size limit enforced while it downloads,
+and rejects non-HTML responses from the headers alone, before any body is read.
+All fetches share global and per-host concurrency limits and a per-host
+request interval, so batch scrapes stay polite to each site.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import httpx
+
+from config import config
+
+# Content types we know how to turn into text ("" = server didn't say)
+PAGE_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain", "application/xml", "text/xml", "")
+
+
+class PageTooLarge(Exception):
+    """The page is bigger than the scrape size limit"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Page is larger than {max_bytes // (1024 * 1024)} MB")
+        self.max_bytes = max_bytes
+
+
+def media_type(response: httpx.Response) -> str:
+    """Lowercased content type without parameters (e.g. "text/html")"""
+    return response.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+
+
+def is_page(response: httpx.Response) -> bool:
+    return media_type(response) in PAGE_CONTENT_TYPES
+
+
+async def read_limited_body(response: httpx.Response, max_bytes: int) -> bytes:
+    """Read a streamed response body, stopping as soon as it exceeds max_bytes"""
+    declared = response.headers.get("content-length", "")
+    if max_bytes and declared.isdigit() and int(declared) > max_bytes:
+        raise PageTooLarge(max_bytes)
+    body = bytearray()
+    async for chunk in response.aiter_bytes():
+        body += chunk
+        if max_bytes and len(body) > max_bytes:
+            raise PageTooLarge(max_bytes)
+    return bytes(body)
+
+
+async def fetch_page(client: httpx.AsyncClient, url: str, headers: Dict[str, str],
+                     max_bytes: int) -> Tuple[httpx.Response, Optional[bytes]]:
+    """
+    GET url and return (response, body)
+
+    The body is only downloaded for a 200 with a page content type; otherwise
+    it's None and the caller decides from the status and headers.
+    Raises: PageTooLarge, httpx.RequestError
+    """
+    response = await client.send(client.build_request("GET", url, headers=headers), stream=True)
+    try:
+        if response.status_code != 200 or not is_page(response):
+            return response, None
+        return response, await read_limited_body(response, max_bytes)
+    finally:
+        await response.aclose()
+
+
+class _HostState:
+    def __init__(self, per_host: int):
+        self.semaphore = asyncio.Semaphore(per_host)
+        self.next_start = 0.0
+        self.users = 0
+
+
+# Sweep idle hosts once this many are tracked
+_HOST_SWEEP_THRESHOLD = 256
+
+
+class HostLimiter:
+    """
+    Global + per-host concurrency limits with a minimum interval between
+    request starts to the same host
+
+    A request first waits for its host (so requests queued for a slow host
+    don't hold global slots), then for its turn by interval, then for a
+    global slot.
+    """
+
+    def __init__(self, max_concurrency: int, per_host: int, min_interval: float):
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.min_interval = min_interval
+        self.global_slots = asyncio.Semaphore(max_concurrency)
+        self.hosts: Dict[str, _HostState] = {}
+        self.active = 0
+        self.counters = {"requests": 0, "throttled": 0}
+        self.throttled_seconds = 0.0
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        host = (urlsplit(url).hostname or "").lower()
+        loop = asyncio.get_running_loop()
+        state = self.hosts.get(host)
+        if state is None:
+            if len(self.hosts) >= _HOST_SWEEP_THRESHOLD:
+                self._sweep(loop.time())
+            state = self.hosts[host] = _HostState(self.per_host)
+        state.users += 1
+        try:
+            async with state.semaphore:
+                now = loop.time()
+                wait = state.next_start - now
+                state.next_start = max(now, state.next_start) + self.min_interval
+                if wait > 0:
+                    self.counters["throttled"] += 1
+                    self.throttled_seconds += wait
+                    await asyncio.sleep(wait)
+                async with self.global_slots:
+                    self.counters["requests"] += 1
+                    self.active += 1
+                    try:
+                        yield
+                    finally:
+                        self.active -= 1
+        finally:
+            state.users -= 1
+
+    def _sweep(self, now: float):
+        """Forget hosts with no queued requests whose interval has passed"""
+        for host in [host for host, state in self.hosts.items() if state.users == 0 and state.next_start <= now]:
+            del self.hosts[host]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "active": self.active,
+            "hosts": len(self.hosts),
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "max_concurrency": self.max_concurrency,
+            "per_host": self.per_host,
+            "min_interval_seconds": self.min_interval,
+        }
+
+
+# Global limiter instance (one per worker process)
+_limiter: Optional[HostLimiter] = None
+
+
+def get_host_limiter() -> HostLimiter:
+    """Get the scraping host limiter (singleton)"""
+    global _limiter
+    if _limiter is None:
+        _limiter = HostLimiter(
+            max_concurrency=config.SCRAPE_MAX_CONCURRENCY,
+            per_host=config.SCRAPE_PER_HOST_CONCURRENCY,
+            min_interval=config.SCRAPE_PER_HOST_INTERVAL,
+        )
+    return _limiter
@@ -15,11 +15,11 @@ from datetime import datetime
 import httpx
 from dotenv import load_dotenv
 import aiofiles
-import PyPDF2
-from docx import Document as DocxDocument
-from io import BytesIO
-from lxml import html as lxml_html
 import re
+import time
+import json as json_lib
+import asyncio
+from contextlib import nullcontext
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
 import secrets
@@ -31,7 +31,53 @@ load_dotenv()
 from config import config
 
 # Import database module
-from database import get_db
+from database import get_db, close_db, SUMMARY_FIELDS
+
+# Pooled outbound HTTP clients
+from http_clients import get_clients, get_client, OPENAI, SERPAPI, SCRAPE
+
+# /analyze result cache
+from result_cache import get_analysis_cache, get_extraction_cache, make_cache_key
+
+# Coalescing of identical in-flight OpenAI calls
+from singleflight import get_singleflight, singleflight_stats
+
+# Server-side follow-up conversations
+from conversations import get_conversations, CHARS_PER_TOKEN
+
+# Server-side store for extracted document text
+from documents import get_documents, DocumentNotFound
+
+# PDF/DOCX extraction off the event loop
+from extraction_pool import get_extraction_pool, get_html_pool, ExtractionError
+from extractors import EXTRACTOR_VERSION
+
+# Per-URL /scrape-url cache with conditional revalidation
+from scrape_cache import get_scrape_cache, normalize_url, HIT, REVALIDATED, REFRESHED, MISS, STALE, BYPASS
+
+# Size-limited page downloads for /scrape-url
+from scraping import fetch_page, media_type, get_host_limiter, PageTooLarge
+
+# Streaming, size-limited multipart uploads
+from uploads import receive_upload, UploadError
+
+# Single-pass text normalization shared by upload, scrape and analyze
+from text_normalize import normalize_text, TextNormalizer, PAGE_BREAK
+
+# Write-behind /save persistence
+from save_queue import get_save_queue, SaveQueueFull
+
+# Event loop lag sampling (shows blocking calls in /metrics)
+from loop_monitor import get_loop_monitor
+
+# Incremental parsing of streamed analysis JSON
+from json_stream import StreamingJSONParser
+
+# Map-reduce analysis of long documents
+from chunking import split_document, merge_analyses
+
+# Clause-level re-analysis of documents that were analyzed before
+from incremental import analyze_incrementally
 
 app = Sanic("ClauseCodeAI")
 CORS(app, supports_credentials=True)
@@ -54,6 +100,56 @@ SERPAPI_KEY = config.SERPAPI_KEY or ''
 CSV_FILE = config.CSV_FILE
 HEADERS = config.HEADERS
 
+class UpstreamError(Exception):
+    """Error response returned by an upstream API (e.g. OpenAI)"""
+
+DOCUMENT_NOT_FOUND_MESSAGE = 'Document not found or expired. Please upload or fetch it again.'
+
+def request_document_text(data: dict, text_field: str) -> str:
+    """
+    Text sent with a request: the stored document for 'docId' if given,
+    otherwise the raw data[text_field]
+
+    Raises: DocumentNotFound if docId is unknown or expired
+    """
+    doc_id = data.get('docId')
+    if doc_id:
+        return get_documents().require(doc_id).text
+    return data.get(text_field, '')
+
+def request_flag(value, default: bool) -> bool:
+    """Parse a boolean request field ("false", "0", "no" are false)"""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() not in ('0', 'false', 'no')
+
+def json_default(value):
+    """JSON encoding for values Firestore returns (datetimes become ISO 8601)"""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def dumps_json(body) -> str:
+    """json_response serializer for documents read from Firestore"""
+    return json_lib.dumps(body, default=json_default)
+
+def listing_fields(request):
+    """Fields to project from ?fields=a,b or ?view=summary|full (None = whole documents)"""
+    if request.args.get('fields'):
+        return [field.strip() for field in request.args.get('fields').split(',') if field.strip()]
+    view = request.args.get('view', 'full')
+    if view == 'summary':
+        return list(SUMMARY_FIELDS)
+    if view != 'full':
+        raise ValueError("view must be 'summary' or 'full'")
+    return None
+
+def wants_text(value) -> bool:
+    """Parse an include_text flag (defaults to True for older clients)"""
+    return request_flag(value, True)
+
 # Ensure CSV file exists with headers
 async def init_csv():
     try:
@@ -75,7 +171,7 @@ async def save_data(request):
         page_title = data.get('pageTitle', '')
         page_url = data.get('pageUrl', '')
         result_text = data.get('resultText', '')
-        page_content = data.get('pageContent', '')
+        page_content = request_document_text(data, 'pageContent')
         
         # Get user_id from session if authenticated
         user_id = None
@@ -83,101 +179,89 @@ async def save_data(request):
             user_data = request.ctx.session.get('user', {})
             user_id = user_data.get('user_id')
         
-        # Save to CSV (only if enabled - disabled on cloud deployments)
-        csv_saved = False
-        if config.USE_CSV:
-            try:
-                import csv as csv_module
-                from io import StringIO
-                
-                # Create CSV row
-                output = StringIO()
-                writer = csv_module.writer(output)
-                writer.writerow([timestamp, agent, analysis_type, page_title, page_url, result_text])
-                csv_line = output.getvalue()
-                
-                # Append to file asynchronously
-                async with aiofiles.open(CSV_FILE, 'a', encoding='utf-8') as f:
-                    await f.write(csv_line)
-                csv_saved = True
-            except Exception as e:
-                print(f"⚠️ Could not save to CSV: {e}")
-        
-        # Save to Firestore (if enabled)
-        firestore_doc_id = None
-        if config.USE_FIRESTORE:
-            try:
-                db = await get_db()
-                if db and db.initialized:
-                    firestore_doc_id = await db.save_analysis(
-                        timestamp=timestamp,
-                        agent=agent,
-                        analysis_type=analysis_type,
-                        page_title=page_title,
-                        page_url=page_url,
-                        result_text=result_text,
-                        page_content=page_content,
-                        user_id=user_id
-                    )
-            except Exception as e:
-                print(f"⚠️ Could not save to Firestore: {e}")
+        # Queue for CSV/Firestore; the background writer persists it in a batch
+        try:
+            record_id = await get_save_queue().enqueue(
+                timestamp=timestamp,
+                agent=agent,
+                analysis_type=analysis_type,
+                page_title=page_title,
+                page_url=page_url,
+                result_text=result_text,
+                page_content=page_content,
+                user_id=user_id
+            )
+        except SaveQueueFull as e:
+            return json_response({'status': 'error', 'message': str(e)}, status=503, headers={'Retry-After': '1'})
         
         # Build response
         response_data = {
-            'status': 'ok',
-            'message': 'Data processed successfully',
-            'saved_to': []
+            'status': 'accepted',
+            'message': 'Data accepted for saving',
+            'id': record_id,
+            'queued_for': []
         }
         
-        if csv_saved:
-            response_data['saved_to'].append('csv')
+        if config.USE_CSV:
+            response_data['queued_for'].append('csv')
         
-        if firestore_doc_id:
-            response_data['saved_to'].append('firestore')
-            response_data['firestore_doc_id'] = firestore_doc_id
+        db = await get_db()
+        if db:
+            response_data['queued_for'].append(db.backend)
+            if db.backend == 'firestore':
+                response_data['firestore_doc_id'] = record_id
         
-        return json_response(response_data, status=200)
+        return json_response(response_data, status=202)
     
+    except DocumentNotFound:
+        return json_response({'status': 'error', 'message': DOCUMENT_NOT_FOUND_MESSAGE}, status=404)
     except Exception as e:
         return json_response({'status': 'error', 'message': str(e)}, status=500)
 
 @app.route('/analyses', methods=['GET'])
 async def list_analyses(request):
-    """Get list of saved analyses from Firestore"""
+    """Get list of saved analyses (Firestore or SQLite)"""
     try:
         # Get query parameters
         limit = int(request.args.get('limit', 50))
         agent = request.args.get('agent', None)
         analysis_type = request.args.get('analysis_type', None)
         user_id = request.args.get('user_id', None)
+        cursor = request.args.get('cursor', None)
+        try:
+            fields = listing_fields(request)
+        except ValueError as e:
+            return json_response({'status': 'error', 'message': str(e)}, status=400)
         
-        # Get from Firestore
+        # Get from the analyses database
         db = await get_db()
         if not db or not db.initialized:
             return json_response({
                 'status': 'error',
-                'message': 'Firestore not available'
+                'message': 'Database not available'
             }, status=503)
         
-        analyses = await db.list_analyses(
-            limit=limit,
-            agent=agent,
-            analysis_type=analysis_type,
-            user_id=user_id
-        )
-        
-        # Convert datetime objects to ISO format for JSON
-        for analysis in analyses:
-            if 'timestamp' in analysis and hasattr(analysis['timestamp'], 'isoformat'):
-                analysis['timestamp'] = analysis['timestamp'].isoformat()
-            if 'created_at' in analysis and hasattr(analysis['created_at'], 'isoformat'):
-                analysis['created_at'] = analysis['created_at'].isoformat()
+        try:
+            analyses, next_cursor = await db.list_analyses_page(
+                limit=limit,
+                agent=agent,
+                analysis_type=analysis_type,
+                user_id=user_id,
+                cursor=cursor,
+                fields=fields
+            )
+        except ValueError as e:
+            return json_response({
+                'status': 'error',
+                'message': str(e)
+            }, status=400)
         
         return json_response({
             'status': 'ok',
             'count': len(analyses),
-            'analyses': analyses
-        }, status=200)
+            'analyses': analyses,
+            'next_cursor': next_cursor
+        }, status=200, dumps=dumps_json)
     
     except Exception as e:
         return json_response({
@@ -193,7 +277,7 @@ async def get_analysis(request, doc_id: str):
         if not db or not db.initialized:
             return json_response({
                 'status': 'error',
-                'message': 'Firestore not available'
+                'message': 'Database not available'
             }, status=503)
         
         analysis = await db.get_analysis(doc_id)
@@ -204,16 +288,10 @@ async def get_analysis(request, doc_id: str):
                 'message': 'Analysis not found'
             }, status=404)
         
-        # Convert datetime objects to ISO format
-        if 'timestamp' in analysis and hasattr(analysis['timestamp'], 'isoformat'):
-            analysis['timestamp'] = analysis['timestamp'].isoformat()
-        if 'created_at' in analysis and hasattr(analysis['created_at'], 'isoformat'):
-            analysis['created_at'] = analysis['created_at'].isoformat()
-        
         return json_response({
             'status': 'ok',
             'analysis': analysis
-        }, status=200)
+        }, status=200, dumps=dumps_json)
     
     except Exception as e:
         return json_response({
@@ -229,7 +307,7 @@ async def delete_analysis(request, doc_id: str):
         if not db or not db.initialized:
             return json_response({
                 'status': 'error',
-                'message': 'Firestore not available'
+                'message': 'Database not available'
             }, status=503)
         
         success = await db.delete_analysis(doc_id)
@@ -261,15 +339,21 @@ async def home(request):
         return json_response({
             'status': 'ok',
             'message': 'ClauseCode AI - Analysis Data Server',
-            'storage': 'Firestore' if config.USE_FIRESTORE else 'CSV',
+            'storage': getattr(await get_db(), 'backend', 'csv'),
             'endpoints': {
                 'save': 'POST /save (accepts JSON)',
-                'list_analyses': 'GET /analyses?limit=50&agent=&analysis_type=',
+                'list_analyses': 'GET /analyses?limit=50&agent=&analysis_type=&user_id=&cursor=&view=summary|full&fields=',
                 'get_analysis': 'GET /analyses/{doc_id}',
                 'view_analyses': 'GET /saved-analyses.html',
                 'health': 'GET /health',
                 'analyze': 'POST /analyze',
-                'upload': 'POST /upload'
+                'analyze_stream': 'POST /analyze/stream (Server-Sent Events)',
+                'analyze_batch': 'POST /analyze/batch (Server-Sent Events)',
+                'upload': 'POST /upload',
+                'upload_stream': 'POST /upload/stream (Server-Sent Events, PDF only)',
+                'scrape_url': 'POST /scrape-url',
+                'scrape_url_batch': 'POST /scrape-url/batch (NDJSON)',
+                'metrics': 'GET /metrics'
             }
         }, status=200)
 
@@ -457,6 +541,66 @@ async def get_current_user(request):
             'message': str(e)
         }, status=500)
 
+# Model and prompts used for follow-up questions
+CHAT_MODEL = 'gpt-5.1-chat-latest'
+QA_SYSTEM_PROMPT = 'You are a helpful assistant answering questions about a contract/document analysis. Be concise, accurate, and refer to specific parts of the contract or analysis when relevant. Format your response in clean HTML with proper headings (<h3>), paragraphs (<p>), lists (<ul>, <ol>), and styling (<strong>, <em>) for readability.'
+SUMMARIZE_PROMPT = 'Summarize the following conversation about a contract/document analysis in a few short paragraphs. Keep every question asked, the key facts and conclusions from the answers, and any user preferences. Plain text only.'
+
+def build_qa_prefix(page_content: str, analysis_result: str) -> list:
+    """Stable start of every follow-up conversation: instructions, document and analysis"""
+    return [
+        {
+            'role': 'system',
+            'content': QA_SYSTEM_PROMPT
+        },
+        {
+            'role': 'user',
+            'content': f'ORIGINAL CONTRACT/DOCUMENT:\n{page_content[:4000]}\n\nANALYSIS RESULT:\n{analysis_result[:4000]}'
+        },
+        {
+            'role': 'assistant',
+            'content': 'I understand. I have reviewed the contract and analysis. What would you like to know?'
+        }
+    ]
+
+async def chat_completion(messages: list) -> str:
+    """
+    Plain chat completion, coalescing identical in-flight requests
+
+    Raises: UpstreamError if OpenAI returns an error
+    """
+    payload = {
+        'model': CHAT_MODEL,
+        'messages': messages
+    }
+    
+    async def call_openai():
+        client = get_client(OPENAI)
+        response = await client.post(
+            'https://api.openai.com/v1/chat/completions',
+            headers={
+                'Content-Type': 'application/json',
+                'Authorization': f'Bearer {OPENAI_API_KEY}'
+            },
+            json=payload
+        )
+        return response.status_code, response.json()
+    
+    status_code, result = await get_singleflight('ask_question').do(make_cache_key(payload), call_openai)
+    
+    if status_code != 200:
+        raise UpstreamError(result.get('error', {}).get('message', 'OpenAI API error'))
+    
+    return result['choices'][0]['message']['content']
+
+async def summarize_turns(messages: list) -> str:
+    """Summarize older conversation turns for compaction"""
+    transcript = '\n\n'.join(f"{m['role'].upper()}: {m['content']}" for m in messages)
+    return await chat_completion([
+        {'role': 'system', 'content': SUMMARIZE_PROMPT},
+        {'role': 'user', 'content': transcript}
+    ])
+
 @app.route('/ask-question', methods=['POST'])
 async def ask_question(request):
     """Handle follow-up questions about analysis with conversation memory"""
@@ -466,7 +610,7 @@ async def ask_question(request):
         
         data = request.json
         question = data.get('question', '').strip()
-        page_content = data.get('pageContent', '')
+        page_content = request_document_text(data, 'pageContent')
         analysis_result = data.get('analysisResult', '')
         conversation_history = data.get('conversationHistory', [])
         
@@ -474,20 +618,7 @@ async def ask_question(request):
             return json_response({'error': 'Question is required'}, status=400)
         
         # Build conversation messages with memory
-        messages = [
-            {
-                'role': 'system',
-                'content': 'You are a helpful assistant answering questions about a contract/document analysis. Be concise, accurate, and refer to specific parts of the contract or analysis when relevant. Format your response in clean HTML with proper headings (<h3>), paragraphs (<p>), lists (<ul>, <ol>), and styling (<strong>, <em>) for readability.'
-            },
-            {
-                'role': 'user',
-                'content': f'ORIGINAL CONTRACT/DOCUMENT:\n{page_content[:4000]}\n\nANALYSIS RESULT:\n{analysis_result[:4000]}'
-            },
-            {
-                'role': 'assistant',
-                'content': 'I understand. I have reviewed the contract and analysis. What would you like to know?'
-            }
-        ]
+        messages = build_qa_prefix(page_content, analysis_result)
         
         # Add conversation history
         for msg in conversation_history:
@@ -502,296 +633,577 @@ async def ask_question(request):
             'content': question
         })
         
-        # Call OpenAI API
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                'https://api.openai.com/v1/chat/completions',
-                headers={
-                    'Content-Type': 'application/json',
-                    'Authorization': f'Bearer {OPENAI_API_KEY}'
-                },
-                json={
-                    'model': 'gpt-5.1-chat-latest',
-                    'messages': messages
-                }
-            )
+        # Call OpenAI API (identical questions already in flight share one call)
+        try:
+            answer = await chat_completion(messages)
+        except UpstreamError as e:
+            return json_response({'error': str(e)}, status=400)
         
-        if response.status_code != 200:
-            error_data = response.json()
-            error_message = error_data.get('error', {}).get('message', 'OpenAI API error')
-            return json_response({'error': error_message}, status=400)
+        return json_response({
+            'status': 'ok',
+            'answer': answer
+        }, status=200)
+    
+    except DocumentNotFound:
+        return json_response({'error': DOCUMENT_NOT_FOUND_MESSAGE}, status=404)
+    except Exception as e:
+        return json_response({'error': str(e)}, status=500)
+
+@app.route('/conversations', methods=['POST'])
+async def create_conversation(request):
+    """Start a server-side follow-up conversation about a document and its analysis"""
+    try:
+        data = request.json or {}
+        page_content = request_document_text(data, 'pageContent')
+        analysis_result = data.get('analysisResult', '')
+        
+        if not analysis_result:
+            return json_response({'error': 'analysisResult is required'}, status=400)
         
-        result = response.json()
-        answer = result['choices'][0]['message']['content']
+        conversation = get_conversations().create(build_qa_prefix(page_content, analysis_result))
         
         return json_response({
             'status': 'ok',
-            'answer': answer
+            'conversation_id': conversation.id
         }, status=200)
     
+    except DocumentNotFound:
+        return json_response({'error': DOCUMENT_NOT_FOUND_MESSAGE}, status=404)
     except Exception as e:
         return json_response({'error': str(e)}, status=500)
 
+@app.route('/conversations/<conversation_id>/messages', methods=['POST'])
+async def conversation_message(request, conversation_id: str):
+    """Ask the next question in a server-side conversation (only the question is sent)"""
+    try:
+        if not OPENAI_API_KEY:
+            return json_response({'error': 'OpenAI API key not configured'}, status=500)
+        
+        conversation = get_conversations().get(conversation_id)
+        if not conversation:
+            return json_response({'error': 'Conversation not found or expired'}, status=404)
+        
+        data = request.json or {}
+        question = data.get('question', '').strip()
+        if not question:
+            return json_response({'error': 'Question is required'}, status=400)
+        
+        # One turn at a time per conversation so history stays ordered
+        async with conversation.lock:
+            try:
+                answer = await chat_completion(conversation.messages(question))
+            except UpstreamError as e:
+                return json_response({'error': str(e)}, status=400)
+            conversation.add_turn(question, answer)
+        
+        # Fold old turns into the rolling summary off the request path
+        if conversation.needs_compaction():
+            get_conversations().counters['compactions'] += 1
+            asyncio.ensure_future(conversation.compact(summarize_turns))
+        
+        return json_response({
+            'status': 'ok',
+            'answer': answer,
+            'turns': conversation.turn_count
+        }, status=200)
+    
+    except Exception as e:
+        return json_response({'error': str(e)}, status=500)
+
+@app.route('/conversations/<conversation_id>', methods=['GET'])
+async def get_conversation(request, conversation_id: str):
+    """Get the summary and recent turns of a conversation"""
+    conversation = get_conversations().get(conversation_id)
+    if not conversation:
+        return json_response({'error': 'Conversation not found or expired'}, status=404)
+    return json_response({'status': 'ok', **conversation.to_dict()}, status=200)
+
+@app.route('/conversations/<conversation_id>', methods=['DELETE'])
+async def delete_conversation(request, conversation_id: str):
+    """End a conversation"""
+    if not get_conversations().delete(conversation_id):
+        return json_response({'error': 'Conversation not found or expired'}, status=404)
+    return json_response({'status': 'ok', 'message': 'Conversation deleted'}, status=200)
+
 @app.route('/health', methods=['GET'])
 async def health(request):
     return json_response({'status': 'ok', 'message': 'Server is running'}, status=200)
 
-@app.route('/upload', methods=['POST'])
+@app.route('/documents/<doc_id>', methods=['GET'])
+async def get_document(request, doc_id: str):
+    """Metadata and a preview of a stored document (?preview_chars=N)"""
+    document = get_documents().get(doc_id)
+    if not document:
+        return json_response({'error': DOCUMENT_NOT_FOUND_MESSAGE}, status=404)
+    try:
+        preview_chars = int(request.args.get('preview_chars', config.DOCUMENT_PREVIEW_CHARS))
+    except ValueError:
+        return json_response({'error': 'preview_chars must be an integer'}, status=400)
+    return json_response({'status': 'ok', **document.describe(max(preview_chars, 0))}, status=200)
+
+@app.route('/documents/<doc_id>/text', methods=['GET'])
+async def get_document_text(request, doc_id: str):
+    """Full normalized text of a stored document"""
+    document = get_documents().get(doc_id)
+    if not document:
+        return json_response({'error': DOCUMENT_NOT_FOUND_MESSAGE}, status=404)
+    return response.text(document.text)
+
+@app.route('/metrics', methods=['GET'])
+async def metrics(request):
+    """Runtime metrics for this worker process"""
+    return json_response({
+        'status': 'ok',
+        'pid': os.getpid(),
+        'http_pools': get_clients().pool_stats(),
+        'analysis_cache': get_analysis_cache().stats(),
+        'singleflight': singleflight_stats(),
+        'conversations': get_conversations().stats(),
+        'documents': get_documents().stats(),
+        'extraction': get_extraction_pool().stats(),
+        'html_parsing': get_html_pool().stats(),
+        'extraction_cache': get_extraction_cache().stats(),
+        'scrape_cache': get_scrape_cache().stats(),
+        'scrape_limits': get_host_limiter().stats(),
+        'save_queue': get_save_queue().stats(),
+        'loop_lag': get_loop_monitor().stats()
+    }, status=200)
+
+async def receive_file(request):
+    """Spool the 'file' field of a streamed multipart upload (raises UploadError)"""
+    return await receive_upload(
+        request,
+        'file',
+        max_bytes=config.UPLOAD_MAX_BYTES,
+        spool_bytes=config.UPLOAD_SPOOL_BYTES,
+        tmp_dir=config.UPLOAD_TMP_DIR
+    )
+
+def extraction_cache_key(uploaded_file, kind: str, max_pages, max_chars) -> str:
+    """Cache key for extracted text: file digest, extractor version and early-exit limits"""
+    return make_cache_key(uploaded_file.digest, kind, EXTRACTOR_VERSION, max_pages, max_chars)
+
+def extraction_limits(request) -> tuple:
+    """max_pages / max_chars query parameters for early-exit extraction (None = no limit)"""
+    max_pages = request.args.get('max_pages')
+    max_chars = request.args.get('max_chars')
+    return (int(max_pages) if max_pages else None, int(max_chars) if max_chars else None)
+
+@app.route('/upload', methods=['POST'], stream=True)
 async def upload_file(request):
     """Handle file uploads (PDF, Word documents)"""
+    uploaded_file = None
     try:
-        if not request.files:
-            return json_response({'error': 'No file uploaded'}, status=400)
-        
-        uploaded_file = request.files.get('file')
-        if not uploaded_file:
-            return json_response({'error': 'No file in request'}, status=400)
+        # Stream the body to memory/disk with the size limit enforced as it arrives
+        try:
+            uploaded_file = await receive_file(request)
+        except UploadError as e:
+            return json_response({'error': str(e)}, status=e.status)
         
-        file_content = uploaded_file.body
-        file_name = uploaded_file.name
+        file_name = uploaded_file.filename
         
-        # Extract text based on file type
-        text = ''
+        # Extract text based on file type (in the extraction pool, off the event loop)
         if file_name.lower().endswith('.pdf'):
-            text = extract_pdf_text(file_content)
+            kind = 'pdf'
         elif file_name.lower().endswith(('.doc', '.docx')):
-            text = extract_docx_text(file_content)
+            kind = 'docx'
         else:
             return json_response({'error': 'Unsupported file type. Please upload PDF or Word documents.'}, status=400)
         
+        # Optional early exit: only the first max_pages pages / max_chars characters
+        try:
+            max_pages, max_chars = extraction_limits(request)
+        except ValueError:
+            return json_response({'error': 'max_pages and max_chars must be integers'}, status=400)
+        
+        # Re-uploads of the same file skip extraction entirely
+        cache = get_extraction_cache() if config.EXTRACTION_CACHE_ENABLED else None
+        cache_key = extraction_cache_key(uploaded_file, kind, max_pages, max_chars)
+        cached = await cache.get(cache_key) if cache else None
+        
+        if cached is not None:
+            text = cached['text']
+        else:
+            try:
+                text = await get_extraction_pool().extract(kind, uploaded_file.source(), max_pages=max_pages, max_chars=max_chars)
+            except ExtractionError as e:
+                return json_response({'error': str(e)}, status=400)
+            if cache and text:
+                await cache.set(cache_key, {'text': text})
+        
         if not text:
             return json_response({'error': 'Could not extract text from document'}, status=400)
         
-        return json_response({
+        # Keep the normalized text server-side; later calls can send doc_id instead
+        # Page furniture only exists in paginated (PDF) text
+        document = get_documents().put(normalize_text(text, strip_boilerplate=(kind == 'pdf')),
+                                       source='upload', filename=file_name)
+        
+        response_data = {
             'status': 'ok',
-            'text': text,
-            'filename': file_name
-        }, status=200)
+            'filename': file_name,
+            'cached': cached is not None,
+            'doc_id': document.doc_id,
+            'length': len(document.text),
+            'preview': document.text[:config.DOCUMENT_PREVIEW_CHARS]
+        }
+        if wants_text(request.args.get('include_text')):
+            response_data['text'] = text.replace(PAGE_BREAK, '\n')
+        
+        return json_response(response_data, status=200)
     
     except Exception as e:
         return json_response({'error': str(e)}, status=500)
+    finally:
+        if uploaded_file:
+            uploaded_file.close()
+
+@app.route('/upload/stream', methods=['POST'], stream=True)
+async def upload_file_stream(request):
+    """
+    Upload a PDF and stream its text back over Server-Sent Events as pages are extracted
 
-def extract_pdf_text(file_content):
-    """Extract text from PDF file"""
+    Events:
+      pages - {"start": 0, "pages": ["page 1 text", ...]} in page order
+      text  - {"text": "..."} the whole text at once when it was already cached
+      done  - {"doc_id", "length", "preview", "filename"}
+      error - {"error": "..."}
+    Supports the same max_pages / max_chars query parameters as /upload.
+    """
+    try:
+        max_pages, max_chars = extraction_limits(request)
+    except ValueError:
+        return json_response({'error': 'max_pages and max_chars must be integers'}, status=400)
+    
+    try:
+        uploaded_file = await receive_file(request)
+    except UploadError as e:
+        return json_response({'error': str(e)}, status=e.status)
+    
+    file_name = uploaded_file.filename
+    if not file_name.lower().endswith('.pdf'):
+        uploaded_file.close()
+        return json_response({'error': 'Streaming extraction supports PDF files only. Use /upload for Word documents.'}, status=400)
+    
+    response = await request.respond(
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    
     try:
-        pdf_file = BytesIO(file_content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ''
-        for page in pdf_reader.pages:
-            text += page.extract_text() + '\n'
-        return text.strip()
+        cache = get_extraction_cache() if config.EXTRACTION_CACHE_ENABLED else None
+        cache_key = extraction_cache_key(uploaded_file, 'pdf', max_pages, max_chars)
+        cached = await cache.get(cache_key) if cache else None
+        
+        if cached is not None:
+            # Already extracted: send the whole text at once
+            text = cached['text']
+            normalized = normalize_text(text)
+            await response.send(sse_event('text', {'text': text.replace(PAGE_BREAK, '\n')}))
+        else:
+            # Normalize batch by batch while the rest of the document is still being extracted
+            all_pages = []
+            normalizer = TextNormalizer()
+            normalized_parts = []
+            async for start, pages in get_extraction_pool().stream_pdf_pages(
+                    uploaded_file.source(), max_pages=max_pages, max_chars=max_chars):
+                all_pages.extend(pages)
+                normalized_parts.append(normalizer.feed(''.join(page + PAGE_BREAK for page in pages)))
+                await response.send(sse_event('pages', {'start': start, 'pages': pages}))
+            normalized_parts.append(normalizer.finish())
+            normalized = ''.join(normalized_parts)
+            
+            text = PAGE_BREAK.join(all_pages).strip()
+            if max_chars:
+                text = text[:max_chars]
+                normalized = normalized[:max_chars]
+            if cache and text:
+                await cache.set(cache_key, {'text': text})
+        
+        if not normalized:
+            await response.send(sse_event('error', {'error': 'Could not extract text from document'}))
+        else:
+            document = get_documents().put(normalized, source='upload', filename=file_name)
+            await response.send(sse_event('done', {
+                'filename': file_name,
+                'cached': cached is not None,
+                'doc_id': document.doc_id,
+                'length': len(document.text),
+                'preview': document.text[:config.DOCUMENT_PREVIEW_CHARS]
+            }))
     except Exception as e:
-        print(f"PDF extraction error: {e}")
-        return ''
+        await response.send(sse_event('error', {'error': str(e)}))
+    finally:
+        uploaded_file.close()
+    await response.eof()
 
-def extract_docx_text(file_content):
-    """Extract text from Word document"""
+def request_max_age(value):
+    """Optional client max_age (seconds) for cached scrapes; 0 forces revalidation"""
     try:
-        doc_file = BytesIO(file_content)
-        doc = DocxDocument(doc_file)
-        text = '\n'.join([paragraph.text for paragraph in doc.paragraphs])
-        return text.strip()
-    except Exception as e:
-        print(f"DOCX extraction error: {e}")
-        return ''
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
 
-@app.route('/scrape-url', methods=['POST'])
-async def scrape_url(request):
-    """Scrape content from a URL"""
+def scrape_result(url: str, title: str, text: str, cache_status: str, include_text: bool,
+                  timings_ms: dict = None, main_content: dict = None) -> dict:
+    """Store scraped text server-side and build the /scrape-url response"""
+    get_scrape_cache().record(cache_status)
+    # Keep the normalized text server-side; later calls can send doc_id instead
+    document = get_documents().put(text, source='url', url=url, title=title)
+    response_data = {
+        'status': 'ok',
+        'url': url,
+        'title': title,
+        'cache_status': cache_status,
+        'doc_id': document.doc_id,
+        'length': len(document.text),
+        'preview': document.text[:config.DOCUMENT_PREVIEW_CHARS]
+    }
+    if timings_ms:
+        response_data['timings_ms'] = timings_ms
+    if main_content:
+        response_data['main_content'] = main_content
+    if include_text:
+        response_data['text'] = document.text
+    return response_data
+
+class ScrapeError(Exception):
+    """A URL could not be scraped; status is the HTTP status to return"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+def scrape_target(raw_url) -> str:
+    """Validate a user-supplied URL and add https:// if missing (raises ScrapeError)"""
+    url = (raw_url or '').strip() if isinstance(raw_url, str) else ''
+    
+    if not url:
+        raise ScrapeError('URL is required')
+    
+    # Check if input looks like content instead of a URL
+    if len(url) > 200 or '\n' in url or url.count(' ') > 10:
+        raise ScrapeError('It looks like you pasted content instead of a URL. Please paste only the website address (e.g., united.com/terms), or use the "Paste Text" option instead.')
+    
+    # Validate URL format
+    if not re.match(r'^[\w\-\.]+\.[a-zA-Z]{2,}', url) and not url.startswith(('http://', 'https://')):
+        raise ScrapeError('Invalid URL format. Please enter a valid website address (e.g., example.com or https://example.com)')
+    
+    # Add protocol if missing
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    return url
+
+async def scrape_page(url: str, include_text: bool = True, main_content: bool = None,
+                      max_age: float = None, host_limited: bool = False) -> dict:
+    """
+    Fetch, extract and store one page; returns the /scrape-url response body
+    
+    Pages are cached per URL: fresh entries are returned without a request,
+    stale ones are revalidated with If-None-Match / If-Modified-Since, and a
+    stale copy is served if the site is down. cache_status is one of hit,
+    revalidated, refreshed, miss, stale or bypass. max_age (seconds) limits
+    how old a cached copy may be.
+    
+    With main_content (default SCRAPE_MAIN_CONTENT) only the page body is
+    kept; navigation, cookie banners, footers and link lists are dropped and
+    the response reports how many characters/tokens that removed.
+    
+    With host_limited (batch scraping), network fetches go through the shared
+    global / per-host limiter; a single interactive request is never throttled.
+    Raises: ScrapeError
+    """
+    if main_content is None:
+        main_content = config.SCRAPE_MAIN_CONTENT
+    cache_variant = 'main' if main_content else 'full'
+    scrape_cache = get_scrape_cache() if config.SCRAPE_CACHE_ENABLED else None
+    cached_page = scrape_cache.get(url, cache_variant) if scrape_cache else None
+    if cached_page is not None and cached_page.is_fresh(max_age):
+        return scrape_result(url, cached_page.title, cached_page.text, HIT, include_text)
+    
+    # Enhanced headers to appear more like a real browser
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1',
+        'Sec-Fetch-Dest': 'document',
+        'Sec-Fetch-Mode': 'navigate',
+        'Sec-Fetch-Site': 'none'
+    }
+    if cached_page is not None:
+        headers.update(cached_page.conditional_headers())
+    
     try:
-        data = request.json
-        url = data.get('url', '').strip()
-        
-        if not url:
-            return json_response({'error': 'URL is required'}, status=400)
-        
-        # Check if input looks like content instead of a URL
-        if len(url) > 200 or '\n' in url or url.count(' ') > 10:
-            return json_response({
-                'error': 'It looks like you pasted content instead of a URL. Please paste only the website address (e.g., united.com/terms), or use the "Paste Text" option instead.'
-            }, status=400)
+        # Fetch the URL content through the shared scraping pool; the body is
+        # only downloaded for HTML-like pages, and never past SCRAPE_MAX_BYTES
+        client = get_client(SCRAPE)
+        try:
+            async with (get_host_limiter().slot(url) if host_limited else nullcontext()):
+                download_started = time.perf_counter()
+                response, content = await fetch_page(client, url, headers, config.SCRAPE_MAX_BYTES)
+        except PageTooLarge as e:
+            raise ScrapeError(f'{e}. Please copy and paste the relevant section of the page instead.')
+        except httpx.TimeoutException:
+            if cached_page is not None:
+                return scrape_result(url, cached_page.title, cached_page.text, STALE, include_text)
+            raise ScrapeError('The website took too long to respond (timeout after 45 seconds). The site may be slow or blocking automated access.')
+        except httpx.ConnectError:
+            if cached_page is not None:
+                return scrape_result(url, cached_page.title, cached_page.text, STALE, include_text)
+            raise ScrapeError('Could not connect to the website. Please check the URL and try again.')
         
-        # Validate URL format
-        if not re.match(r'^[\w\-\.]+\.[a-zA-Z]{2,}', url) and not url.startswith(('http://', 'https://')):
-            return json_response({
-                'error': 'Invalid URL format. Please enter a valid website address (e.g., example.com or https://example.com)'
-            }, status=400)
+        download_ms = round((time.perf_counter() - download_started) * 1000, 3)
         
-        # Add protocol if missing
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
-        
-        # Enhanced headers to appear more like a real browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Cache-Control': 'max-age=0'
-        }
-        
-        # Try to fetch the URL content with better configuration
-        async with httpx.AsyncClient(
-            timeout=45.0, 
-            follow_redirects=True,
-            verify=True,  # Keep SSL verification
-            max_redirects=10
-        ) as client:
-            try:
-                response = await client.get(url, headers=headers)
-            except httpx.TimeoutException:
-                return json_response({
-                    'error': 'The website took too long to respond (timeout after 45 seconds). The site may be slow or blocking automated access.'
-                }, status=400)
-            except httpx.ConnectError:
-                return json_response({
-                    'error': 'Could not connect to the website. Please check the URL and try again.'
-                }, status=400)
+        # Unchanged since we cached it: no parsing needed
+        if response.status_code == 304 and cached_page is not None:
+            scrape_cache.revalidated(cached_page, response.headers)
+            return scrape_result(url, cached_page.title, cached_page.text, REVALIDATED, include_text)
+        if response.status_code >= 500 and cached_page is not None:
+            return scrape_result(url, cached_page.title, cached_page.text, STALE, include_text)
         
         # Check response status
         if response.status_code == 403:
-            return json_response({
-                'error': 'Access forbidden: This website is blocking automated access. Please try copying and pasting the text content manually instead.'
-            }, status=400)
+            raise ScrapeError('Access forbidden: This website is blocking automated access. Please try copying and pasting the text content manually instead.')
         elif response.status_code == 404:
-            return json_response({
-                'error': 'Page not found (404). Please check the URL and try again.'
-            }, status=400)
+            raise ScrapeError('Page not found (404). Please check the URL and try again.')
         elif response.status_code == 429:
-            return json_response({
-                'error': 'Rate limited: The website is blocking too many requests. Please wait a moment and try again.'
-            }, status=400)
+            raise ScrapeError('Rate limited: The website is blocking too many requests. Please wait a moment and try again.')
         elif response.status_code >= 500:
-            return json_response({
-                'error': f'The website is experiencing server errors (HTTP {response.status_code}). Please try again later.'
-            }, status=400)
+            raise ScrapeError(f'The website is experiencing server errors (HTTP {response.status_code}). Please try again later.')
         elif response.status_code != 200:
-            return json_response({
-                'error': f'Failed to fetch URL: HTTP {response.status_code}. The website may be blocking automated access.'
-            }, status=400)
+            raise ScrapeError(f'Failed to fetch URL: HTTP {response.status_code}. The website may be blocking automated access.')
         
         # Check if we got an actual HTML page (not JSON API response or redirect page)
-        content_type = response.headers.get('content-type', '').lower()
-        if 'application/json' in content_type:
-            return json_response({
-                'error': 'This URL returns JSON data instead of a webpage. Please use a regular webpage URL.'
-            }, status=400)
+        content_type = media_type(response)
+        if content_type == 'application/json':
+            raise ScrapeError('This URL returns JSON data instead of a webpage. Please use a regular webpage URL.')
+        if content is None:
+            raise ScrapeError(f'This URL returns a {content_type} file instead of a webpage. Please use a regular webpage URL, or upload the file instead.')
         
-        # Parse HTML and extract text
+        # Parse HTML, remove script/style elements and extract text off the event loop
         try:
-            tree = lxml_html.fromstring(response.content)
-        except Exception as e:
-            return json_response({
-                'error': 'Could not parse the webpage content. The page may be using dynamic JavaScript that requires a browser to view.'
-            }, status=400)
-        
-        # Remove script and style elements
-        for element in tree.xpath('//script | //style | //noscript | //iframe'):
-            element.getparent().remove(element)
-        
-        # Get text content
-        text = tree.text_content()
-        
-        # Clean up the text
-        text = re.sub(r'\n\s*\n', '\n\n', text)  # Remove excessive blank lines
-        text = re.sub(r' +', ' ', text)  # Remove excessive spaces
-        text = text.strip()
+            page = await get_html_pool().extract_html(content, main_content)
+        except ExtractionError:
+            raise ScrapeError('Could not parse the webpage content. The page may be using dynamic JavaScript that requires a browser to view.')
+        text = page['text']
+        timings_ms = {'download': download_ms, **page['timings_ms']}
+        main_content_report = None
+        if main_content:
+            chars_removed = page['full_chars'] - len(text)
+            main_content_report = {
+                'applied': page['main_content'],
+                'chars_removed': chars_removed,
+                'tokens_removed': chars_removed // CHARS_PER_TOKEN,
+                'reduction': round(chars_removed / page['full_chars'], 3) if page['full_chars'] else 0.0
+            }
         
         # Check if we got meaningful content
         if not text or len(text) < 100:
-            return json_response({
-                'error': 'Could not extract meaningful text from this page. The website may use JavaScript to load content dynamically, or may be blocking automated access. Please try copying and pasting the text manually instead.'
-            }, status=400)
+            raise ScrapeError('Could not extract meaningful text from this page. The website may use JavaScript to load content dynamically, or may be blocking automated access. Please try copying and pasting the text manually instead.')
         
-        # Get page title
-        title_elements = tree.xpath('//title/text()')
-        page_title = title_elements[0].strip() if title_elements else 'Untitled Page'
+        page_title = page['title'] or 'Untitled Page'
         
-        return json_response({
-            'status': 'ok',
-            'text': text,
-            'url': url,
-            'title': page_title
-        }, status=200)
+        cache_status = BYPASS
+        if scrape_cache is not None and scrape_cache.put(url, text, page_title, response.headers, cache_variant) is not None:
+            cache_status = REFRESHED if cached_page is not None else MISS
+        
+        return scrape_result(url, page_title, text, cache_status, include_text, timings_ms, main_content_report)
     
+    except ScrapeError:
+        raise
     except httpx.TooManyRedirects:
-        return json_response({
-            'error': 'Too many redirects. The website may be misconfigured or blocking automated access.'
-        }, status=400)
+        raise ScrapeError('Too many redirects. The website may be misconfigured or blocking automated access.')
     except httpx.RequestError as e:
         error_msg = str(e).lower()
         if 'ssl' in error_msg or 'certificate' in error_msg:
-            return json_response({
-                'error': 'SSL certificate error. The website may have security issues or be blocking automated access.'
-            }, status=400)
-        return json_response({
-            'error': f'Failed to fetch URL: {str(e)}. The website may be blocking automated access or temporarily unavailable.'
-        }, status=400)
+            raise ScrapeError('SSL certificate error. The website may have security issues or be blocking automated access.')
+        raise ScrapeError(f'Failed to fetch URL: {str(e)}. The website may be blocking automated access or temporarily unavailable.')
     except Exception as e:
-        return json_response({
-            'error': f'An unexpected error occurred: {str(e)}. Please try copying and pasting the text manually instead.'
-        }, status=500)
+        raise ScrapeError(f'An unexpected error occurred: {str(e)}. Please try copying and pasting the text manually instead.', status=500)
 
-def clean_text_content(text: str) -> str:
-    """Clean and normalize text content to avoid triggering AI guardrails"""
-    if not text:
-        return text
-    
-    # Remove excessive blank lines
-    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
-    
-    # Remove excessive spaces
-    text = re.sub(r' {3,}', ' ', text)
-    
-    # Remove tabs
-    text = text.replace('\t', ' ')
-    
-    # Normalize line breaks
-    text = re.sub(r'\r\n', '\n', text)
+def scrape_options(data: dict) -> dict:
+    """include_text / main_content / max_age from a /scrape-url or /scrape-url/batch body"""
+    return {
+        'include_text': wants_text(data.get('include_text')),
+        'main_content': request_flag(data.get('main_content'), config.SCRAPE_MAIN_CONTENT),
+        'max_age': request_max_age(data.get('max_age'))
+    }
+
+@app.route('/scrape-url', methods=['POST'])
+async def scrape_url(request):
+    """Scrape content from a URL (see scrape_page)"""
+    data = request.json or {}
+    try:
+        url = scrape_target(data.get('url'))
+        return json_response(await scrape_page(url, **scrape_options(data)), status=200)
+    except ScrapeError as e:
+        return json_response({'error': str(e)}, status=e.status)
+
+@app.route('/scrape-url/batch', methods=['POST'])
+async def scrape_url_batch(request):
+    """
+    Scrape many URLs, streaming one NDJSON line per URL as soon as it finishes
     
-    # Remove zero-width characters and other invisible Unicode
-    text = re.sub(r'[\u200b-\u200f\u202a-\u202e\ufeff]', '', text)
+    Body: {"urls": [...], "include_text": false, "main_content": true, "max_age": 3600}
+    Each line is {"type": "result", "index", "url", ...the /scrape-url response}
+    or {"type": "result", "index", "url", "error", "status_code"}, followed by a
+    final {"type": "done", "count", "failed"}. Fetches share the scraping pool
+    and the global / per-host concurrency and rate limits, so one slow host
+    doesn't hold up the others. A URL listed more than once is fetched once
+    and reported at each of its indexes.
+    """
+    data = request.json or {}
+    urls = data.get('urls') or []
+    if not isinstance(urls, list) or not urls:
+        return json_response({'error': 'urls must be a non-empty list'}, status=400)
+    if len(urls) > config.SCRAPE_BATCH_MAX_URLS:
+        return json_response({
+            'error': f'Too many URLs requested (max {config.SCRAPE_BATCH_MAX_URLS})'
+        }, status=400)
+    options = scrape_options(data)
+    fetches = {}  # normalized URL -> fetch task, so repeated URLs are fetched once
     
-    # Strip leading/trailing whitespace
-    text = text.strip()
+    async def run_one(index: int, raw_url) -> dict:
+        payload = {'type': 'result', 'index': index, 'url': raw_url}
+        try:
+            url = scrape_target(raw_url)
+            key = normalize_url(url)
+            if key not in fetches:
+                fetches[key] = asyncio.ensure_future(scrape_page(url, host_limited=True, **options))
+            payload.update(await asyncio.shield(fetches[key]))
+        except ScrapeError as e:
+            payload['error'] = str(e)
+            payload['status_code'] = e.status
+        return payload
     
-    return text
-
-@app.route('/analyze', methods=['POST'])
-async def analyze(request):
-    """Analyze page content using AI - returns structured JSON"""
+    response = await request.respond(
+        content_type='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    tasks = [asyncio.ensure_future(run_one(i, raw_url)) for i, raw_url in enumerate(urls)]
+    failed = 0
     try:
-        print("=== /analyze endpoint called ===", flush=True)
-        sys.stdout.flush()
-        
-        if not OPENAI_API_KEY:
-            print("ERROR: OpenAI API key not configured", flush=True)
-            return json_response({'error': 'OpenAI API key not configured in .env'}, status=500)
-
-        # Log API key status (masked for security)
-        key_preview = OPENAI_API_KEY[:10] + "..." + OPENAI_API_KEY[-4:] if len(OPENAI_API_KEY) > 14 else "***"
-        print(f"Using API key: {key_preview}", flush=True)
-        sys.stdout.flush()
+        for next_done in asyncio.as_completed(tasks):
+            payload = await next_done
+            if 'error' in payload:
+                failed += 1
+            await response.send(json_lib.dumps(payload) + '\n')
+        await response.send(json_lib.dumps({'type': 'done', 'count': len(tasks), 'failed': failed}) + '\n')
+    finally:
+        # Client went away: stop fetching the rest
+        for task in [*tasks, *fetches.values()]:
+            task.cancel()
+    await response.eof()
 
-        data = request.json
-        page_text = data.get('pageText', '')
-        system_prompt = data.get('systemPrompt', '')
-        agent = data.get('agent', 'Unknown')
-        analysis_type = data.get('analysisType', 'general')
-        
-        # Clean the text content to avoid triggering guardrails
-        page_text = clean_text_content(page_text)
-        
-        print(f"Request data received - page_text length: {len(page_text)}, system_prompt length: {len(system_prompt)}", flush=True)
-        sys.stdout.flush()
+# Model and output format used for /analyze
+ANALYSIS_MODEL = 'gpt-5.1-chat-latest'
+ANALYSIS_RESPONSE_FORMAT = {'type': 'json_object'}
 
-        # Enhanced system prompt for structured output
-        structured_prompt = system_prompt + """
+# Appended to every analysis system prompt to get structured JSON back
+STRUCTURED_OUTPUT_INSTRUCTIONS = """
 
 IMPORTANT: Structure your response as a JSON object with the following format:
 {
@@ -821,64 +1233,541 @@ CRITICAL: You MUST include real-world case examples in the "case_examples" array
 
 IMPORTANT: All content fields (summary, content, descriptions, etc.) should be PLAIN TEXT only. Do NOT use HTML tags like <strong>, <em>, <ul>, <li>, etc. The frontend will handle all formatting and styling. Just provide clear, well-written text content."""
 
-        # Call OpenAI API asynchronously
-        print("Calling OpenAI API...", flush=True)
+# Reduce step of chunked analysis (see consolidate_summary)
+SUMMARY_REDUCE_INSTRUCTIONS = """
+
+You are given summaries of consecutive parts of ONE long document, in order. Write a single 2-3 sentence overview of the whole document from them, in the same language and tone. Do not mention the parts. Respond with a JSON object: {"summary": "..."}. PLAIN TEXT only, no HTML."""
+
+def build_analysis_messages(page_text: str, system_prompt: str) -> list:
+    """Chat messages for a structured analysis of page_text"""
+    structured_prompt = system_prompt + STRUCTURED_OUTPUT_INSTRUCTIONS
+    return [
+        {'role': 'system', 'content': structured_prompt},
+        {'role': 'user', 'content': f'PAGE CONTENT:\n{page_text}\n\nAnalyze this page content according to your role and provide your insights in the structured JSON format.'}
+    ]
+
+def analysis_input_text(data: dict) -> str:
+    """
+    Cleaned text to analyze: a stored document (already normalized) when docId
+    is given, otherwise the cleaned pageText
+
+    Raises: DocumentNotFound if docId is unknown or expired
+    """
+    if data.get('docId'):
+        return get_documents().require(data['docId']).text[:config.ANALYSIS_MAX_CHARS]
+    return normalize_text(data.get('pageText', ''), strip_boilerplate=False)
+
+def analysis_source_url(data: dict):
+    """URL the analyzed text came from (pageUrl, or the stored document's URL), if known"""
+    if data.get('pageUrl'):
+        return data['pageUrl']
+    if data.get('docId'):
+        document = get_documents().get(data['docId'])
+        if document is not None:
+            return document.metadata.get('url')
+    return None
+
+def sse_event(event: str, data) -> str:
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json_lib.dumps(data)}\n\n"
+
+def _stream_event_payload(event: tuple) -> tuple:
+    """Map a StreamingJSONParser event to an (sse event name, data) pair"""
+    if event[0] == 'field':
+        return 'field', {'key': event[1], 'value': event[2]}
+    return 'item', {'key': event[1], 'index': event[2], 'value': event[3]}
+
+async def request_json_completion(messages: list) -> str:
+    """
+    One JSON-mode chat completion with the analysis model
+
+    Returns: the raw model output
+    Raises: UpstreamError if OpenAI returns an error
+    """
+    # Call OpenAI API asynchronously
+    print("Calling OpenAI API...", flush=True)
+    sys.stdout.flush()
+    
+    client = get_client(OPENAI)
+    response = await client.post(
+        'https://api.openai.com/v1/chat/completions',
+        headers={
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {OPENAI_API_KEY}'
+        },
+        json={
+            'model': ANALYSIS_MODEL,
+            'messages': messages,
+            'response_format': ANALYSIS_RESPONSE_FORMAT
+        }
+    )
+
+    print(f"OpenAI API response status: {response.status_code}", flush=True)
+    sys.stdout.flush()
+
+    if response.status_code != 200:
+        error_data = response.json()
+        error_message = error_data.get('error', {}).get('message', 'OpenAI API error')
+        print(f"=== OpenAI API Error ===", flush=True)
+        print(f"Error message: {error_message}", flush=True)
+        print(f"Response status: {response.status_code}", flush=True)
+        print(f"Full response: {error_data}", flush=True)
         sys.stdout.flush()
+        raise UpstreamError(error_message)
+
+    return response.json()['choices'][0]['message']['content']
+
+async def run_analysis(page_text: str, system_prompt: str) -> dict:
+    """
+    Run one structured analysis of already-cleaned text, using the result cache
+
+    Returns: {'result': raw model output, 'structured': parsed JSON or None, 'cached': bool}
+    Raises: UpstreamError if OpenAI returns an error
+    """
+    # Serve repeat analyses of the same text/prompt from the result cache
+    cache = get_analysis_cache() if config.ANALYSIS_CACHE_ENABLED else None
+    cache_key = make_cache_key(page_text, system_prompt, ANALYSIS_MODEL, ANALYSIS_RESPONSE_FORMAT)
+    if cache:
+        cached = await cache.get(cache_key)
+        if cached is not None:
+            print(f"Result cache hit: {cache_key[:12]}", flush=True)
+            return {'result': cached['result'], 'structured': cached['structured'], 'cached': True}
+
+    async def call_openai() -> dict:
+        ai_content = await request_json_completion(build_analysis_messages(page_text, system_prompt))
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
+        # Parse the JSON response from AI
+        try:
+            structured_data = json_lib.loads(ai_content)
+        except json_lib.JSONDecodeError:
+            # Fallback if AI doesn't return valid JSON
+            structured_data = None
+
+        if cache and structured_data is not None:
+            await cache.set(cache_key, {'result': ai_content, 'structured': structured_data})
+
+        return {'result': ai_content, 'structured': structured_data, 'cached': False}
+
+    # Identical analyses already in flight share one OpenAI call
+    return await get_singleflight('analyze').do(cache_key, call_openai)
+
+async def run_chunked_analysis(page_text: str, system_prompt: str, on_progress=None) -> dict:
+    """
+    Map-reduce analysis for long documents
+
+    Splits the text on clause/section boundaries, analyzes the chunks concurrently
+    (bounded by ANALYSIS_CHUNK_CONCURRENCY) and merges the partial results.
+    on_progress(completed, total) is awaited as each chunk finishes.
+    """
+    chunks = split_document(page_text, config.ANALYSIS_CHUNK_SIZE)
+    if len(chunks) == 1:
+        outcome = await run_analysis(page_text, system_prompt)
+        if on_progress:
+            await on_progress(1, 1)
+        return {**outcome, 'chunks': 1}
+
+    print(f"Chunked analysis: {len(page_text)} chars in {len(chunks)} chunks", flush=True)
+    semaphore = asyncio.Semaphore(config.ANALYSIS_CHUNK_CONCURRENCY)
+    completed = 0
+
+    async def analyze_chunk(index: int, chunk: str) -> dict:
+        nonlocal completed
+        chunk_prompt = system_prompt + (
+            f"\n\nNOTE: This is part {index + 1} of {len(chunks)} of a longer document. "
+            "Analyze only the clauses in this part."
+        )
+        try:
+            async with semaphore:
+                return await run_analysis(chunk, chunk_prompt)
+        finally:
+            completed += 1
+            if on_progress:
+                await on_progress(completed, len(chunks))
+
+    outcomes = await asyncio.gather(
+        *(analyze_chunk(i, chunk) for i, chunk in enumerate(chunks)),
+        return_exceptions=True
+    )
+    succeeded = [o for o in outcomes if not isinstance(o, BaseException) and o['structured'] is not None]
+    failed = [o for o in outcomes if isinstance(o, BaseException)]
+    not_json = len(outcomes) - len(succeeded) - len(failed)
+    if not succeeded:
+        if failed:
+            raise failed[0]
+        raise UpstreamError('The analysis model did not return a structured result')
+    for error in failed:
+        print(f"⚠️ Chunk analysis failed: {error}", flush=True)
+    if not_json:
+        print(f"⚠️ {not_json} chunk analyses were not valid JSON", flush=True)
+
+    merged = merge_analyses([o['structured'] for o in succeeded])
+    summaries = [o['structured'].get('summary') for o in succeeded]
+    merged['summary'] = await consolidate_summary(summaries, system_prompt, merged['summary'])
+    return {
+        'result': json_lib.dumps(merged),
+        'structured': merged,
+        'cached': all(o['cached'] for o in succeeded),
+        'chunks': len(chunks),
+        'failed_chunks': len(failed) + not_json
+    }
+
+async def consolidate_summary(summaries: list, system_prompt: str, fallback: str) -> str:
+    """
+    Reduce step of chunked analysis: one model call that turns the per-chunk
+    summaries into a single summary of the whole document
+
+    Cached like analyses; returns fallback if there is nothing to combine or the call fails.
+    """
+    summaries = [summary.strip() for summary in summaries if isinstance(summary, str) and summary.strip()]
+    if len(summaries) < 2:
+        return summaries[0] if summaries else fallback
+    parts = '\n\n'.join(f'PART {index + 1}: {summary}' for index, summary in enumerate(summaries))
+    messages = [
+        {'role': 'system', 'content': system_prompt + SUMMARY_REDUCE_INSTRUCTIONS},
+        {'role': 'user', 'content': f'PART SUMMARIES:\n{parts}'}
+    ]
+    cache = get_analysis_cache() if config.ANALYSIS_CACHE_ENABLED else None
+    cache_key = make_cache_key('summary', messages, ANALYSIS_MODEL)
+    if cache:
+        cached = await cache.get(cache_key)
+        if cached is not None:
+            return cached['summary']
+    try:
+        summary = json_lib.loads(await request_json_completion(messages)).get('summary')
+    except (UpstreamError, ValueError, AttributeError) as e:
+        print(f"⚠️ Summary consolidation failed, keeping part summaries: {e}", flush=True)
+        return fallback
+    if not isinstance(summary, str) or not summary.strip():
+        return fallback
+    if cache:
+        await cache.set(cache_key, {'summary': summary.strip()})
+    return summary.strip()
+
+async def run_incremental_analysis(page_text: str, system_prompt: str, source_url: str) -> dict:
+    """
+    Analyze a document clause by clause, reusing results for clauses that are
+    unchanged since source_url was last analyzed with this prompt
+
+    The first analysis of a URL (or of a mostly changed document) is an
+    ordinary whole-document one. The result has the chunked-analysis shape
+    plus 'changes' (see incremental.py).
+    """
+    unit_prompt = system_prompt + (
+        "\n\nNOTE: This is an excerpt (a few clauses) of a longer document. "
+        "Analyze only the clauses in this excerpt."
+    )
+
+    async def analyze_unit(unit_text: str):
+        return (await run_analysis(unit_text, unit_prompt))['structured']
+
+    async def analyze_document(text: str):
+        if analysis_mode(text, incremental=False) == 'chunked':
+            return (await run_chunked_analysis(text, system_prompt))['structured']
+        return (await run_analysis(text, system_prompt))['structured']
+
+    outcome = await analyze_incrementally(source_url, page_text, system_prompt, ANALYSIS_MODEL,
+                                          analyze_unit, analyze_document)
+    changes = outcome['changes']
+    if changes['full_pass']:
+        print(f"Incremental analysis of {source_url}: whole document analyzed", flush=True)
+    else:
+        print(f"Incremental analysis of {source_url}: {changes['analyzed_units']} units analyzed, "
+              f"{changes['reused_units']} reused ({changes['analyzed_chars']}/{changes['total_chars']} chars sent)", flush=True)
+    return {
+        'result': json_lib.dumps(outcome['structured']),
+        'structured': outcome['structured'],
+        'cached': not changes['full_pass'] and changes['analyzed_units'] == 0,
+        'changes': changes
+    }
+
+async def analyze_text(page_text: str, system_prompt: str, chunked=None,
+                       source_url: str = None, incremental=None) -> dict:
+    """
+    Analyze cleaned text
+
+    Documents with a known source_url are analyzed incrementally (unless
+    incremental=False); long documents use map-reduce (or when chunked=True).
+    """
+    mode = analysis_mode(page_text, chunked, source_url, incremental)
+    if mode == 'incremental':
+        return await run_incremental_analysis(page_text, system_prompt, source_url)
+    if mode == 'chunked':
+        return await run_chunked_analysis(page_text, system_prompt)
+    return await run_analysis(page_text, system_prompt)
+
+def analysis_mode(page_text: str, chunked=None, source_url: str = None, incremental=None) -> str:
+    """
+    How analyze_text handles page_text: 'incremental', 'chunked' or 'single'
+
+    chunked=None decides by ANALYSIS_CHUNK_THRESHOLD, incremental=None by
+    INCREMENTAL_ANALYSIS_ENABLED.
+    """
+    if incremental is None:
+        incremental = config.INCREMENTAL_ANALYSIS_ENABLED
+    if incremental and source_url and len(page_text) >= config.INCREMENTAL_MIN_CHARS:
+        return 'incremental'
+    if chunked is None:
+        chunked = config.ANALYSIS_CHUNK_THRESHOLD > 0 and len(page_text) > config.ANALYSIS_CHUNK_THRESHOLD
+    return 'chunked' if chunked else 'single'
+
+async def send_analysis_events(response, outcome: dict, agent: str, analysis_type: str):
+    """Replay a finished analysis as field/item events followed by done"""
+    parser = StreamingJSONParser()
+    for event in parser.feed(outcome['result']):
+        await response.send(sse_event(*_stream_event_payload(event)))
+    await response.send(sse_event('done', {
+        'result': outcome['result'],
+        'structured': outcome['structured'],
+        'agent': agent,
+        'analysis_type': analysis_type,
+        **{k: v for k, v in outcome.items() if k not in ('result', 'structured')}
+    }))
+
+@app.route('/analyze', methods=['POST'])
+async def analyze(request):
+    """Analyze page content using AI - returns structured JSON"""
+    try:
+        print("=== /analyze endpoint called ===", flush=True)
+        sys.stdout.flush()
+        
+        if not OPENAI_API_KEY:
+            print("ERROR: OpenAI API key not configured", flush=True)
+            return json_response({'error': 'OpenAI API key not configured in .env'}, status=500)
+
+        # Log API key status (masked for security)
+        key_preview = OPENAI_API_KEY[:10] + "..." + OPENAI_API_KEY[-4:] if len(OPENAI_API_KEY) > 14 else "***"
+        print(f"Using API key: {key_preview}", flush=True)
+        sys.stdout.flush()
+
+        data = request.json
+        system_prompt = data.get('systemPrompt', '')
+        agent = data.get('agent', 'Unknown')
+        analysis_type = data.get('analysisType', 'general')
+        
+        # Clean the text content to avoid triggering guardrails
+        page_text = analysis_input_text(data)
+        
+        print(f"Request data received - page_text length: {len(page_text)}, system_prompt length: {len(system_prompt)}", flush=True)
+        sys.stdout.flush()
+
+        try:
+            outcome = await analyze_text(page_text, system_prompt, chunked=data.get('chunked'),
+                                         source_url=analysis_source_url(data),
+                                         incremental=data.get('incremental'))
+        except UpstreamError as e:
+            return json_response({'error': str(e)}, status=400)
+
+        return json_response({
+            'result': outcome['result'],  # Keep raw for backward compatibility
+            'structured': outcome['structured'],
+            'agent': agent,
+            'analysis_type': analysis_type,
+            **{k: v for k, v in outcome.items() if k not in ('result', 'structured')}
+        }, status=200)
+
+    except DocumentNotFound:
+        return json_response({'error': DOCUMENT_NOT_FOUND_MESSAGE}, status=404)
+    except Exception as e:
+        return json_response({'error': str(e)}, status=500)
+
+@app.route('/analyze/stream', methods=['POST'])
+async def analyze_stream(request):
+    """
+    Streaming variant of /analyze over Server-Sent Events
+
+    Events:
+      token    - {"delta": "..."} raw model output as it arrives
+      progress - {"completed": 2, "total": 5} chunks analyzed so far (long documents)
+      field    - {"key": "summary", "value": ...} a completed top-level field
+      item     - {"key": "sections", "index": 0, "value": {...}} a completed array element
+      done     - same payload as /analyze
+      error    - {"error": "..."}
+
+    Long documents (see /analyze's chunked option) are analyzed chunk by chunk:
+    progress events as chunks finish, then the merged result as field/item events.
+    Documents with a pageUrl (or a docId with a source URL) are analyzed
+    incrementally like /analyze, and their result is sent the same way.
+    Concurrent requests for the same analysis share one OpenAI stream.
+    """
+    if not OPENAI_API_KEY:
+        return json_response({'error': 'OpenAI API key not configured in .env'}, status=500)
+
+    data = request.json or {}
+    try:
+        page_text = analysis_input_text(data)
+    except DocumentNotFound:
+        return json_response({'error': DOCUMENT_NOT_FOUND_MESSAGE}, status=404)
+    system_prompt = data.get('systemPrompt', '')
+    agent = data.get('agent', 'Unknown')
+    analysis_type = data.get('analysisType', 'general')
+
+    response = await request.respond(
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+    try:
+        source_url = analysis_source_url(data)
+        mode = analysis_mode(page_text, data.get('chunked'), source_url, data.get('incremental'))
+        if mode == 'incremental':
+            outcome = await run_incremental_analysis(page_text, system_prompt, source_url)
+            await send_analysis_events(response, outcome, agent, analysis_type)
+            await response.eof()
+            return
+        if mode == 'chunked':
+            async def chunk_done(completed: int, total: int):
+                await response.send(sse_event('progress', {'completed': completed, 'total': total}))
+
+            outcome = await run_chunked_analysis(page_text, system_prompt, on_progress=chunk_done)
+            await send_analysis_events(response, outcome, agent, analysis_type)
+            await response.eof()
+            return
+
+        cache = get_analysis_cache() if config.ANALYSIS_CACHE_ENABLED else None
+        cache_key = make_cache_key(page_text, system_prompt, ANALYSIS_MODEL, ANALYSIS_RESPONSE_FORMAT)
+        if cache:
+            cached = await cache.get(cache_key)
+            if cached is not None:
+                # Replay the cached result as field/item events so clients use one code path
+                await send_analysis_events(response, {**cached, 'cached': True}, agent, analysis_type)
+                await response.eof()
+                return
+
+        async def stream_openai(channel) -> dict:
+            # Publishes the model's output deltas to every request sharing this call
+            parts = []
+            client = get_client(OPENAI)
+            async with client.stream(
+                'POST',
                 'https://api.openai.com/v1/chat/completions',
                 headers={
                     'Content-Type': 'application/json',
                     'Authorization': f'Bearer {OPENAI_API_KEY}'
                 },
                 json={
-                    'model': 'gpt-5.1-chat-latest',
-                    'messages': [
-                        {'role': 'system', 'content': structured_prompt},
-                        {'role': 'user', 'content': f'PAGE CONTENT:\n{page_text}\n\nAnalyze this page content according to your role and provide your insights in the structured JSON format.'}
-                    ],
-                    'response_format': {'type': 'json_object'}
+                    'model': ANALYSIS_MODEL,
+                    'messages': build_analysis_messages(page_text, system_prompt),
+                    'response_format': ANALYSIS_RESPONSE_FORMAT,
+                    'stream': True
                 }
-            )
+            ) as upstream:
+                if upstream.status_code != 200:
+                    await upstream.aread()
+                    try:
+                        error_message = upstream.json().get('error', {}).get('message', 'OpenAI API error')
+                    except ValueError:
+                        error_message = 'OpenAI API error'
+                    raise UpstreamError(error_message)
 
-        print(f"OpenAI API response status: {response.status_code}", flush=True)
-        sys.stdout.flush()
+                async for line in upstream.aiter_lines():
+                    if not line.startswith('data:'):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == '[DONE]':
+                        break
+                    try:
+                        chunk = json_lib.loads(payload)
+                    except json_lib.JSONDecodeError:
+                        continue
+                    choices = chunk.get('choices') or [{}]
+                    delta = (choices[0].get('delta') or {}).get('content')
+                    if delta:
+                        parts.append(delta)
+                        channel.publish(delta)
 
-        if response.status_code != 200:
-            error_data = response.json()
-            error_message = error_data.get('error', {}).get('message', 'OpenAI API error')
-            print(f"=== OpenAI API Error ===", flush=True)
-            print(f"Error message: {error_message}", flush=True)
-            print(f"Response status: {response.status_code}", flush=True)
-            print(f"Full response: {error_data}", flush=True)
-            sys.stdout.flush()
-            return json_response({'error': error_message}, status=400)
-
-        result = response.json()
-        ai_content = result['choices'][0]['message']['content']
-        
-        # Parse the JSON response from AI
-        import json as json_lib
-        try:
-            structured_data = json_lib.loads(ai_content)
-            return json_response({
-                'result': ai_content,  # Keep raw for backward compatibility
-                'structured': structured_data,
-                'agent': agent,
-                'analysis_type': analysis_type
-            }, status=200)
-        except json_lib.JSONDecodeError:
-            # Fallback if AI doesn't return valid JSON
-            return json_response({
-                'result': ai_content,
-                'structured': None,
-                'agent': agent,
-                'analysis_type': analysis_type
-            }, status=200)
+            ai_content = ''.join(parts)
+            try:
+                structured_data = json_lib.loads(ai_content)
+            except json_lib.JSONDecodeError:
+                structured_data = None
 
+            if cache and structured_data is not None:
+                await cache.set(cache_key, {'result': ai_content, 'structured': structured_data})
+
+            return {'result': ai_content, 'structured': structured_data, 'cached': False}
+
+        # Identical analyses in flight (streamed or not) share one OpenAI call;
+        # a request that joins late is sent the deltas it missed first
+        parser = StreamingJSONParser()
+        streamed = False
+        async for kind, value in get_singleflight('analyze').stream(cache_key, stream_openai):
+            if kind == 'chunk':
+                streamed = True
+                await response.send(sse_event('token', {'delta': value}))
+                for event in parser.feed(value):
+                    await response.send(sse_event(*_stream_event_payload(event)))
+            elif not streamed:
+                # Joined a non-streamed /analyze call: only the result is available
+                await send_analysis_events(response, value, agent, analysis_type)
+            else:
+                await response.send(sse_event('done', {**value, 'agent': agent, 'analysis_type': analysis_type}))
     except Exception as e:
-        return json_response({'error': str(e)}, status=500)
+        await response.send(sse_event('error', {'error': str(e)}))
+    await response.eof()
+
+@app.route('/analyze/batch', methods=['POST'])
+async def analyze_batch(request):
+    """
+    Analyze one document with several personas over Server-Sent Events
+
+    Body: {"pageText": "..." or "docId": "...", "analyses": [{"agent", "analysisType", "systemPrompt"}, ...]}
+    The text is cleaned once and the analyses run concurrently; each one is sent
+    as a 'result' event ({"index", "agent", "analysis_type", ...}) as soon as it
+    finishes, followed by a final 'done' event.
+    """
+    if not OPENAI_API_KEY:
+        return json_response({'error': 'OpenAI API key not configured in .env'}, status=500)
+
+    data = request.json or {}
+    analyses = data.get('analyses') or []
+    if not isinstance(analyses, list) or not analyses:
+        return json_response({'error': 'analyses must be a non-empty list'}, status=400)
+    if len(analyses) > config.ANALYSIS_BATCH_MAX_ITEMS:
+        return json_response({
+            'error': f'Too many analyses requested (max {config.ANALYSIS_BATCH_MAX_ITEMS})'
+        }, status=400)
+
+    # One preprocessing pass shared by every persona
+    try:
+        page_text = analysis_input_text(data)
+    except DocumentNotFound:
+        return json_response({'error': DOCUMENT_NOT_FOUND_MESSAGE}, status=404)
+    chunked = data.get('chunked')
+    source_url = analysis_source_url(data)
+    incremental = data.get('incremental')
+    semaphore = asyncio.Semaphore(config.ANALYSIS_BATCH_CONCURRENCY)
+
+    async def run_one(index: int, item: dict) -> dict:
+        agent = item.get('agent', 'Unknown')
+        analysis_type = item.get('analysisType', 'general')
+        payload = {'index': index, 'agent': agent, 'analysis_type': analysis_type}
+        try:
+            async with semaphore:
+                outcome = await analyze_text(page_text, item.get('systemPrompt', ''), chunked=chunked,
+                                             source_url=source_url, incremental=incremental)
+            payload.update(outcome)
+        except Exception as e:
+            payload['error'] = str(e)
+        return payload
+
+    response = await request.respond(
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    tasks = [asyncio.ensure_future(run_one(i, item)) for i, item in enumerate(analyses)]
+    failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            payload = await next_done
+            if 'error' in payload:
+                failed += 1
+            await response.send(sse_event('result', payload))
+        await response.send(sse_event('done', {'count': len(tasks), 'failed': failed}))
+    finally:
+        # Client went away: don't keep paying for the remaining analyses
+        for task in tasks:
+            task.cancel()
+    await response.eof()
 
 @app.route('/search-alternatives', methods=['POST'])
 async def search_alternatives(request):
@@ -892,15 +1781,15 @@ async def search_alternatives(request):
 
         query = f'alternatives to {service_name}'
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(
-                'https://serpapi.com/search.json',
-                params={
-                    'engine': 'google',
-                    'q': query,
-                    'api_key': SERPAPI_KEY
-                }
-            )
+        client = get_client(SERPAPI)
+        response = await client.get(
+            'https://serpapi.com/search.json',
+            params={
+                'engine': 'google',
+                'q': query,
+                'api_key': SERPAPI_KEY
+            }
+        )
 
         if response.status_code != 200:
             return json_response({'error': 'SerpAPI error'}, status=400)
@@ -932,18 +1821,47 @@ async def setup(app, loop):
     
     print(f"🔑 OpenAI API Key configured: {'Yes' if OPENAI_API_KEY else 'No'}")
     
-    # Initialize Firebase/Firestore
-    if config.USE_FIRESTORE:
-        try:
-            db = await get_db()
-            if db and db.initialized:
-                print(f"✅ Firestore initialized successfully (project: {config.FIREBASE_PROJECT_ID})")
-            else:
-                print("⚠️ Firestore not available")
-                if not config.USE_CSV:
-                    print("❌ ERROR: No storage backend available!")
-        except Exception as e:
-            print(f"⚠️ Firestore initialization failed: {e}")
+    # Create pooled HTTP clients for this worker
+    await get_clients().start()
+    
+    # Start document extraction and HTML parsing workers
+    get_extraction_pool().start()
+    get_html_pool().start()
+    
+    # Start the /save background writer
+    get_save_queue().start()
+    
+    # Start sampling event loop lag
+    get_loop_monitor().start()
+    
+    # Initialize the analyses database (Firestore, or SQLite when self-hosted)
+    try:
+        db = await get_db()
+        if db and db.backend == 'firestore':
+            print(f"✅ Firestore initialized successfully (project: {config.FIREBASE_PROJECT_ID})")
+        elif db:
+            print(f"✅ SQLite database initialized: {config.SQLITE_PATH}")
+        else:
+            print("⚠️ No analyses database available")
+            if not config.USE_CSV:
+                print("❌ ERROR: No storage backend available!")
+    except Exception as e:
+        print(f"⚠️ Database initialization failed: {e}")
+
+@app.after_server_stop
+async def teardown(app, loop):
+    # Flush queued saves before the worker exits
+    await get_save_queue().close(config.SAVE_SHUTDOWN_TIMEOUT)
+    await close_db()
+    
+    await get_loop_monitor().stop()
+    
+    # Close pooled HTTP clients for this worker
+    await get_clients().close()
+    
+    # Stop document extraction and HTML parsing workers
+    get_extraction_pool().shutdown()
+    get_html_pool().shutdown()
 
 if __name__ == '__main__':
     port = config.PORT
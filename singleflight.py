@@ -0,0 +1,165 @@
+"""
+Single-flight request coalescing for ClauseCode AI
+Concurrent callers asking for the same key share one in-flight upstream call
+instead of each issuing their own. Streamed upstream calls are shared too:
+every caller receives all of the stream's chunks.
+"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Broadcast:
+    """Chunks published by one streamed upstream call, readable by any number of subscribers"""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.closed = False
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: Any):
+        self.chunks.append(chunk)
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        """Every chunk from the first one (a late subscriber catches up), until close()"""
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.closed:
+                return
+            await self._changed.wait()
+
+
+class _Flight:
+    """One in-flight upstream call and the number of callers waiting on it"""
+
+    def __init__(self, task: "asyncio.Task", channel: Optional[Broadcast] = None):
+        self.task = task
+        self.channel = channel
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls by key
+
+    The first caller for a key starts the upstream call as a task; callers that
+    arrive while it is running await the same task. A cancelled caller only
+    stops waiting - the upstream call keeps running for the others, and is
+    cancelled only once every waiter has gone away.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.flights: Dict[str, _Flight] = {}
+        self.counters = {
+            "calls": 0,
+            "upstream_calls": 0,
+            "collapsed": 0,
+            "cancelled_waiters": 0,
+            "cancelled_upstream": 0,
+        }
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn() for key, or join an identical call that is already in flight"""
+        flight = self._join(key, fn)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            self._leave(flight)
+            raise
+        finally:
+            flight.waiters -= 1
+
+    async def stream(self, key: str, fn: Callable[[Broadcast], Awaitable[Any]]) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        do() for a streamed upstream call
+
+        fn(channel) publishes chunks to channel as they arrive and returns the
+        final result. Yields ("chunk", chunk) for every chunk - replayed from the
+        start for callers that join late - then ("result", result). A caller
+        that joins a call started by do() gets only the result.
+        """
+        channel = Broadcast()
+
+        async def run():
+            try:
+                return await fn(channel)
+            finally:
+                channel.close()
+
+        flight = self._join(key, run, channel)
+        flight.waiters += 1
+        try:
+            if flight.channel is not None:
+                async for chunk in flight.channel.subscribe():
+                    yield "chunk", chunk
+            yield "result", await asyncio.shield(flight.task)
+        except (asyncio.CancelledError, GeneratorExit):
+            self._leave(flight)
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _join(self, key: str, fn: Callable[[], Awaitable[Any]], channel: Optional[Broadcast] = None) -> _Flight:
+        self.counters["calls"] += 1
+        flight = self.flights.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(fn())
+            flight = _Flight(task, channel)
+            self.flights[key] = flight
+            self.counters["upstream_calls"] += 1
+            task.add_done_callback(lambda _t, k=key, f=flight: self._forget(k, f))
+        else:
+            self.counters["collapsed"] += 1
+            logger.debug(f"{self.name}: joined in-flight call {key[:12]}")
+        return flight
+
+    def _leave(self, flight: _Flight):
+        """A waiter was cancelled (or stopped reading its stream)"""
+        if not flight.task.done():
+            self.counters["cancelled_waiters"] += 1
+            if flight.waiters == 1:
+                # Last interested caller left: stop the upstream call
+                flight.task.cancel()
+                self.counters["cancelled_upstream"] += 1
+
+    def _forget(self, key: str, flight: _Flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+        # Retrieve the exception so an abandoned failed task doesn't log "never retrieved"
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "in_flight": len(self.flights)}
+
+
+# Global coalescing groups (one per worker process)
+_groups: Dict[str, SingleFlight] = {}
+
+
+def get_singleflight(name: str) -> SingleFlight:
+    """Get the coalescing group for name (singleton per name)"""
+    group = _groups.get(name)
+    if group is None:
+        group = _groups[name] = SingleFlight(name)
+    return group
+
+
+def singleflight_stats() -> Dict[str, Any]:
+    return {name: group.stats() for name, group in _groups.items()}
@@ -0,0 +1,411 @@
+"""
+SQLite storage backend for ClauseCode AI
+Same API as database.AnalysisDB, for local and self-hosted deployments
+without Firestore. The database runs in WAL mode: one writer connection on
+a dedicated thread serializes all writes, while a small pool of reader
+threads (one connection each) serves queries concurrently. Nothing touches
+SQLite on the event loop.
+"""
+import json
+import uuid
+import sqlite3
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple, Any
+
+from content_codec import decompress_text
+from database import (
+    analysis_document, page_content_document, projection,
+    encode_cursor, decode_cursor,
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    agent TEXT,
+    analysis_type TEXT,
+    page_title TEXT,
+    page_url TEXT,
+    result_text TEXT,
+    created_at TEXT,
+    page_content_ref TEXT,
+    page_content_chars INTEGER,
+    user_id TEXT,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_timestamp ON analyses (timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_analyses_agent ON analyses (agent, timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_analyses_type ON analyses (analysis_type, timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_analyses_user ON analyses (user_id, timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_analyses_content ON analyses (page_content_ref);
+
+CREATE TABLE IF NOT EXISTS page_contents (
+    ref TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    codec TEXT NOT NULL,
+    chars INTEGER,
+    created_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS clause_snapshots (
+    key TEXT PRIMARY KEY,
+    snapshot TEXT NOT NULL,
+    updated_at TEXT
+);
+"""
+
+ANALYSIS_COLUMNS = (
+    "id", "timestamp", "agent", "analysis_type", "page_title", "page_url", "result_text",
+    "created_at", "page_content_ref", "page_content_chars", "user_id", "metadata",
+)
+DATETIME_COLUMNS = ("timestamp", "created_at")
+
+
+def to_utc_text(value: datetime) -> str:
+    """Fixed-width UTC ISO 8601, so text order is time order (naive datetimes are UTC)"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+
+
+def _analysis_row(doc_id: str, doc_data: Dict[str, Any]) -> Tuple:
+    values = {**doc_data, "id": doc_id}
+    for column in DATETIME_COLUMNS:
+        values[column] = to_utc_text(values[column])
+    if values.get("metadata") is not None:
+        values["metadata"] = json.dumps(values["metadata"], default=str)
+    return tuple(values.get(column) for column in ANALYSIS_COLUMNS)
+
+
+def _analysis_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    """Row as the dict Firestore would return (absent optional fields are left out)"""
+    data = {key: row[key] for key in row.keys() if row[key] is not None}
+    for column in DATETIME_COLUMNS:
+        if column in data:
+            data[column] = datetime.fromisoformat(data[column])
+    if "metadata" in data:
+        data["metadata"] = json.loads(data["metadata"])
+    return data
+
+
+class SQLiteAnalysisDB:
+    """AnalysisDB backed by a local SQLite file"""
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, readers: int = 4):
+        self.path = path
+        self.readers = max(1, readers)
+        self.initialized = False
+        self.writer: Optional[sqlite3.Connection] = None
+        self.write_executor: Optional[ThreadPoolExecutor] = None
+        self.read_executor: Optional[ThreadPoolExecutor] = None
+        self.local = threading.local()
+        self.reader_connections: List[sqlite3.Connection] = []
+        self.lock = threading.Lock()
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA busy_timeout = 5000")
+        if read_only:
+            connection.execute("PRAGMA query_only = 1")
+        return connection
+
+    def _open_writer(self):
+        self.writer = self._connect()
+        self.writer.execute("PRAGMA journal_mode = WAL")
+        self.writer.execute("PRAGMA synchronous = NORMAL")
+        self.writer.executescript(SCHEMA)
+        self.writer.commit()
+
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = self._connect(read_only=True)
+            with self.lock:
+                self.reader_connections.append(connection)
+        return connection
+
+    async def initialize(self):
+        """Open the database file, enable WAL and create the schema"""
+        if self.initialized:
+            return
+
+        try:
+            self.write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+            self.read_executor = ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="sqlite-reader")
+            await asyncio.get_running_loop().run_in_executor(self.write_executor, self._open_writer)
+            self.initialized = True
+            logger.info(f"SQLite database initialized at {self.path}")
+
+        except Exception as e:
+            logger.error(f"Failed to initialize SQLite database: {e}", exc_info=True)
+
+    async def close(self):
+        """Close the writer and reader connections"""
+        if not self.initialized:
+            return
+        self.initialized = False
+        self.read_executor.shutdown(wait=True)
+        await asyncio.get_running_loop().run_in_executor(self.write_executor, self.writer.close)
+        self.write_executor.shutdown(wait=True)
+        with self.lock:
+            for connection in self.reader_connections:
+                connection.close()
+            self.reader_connections.clear()
+
+    async def _write(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run fn(writer) in one transaction on the writer thread"""
+        def run():
+            with self.writer:
+                return fn(self.writer)
+        return await asyncio.get_running_loop().run_in_executor(self.write_executor, run)
+
+    async def _read(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run fn(reader) on a pooled reader thread"""
+        return await asyncio.get_running_loop().run_in_executor(self.read_executor, lambda: fn(self._reader()))
+
+    async def save_analysis(self,
+                            timestamp: str,
+                            agent: str,
+                            analysis_type: str,
+                            page_title: str,
+                            page_url: str,
+                            result_text: str,
+                            page_content: Optional[str] = None,
+                            user_id: Optional[str] = None,
+                            metadata: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Save analysis data to SQLite
+
+        Returns: Document ID if successful, None on failure
+        """
+        if not self.initialized:
+            return None
+
+        try:
+            doc_id = self.new_analysis_id()
+            await self.save_analyses_batch([(doc_id, {
+                "timestamp": timestamp,
+                "agent": agent,
+                "analysis_type": analysis_type,
+                "page_title": page_title,
+                "page_url": page_url,
+                "result_text": result_text,
+                "page_content": page_content,
+                "user_id": user_id,
+                "metadata": metadata,
+            })])
+
+            logger.info(f"✅ Saved analysis to SQLite: {doc_id}")
+            return doc_id
+
+        except Exception as e:
+            logger.error(f"Failed to save to SQLite: {e}", exc_info=True)
+            return None
+
+    def new_analysis_id(self) -> Optional[str]:
+        """Reserve an ID for an analysis that will be written later"""
+        return uuid.uuid4().hex if self.initialized else None
+
+    async def save_analyses_batch(self, analyses: List[Tuple[str, Dict[str, Any]]]):
+        """
+        Write (document ID, save_analysis fields) pairs in one transaction
+
+        Page content is stored once per distinct text, as in Firestore.
+        Writes replace by ID, so a failed batch can simply be retried.
+        Raises: sqlite3.Error if the transaction fails
+        """
+        if not self.initialized:
+            raise RuntimeError("SQLite database not available")
+
+        contents, rows = {}, []
+        for doc_id, fields in analyses:
+            fields = dict(fields)
+            page_content = fields.pop("page_content", None)
+            if page_content:
+                content = page_content_document(page_content)
+                if content:
+                    content_ref, content_data = content
+                    fields["page_content_ref"] = content_ref
+                    fields["page_content_chars"] = len(page_content)
+                    contents[content_ref] = (
+                        content_ref, content_data["data"], content_data["codec"],
+                        content_data["chars"], to_utc_text(content_data["created_at"]),
+                    )
+            rows.append(_analysis_row(doc_id, analysis_document(**fields)))
+
+        def write(connection: sqlite3.Connection):
+            connection.executemany(
+                "INSERT OR IGNORE INTO page_contents (ref, data, codec, chars, created_at) VALUES (?, ?, ?, ?, ?)",
+                list(contents.values()),
+            )
+            connection.executemany(
+                f"INSERT OR REPLACE INTO analyses ({', '.join(ANALYSIS_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(ANALYSIS_COLUMNS))})",
+                rows,
+            )
+
+        await self._write(write)
+        logger.info(f"✅ Saved {len(analyses)} analyses to SQLite in a batch")
+
+    async def get_page_content(self, content_ref: str) -> Optional[str]:
+        """Decompressed page content by content hash"""
+        if not self.initialized:
+            return None
+
+        try:
+            row = await self._read(lambda connection: connection.execute(
+                "SELECT data, codec FROM page_contents WHERE ref = ?", (content_ref,)
+            ).fetchone())
+            return decompress_text(row["data"], row["codec"]) if row else None
+
+        except Exception as e:
+            logger.error(f"Failed to get page content: {e}")
+            return None
+
+    async def get_analysis(self, doc_id: str, include_content: bool = True) -> Optional[Dict[str, Any]]:
+        """Get a single analysis by document ID (with its page content unless include_content=False)"""
+        if not self.initialized:
+            return None
+
+        try:
+            row = await self._read(lambda connection: connection.execute(
+                "SELECT * FROM analyses WHERE id = ?", (doc_id,)
+            ).fetchone())
+            if row is None:
+                return None
+
+            data = _analysis_dict(row)
+            data.pop("id", None)
+            if include_content and data.get("page_content_ref"):
+                data["page_content"] = await self.get_page_content(data["page_content_ref"])
+            return data
+
+        except Exception as e:
+            logger.error(f"Failed to get analysis: {e}")
+            return None
+
+    async def list_analyses(self,
+                            limit: int = 50,
+                            agent: Optional[str] = None,
+                            analysis_type: Optional[str] = None,
+                            user_id: Optional[str] = None,
+                            fields: Optional[List[str]] = None) -> list:
+        """List analyses with optional filtering (first page only, see list_analyses_page)"""
+        results, _ = await self.list_analyses_page(
+            limit=limit, agent=agent, analysis_type=analysis_type, user_id=user_id, fields=fields
+        )
+        return results
+
+    async def list_analyses_page(self,
+                                 limit: int = 50,
+                                 agent: Optional[str] = None,
+                                 analysis_type: Optional[str] = None,
+                                 user_id: Optional[str] = None,
+                                 cursor: Optional[str] = None,
+                                 fields: Optional[List[str]] = None) -> Tuple[list, Optional[str]]:
+        """
+        One page of analyses, newest first (see AnalysisDB.list_analyses_page)
+
+        Raises: ValueError for a malformed cursor or unknown field
+        """
+        if not self.initialized:
+            return [], None
+
+        after = decode_cursor(cursor) if cursor else None
+        selected = projection(fields)
+        columns = ["id"] + [column for column in (selected or ANALYSIS_COLUMNS) if column in ANALYSIS_COLUMNS and column != "id"]
+
+        conditions, params = [], []
+        for column, value in (("agent", agent), ("analysis_type", analysis_type), ("user_id", user_id)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if after:
+            timestamp = after[0] if isinstance(after[0], str) else to_utc_text(after[0])
+            conditions.append("(timestamp < ? OR (timestamp = ? AND id < ?))")
+            params.extend([timestamp, timestamp, after[1]])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"SELECT {', '.join(columns)} FROM analyses {where} ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        try:
+            rows = await self._read(lambda connection: connection.execute(sql, params).fetchall())
+            results = [_analysis_dict(row) for row in rows]
+
+            next_cursor = None
+            if len(results) > limit:
+                results = results[:limit]
+                last = results[-1]
+                next_cursor = encode_cursor(last.get("timestamp"), last["id"])
+
+            logger.info(f"Retrieved {len(results)} analyses from SQLite")
+            return results, next_cursor
+
+        except Exception as e:
+            logger.error(f"Failed to list analyses: {e}")
+            return [], None
+
+    async def get_clause_snapshot(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get the clause fingerprints and per-unit results of the last incremental analysis"""
+        if not self.initialized:
+            return None
+
+        try:
+            row = await self._read(lambda connection: connection.execute(
+                "SELECT snapshot FROM clause_snapshots WHERE key = ?", (key,)
+            ).fetchone())
+            return json.loads(row["snapshot"]) if row else None
+
+        except Exception as e:
+            logger.error(f"Failed to get clause snapshot: {e}")
+            return None
+
+    async def save_clause_snapshot(self, key: str, snapshot: Dict[str, Any]) -> bool:
+        """Replace the clause snapshot for an incremental analysis key"""
+        if not self.initialized:
+            return False
+
+        try:
+            value = json.dumps(snapshot, default=str)
+            await self._write(lambda connection: connection.execute(
+                "INSERT OR REPLACE INTO clause_snapshots (key, snapshot, updated_at) VALUES (?, ?, ?)",
+                (key, value, to_utc_text(datetime.utcnow())),
+            ))
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to save clause snapshot: {e}")
+            return False
+
+    async def delete_analysis(self, doc_id: str) -> bool:
+        """Delete a single analysis by document ID, and its page content if nothing else uses it"""
+        if not self.initialized:
+            return False
+
+        def delete(connection: sqlite3.Connection):
+            row = connection.execute("SELECT page_content_ref FROM analyses WHERE id = ?", (doc_id,)).fetchone()
+            connection.execute("DELETE FROM analyses WHERE id = ?", (doc_id,))
+            if row and row[0]:
+                connection.execute(
+                    "DELETE FROM page_contents WHERE ref = ? "
+                    "AND NOT EXISTS (SELECT 1 FROM analyses WHERE page_content_ref = ?)",
+                    (row[0], row[0]),
+                )
+
+        try:
+            await self._write(delete)
+            logger.info(f"✅ Deleted analysis from SQLite: {doc_id}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to delete analysis: {e}")
+            return False
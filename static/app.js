@@ -1,4 +1,4 @@
-import { renderAnalysis } from './renderer.js';
+import { renderAnalysis, streamAnalysis } from './renderer.js';
 
 const SERVER_URL = window.location.origin;
 
@@ -49,12 +49,14 @@ const PROMPTS = {
 };
 
 let currentDocument = '';
+let currentDocId = null; // server-side copy of uploaded/fetched text (currentDocument then holds a preview)
 let selectedAgent = '';
 let selectedAnalysisType = '';
 let selectedLanguage = 'English';
 let lastAnalysisResult = '';
 let currentStep = 1;
 let conversationHistory = [];
+let conversationId = null; // server-side conversation for follow-up questions
 let selectionStep = 1; // 1=agent, 2=analysis, 3=language
 
 // DOM Elements
@@ -217,7 +219,7 @@ fileUpload.addEventListener('change', async (e) => {
             const formData = new FormData();
             formData.append('file', file);
             
-            const response = await fetch(`${SERVER_URL}/upload`, {
+            const response = await fetch(`${SERVER_URL}/upload?include_text=false`, {
                 method: 'POST',
                 body: formData
             });
@@ -227,10 +229,10 @@ fileUpload.addEventListener('change', async (e) => {
             }
             
             const data = await response.json();
-            currentDocument = data.text;
+            useServerDocument(data);
             textInput.value = ''; // Clear text input
             urlInput.value = ''; // Clear URL input
-            showStatus(uploadStatus, `✅ File uploaded successfully! ${data.text.length} characters extracted.`, 'success');
+            showStatus(uploadStatus, `✅ File uploaded successfully! ${data.length} characters extracted.`, 'success');
         } catch (error) {
             showStatus(uploadStatus, `❌ Upload failed: ${error.message}`, 'error');
         }
@@ -250,7 +252,7 @@ scrapeUrlBtn.addEventListener('click', async () => {
         const response = await fetch(`${SERVER_URL}/scrape-url`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ url: url })
+            body: JSON.stringify({ url: url, include_text: false })
         });
         
         if (!response.ok) {
@@ -259,16 +261,16 @@ scrapeUrlBtn.addEventListener('click', async () => {
         }
         
         const data = await response.json();
-        currentDocument = data.text;
+        useServerDocument(data);
         textInput.value = ''; // Clear text input
         
         // Show centered success message
-        showCenteredMessage(`✅ Content fetched successfully!<br>${data.text.length} characters from "${data.title}"`);
+        showCenteredMessage(`✅ Content fetched successfully!<br>${data.length} characters from "${data.title}"`);
         
         // Highlight the "Next: Choose Agent" button
         highlightNextButton();
         
-        showStatus(uploadStatus, `✅ Content scraped successfully! ${data.text.length} characters from "${data.title}"`, 'success');
+        showStatus(uploadStatus, `✅ Content scraped successfully! ${data.length} characters from "${data.title}"`, 'success');
     } catch (error) {
         showStatus(uploadStatus, `❌ Scraping failed: ${error.message}`, 'error');
     }
@@ -278,7 +280,7 @@ scrapeUrlBtn.addEventListener('click', async () => {
 textInput.addEventListener('input', () => {
     const text = textInput.value.trim();
     if (text) {
-        currentDocument = text;
+        useLocalDocument(text);
         urlInput.value = ''; // Clear URL input
     }
 });
@@ -287,7 +289,7 @@ textInput.addEventListener('input', () => {
 nextToAgent.addEventListener('click', () => {
     const text = textInput.value.trim();
     if (text) {
-        currentDocument = text;
+        useLocalDocument(text);
     }
     
     if (!currentDocument) {
@@ -403,24 +405,18 @@ async function runAnalysis(customPromptText = null) {
             systemPrompt += `\n\nIMPORTANT: You MUST respond entirely in ${selectedLanguage}. All your analysis, explanations, and text must be written in ${selectedLanguage}.`;
         }
         
-        const response = await fetch(`${SERVER_URL}/analyze`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                pageText: currentDocument.slice(0, 100000),
-                systemPrompt: systemPrompt,
-                agent: selectedAgent,
-                analysisType: selectedAnalysisType
-            })
+        // Stream the analysis so sections render as soon as they are ready
+        const data = await streamAnalysis(`${SERVER_URL}/analyze/stream`, {
+            ...documentFields('pageText'),
+            systemPrompt: systemPrompt,
+            agent: selectedAgent,
+            analysisType: selectedAnalysisType
+        }, partial => {
+            analysisResults.classList.remove('loading');
+            analysisResults.innerHTML = renderAnalysis(partial);
         });
-        
-        if (!response.ok) {
-            const errorData = await response.json();
-            throw new Error(errorData.error || 'Analysis failed');
-        }
-        
-        const data = await response.json();
         lastAnalysisResult = data.result;
+        conversationId = null;
         
         analysisResults.classList.remove('loading');
         
@@ -499,7 +495,7 @@ saveBtn.addEventListener('click', async () => {
                 pageTitle: 'Document Analysis',
                 pageUrl: window.location.href,
                 resultText: lastAnalysisResult,
-                pageContent: currentDocument
+                ...documentFields('pageContent')
             })
         });
         
@@ -563,23 +559,7 @@ async function askQuestion() {
             questionToSend = `${question}\n\nIMPORTANT: You MUST respond entirely in ${selectedLanguage}.`;
         }
         
-        const response = await fetch(`${SERVER_URL}/ask-question`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                question: questionToSend,
-                pageContent: currentDocument,
-                analysisResult: lastAnalysisResult,
-                conversationHistory: conversationHistory
-            })
-        });
-        
-        if (!response.ok) {
-            const errorData = await response.json();
-            throw new Error(errorData.error || 'Failed to get answer');
-        }
-        
-        const data = await response.json();
+        const data = await askFollowUp(questionToSend);
         
         // Remove loading message
         removeLoadingMessage(loadingMsgId);
@@ -662,9 +642,83 @@ function removeLoadingMessage(msgId) {
     }
 }
 
+// Uploaded/fetched text stays on the server; keep its doc_id and a preview
+function useServerDocument(data) {
+    currentDocId = data.doc_id || null;
+    currentDocument = currentDocId ? (data.preview || '') : (data.text || '');
+}
+
+// Typed or pasted text is sent with each request as before
+function useLocalDocument(text) {
+    currentDocId = null;
+    currentDocument = text;
+}
+
+// Request fields that identify the current document
+function documentFields(textField) {
+    if (currentDocId) {
+        return { docId: currentDocId };
+    }
+    return { [textField]: textField === 'pageText' ? currentDocument.slice(0, 100000) : currentDocument };
+}
+
+// Send a follow-up question through a server-side conversation, so only the
+// question is uploaded. Falls back to /ask-question with the full history if
+// the conversation has expired or lives on another server instance.
+async function askFollowUp(question) {
+    if (!conversationId && conversationHistory.length === 0) {
+        const createResponse = await fetch(`${SERVER_URL}/conversations`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                ...documentFields('pageContent'),
+                analysisResult: lastAnalysisResult
+            })
+        });
+        if (createResponse.ok) {
+            conversationId = (await createResponse.json()).conversation_id;
+        }
+    }
+    
+    if (conversationId) {
+        const response = await fetch(`${SERVER_URL}/conversations/${conversationId}/messages`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ question: question })
+        });
+        if (response.ok) {
+            return response.json();
+        }
+        if (response.status !== 404) {
+            const errorData = await response.json();
+            throw new Error(errorData.error || 'Failed to get answer');
+        }
+        conversationId = null;
+    }
+    
+    const response = await fetch(`${SERVER_URL}/ask-question`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            question: question,
+            ...documentFields('pageContent'),
+            analysisResult: lastAnalysisResult,
+            conversationHistory: conversationHistory
+        })
+    });
+    
+    if (!response.ok) {
+        const errorData = await response.json();
+        throw new Error(errorData.error || 'Failed to get answer');
+    }
+    
+    return response.json();
+}
+
 // Reset conversation when starting new analysis
 function resetConversation() {
     conversationHistory = [];
+    conversationId = null;
     conversationContainer.innerHTML = '';
     questionInput.value = '';
 }
@@ -729,7 +783,7 @@ if (fileUploadMobile) {
                 const formData = new FormData();
                 formData.append('file', file);
                 
-                const response = await fetch(`${SERVER_URL}/upload`, {
+                const response = await fetch(`${SERVER_URL}/upload?include_text=false`, {
                     method: 'POST',
                     body: formData
                 });
@@ -739,7 +793,7 @@ if (fileUploadMobile) {
                 }
                 
                 const data = await response.json();
-                currentDocument = data.text;
+                useServerDocument(data);
                 textInput.value = '';
                 urlInput.value = '';
                 const textInputMobile = document.getElementById('textInputMobile');
@@ -747,7 +801,7 @@ if (fileUploadMobile) {
                 if (textInputMobile) textInputMobile.value = '';
                 if (urlInputMobile) urlInputMobile.value = '';
                 
-                showStatus(uploadStatus, `✅ File uploaded successfully! ${data.text.length} characters extracted.`, 'success');
+                showStatus(uploadStatus, `✅ File uploaded successfully! ${data.length} characters extracted.`, 'success');
             } catch (error) {
                 showStatus(uploadStatus, `❌ Upload failed: ${error.message}`, 'error');
             }
@@ -801,7 +855,7 @@ if (scrapeUrlBtnMobile && urlInputMobile) {
             const response = await fetch(`${SERVER_URL}/scrape-url`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ url: url })
+                body: JSON.stringify({ url: url, include_text: false })
             });
             
             if (!response.ok) {
@@ -810,17 +864,17 @@ if (scrapeUrlBtnMobile && urlInputMobile) {
             }
             
             const data = await response.json();
-            currentDocument = data.text;
+            useServerDocument(data);
             textInput.value = '';
             urlInput.value = '';
             const textInputMobile = document.getElementById('textInputMobile');
             if (textInputMobile) textInputMobile.value = '';
             
-            showStatus(uploadStatus, `✅ Content scraped successfully! ${data.text.length} characters from "${data.title}"`, 'success');
+            showStatus(uploadStatus, `✅ Content scraped successfully! ${data.length} characters from "${data.title}"`, 'success');
             closeModal('urlFetchModal');
             
             // Show centered success message
-            showCenteredMessage(`✅ Content fetched successfully!<br>${data.text.length} characters from "${data.title}"`);
+            showCenteredMessage(`✅ Content fetched successfully!<br>${data.length} characters from "${data.title}"`);
             
             // Highlight the "Next: Choose Agent" button
             highlightNextButton();
@@ -838,7 +892,7 @@ if (confirmPasteText && textInputMobile) {
     confirmPasteText.addEventListener('click', () => {
         const text = textInputMobile.value.trim();
         if (text) {
-            currentDocument = text;
+            useLocalDocument(text);
             textInput.value = text; // Sync with desktop input
             urlInput.value = '';
             urlInputMobile.value = '';
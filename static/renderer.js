@@ -102,6 +102,73 @@ export function renderAnalysis(data) {
     return html;
 }
 
+/**
+ * POST to the /analyze/stream SSE endpoint and build the structured result as it arrives
+ * @param {string} url - Streaming endpoint URL
+ * @param {Object} body - Same request body as /analyze
+ * @param {Function} onUpdate - Called with a partial {result, structured} object after each field/item
+ * @returns {Promise<Object>} Final payload (same shape as /analyze)
+ */
+export async function streamAnalysis(url, body, onUpdate) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body)
+    });
+
+    if (!response.ok || !response.body) {
+        let message = 'Analysis failed';
+        try {
+            message = (await response.json()).error || message;
+        } catch (e) {}
+        throw new Error(message);
+    }
+
+    const partial = { result: '', structured: {} };
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let final = null;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let eventName = 'message';
+            let dataText = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                else if (line.startsWith('data:')) dataText += line.slice(5).trim();
+            });
+            if (!dataText) continue;
+            const data = JSON.parse(dataText);
+
+            if (eventName === 'field') {
+                partial.structured[data.key] = data.value;
+                onUpdate(partial);
+            } else if (eventName === 'item') {
+                (partial.structured[data.key] = partial.structured[data.key] || [])[data.index] = data.value;
+                onUpdate(partial);
+            } else if (eventName === 'done') {
+                final = data;
+            } else if (eventName === 'error') {
+                throw new Error(data.error || 'Analysis failed');
+            }
+        }
+    }
+
+    if (!final) {
+        throw new Error('Analysis stream ended unexpectedly');
+    }
+    return final;
+}
+
 /**
  * Get icon for severity level
  */
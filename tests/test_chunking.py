@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+import server
+from chunking import merge_analyses
+from config import config
+
+DOCUMENT = "\n\n".join(f"{index}. Clause {index}\n" + "Terms apply. " * 10 for index in range(1, 9))
+
+
+def test_sections_sharing_a_title_are_kept_unless_identical():
+    first = {"summary": "A", "severity": "medium", "sections": [
+        {"title": "Termination", "content": "We may close your account without notice."},
+    ]}
+    second = {"summary": "B", "severity": "high", "sections": [
+        {"title": "Termination", "content": "Refunds are not given after termination."},
+        {"title": "termination ", "content": "We may close  your account without notice."},
+    ]}
+    merged = merge_analyses([first, second])
+    assert [section["content"] for section in merged["sections"]] == [
+        "We may close your account without notice.",
+        "Refunds are not given after termination.",
+    ]
+    assert merged["severity"] == "high"
+
+
+@pytest.fixture
+def chunked(monkeypatch):
+    """Split DOCUMENT into 4 chunks and stub the model calls"""
+    monkeypatch.setattr(config, "ANALYSIS_CHUNK_SIZE", 300)
+    monkeypatch.setattr(config, "ANALYSIS_CACHE_ENABLED", False)
+    reduce_calls = []
+
+    async def reduce(messages):
+        reduce_calls.append(messages[1]["content"])
+        return '{"summary": "One overview."}'
+
+    monkeypatch.setattr(server, "request_json_completion", reduce)
+    return reduce_calls
+
+
+def stub_analysis(monkeypatch, structured):
+    async def run_analysis(text, prompt):
+        result = structured(text)
+        return {"result": "", "structured": result, "cached": False}
+    monkeypatch.setattr(server, "run_analysis", run_analysis)
+
+
+def test_chunk_summaries_are_consolidated_by_one_call(chunked, monkeypatch):
+    stub_analysis(monkeypatch, lambda text: {"summary": f"Part about {text.split()[0]}"})
+    outcome = asyncio.run(server.run_chunked_analysis(DOCUMENT, "prompt"))
+    assert outcome["chunks"] > 1
+    assert outcome["structured"]["summary"] == "One overview."
+    assert len(chunked) == 1 and chunked[0].count("\nPART ") == outcome["chunks"]
+
+
+def test_non_json_chunks_count_as_failed(chunked, monkeypatch):
+    stub_analysis(monkeypatch, lambda text: None if text.startswith("1.") else {"summary": "ok"})
+    outcome = asyncio.run(server.run_chunked_analysis(DOCUMENT, "prompt"))
+    assert outcome["failed_chunks"] == 1
+
+
+def test_no_structured_chunk_is_an_error(chunked, monkeypatch):
+    stub_analysis(monkeypatch, lambda text: None)
+    with pytest.raises(server.UpstreamError):
+        asyncio.run(server.run_chunked_analysis(DOCUMENT, "prompt"))
@@ -0,0 +1,37 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import database
+
+
+def test_missing_backend_is_not_reopened_on_every_call(monkeypatch):
+    attempts = []
+
+    async def no_backend():
+        attempts.append(1)
+        return None
+
+    monkeypatch.setattr(database, "_open_backend", no_backend)
+    monkeypatch.setattr(database, "_db_instance", None)
+    monkeypatch.setattr(database, "_db_opened", False)
+
+    async def main():
+        return [await database.get_db() for _ in range(3)]
+
+    assert asyncio.run(main()) == [None, None, None]
+    assert attempts == [1]
+
+
+def test_cursor_round_trips_timestamp_and_id():
+    timestamp = datetime(2024, 5, 1, 12, 0, 0, 123456)
+    cursor = database.encode_cursor(timestamp, "abc")
+    assert "=" not in cursor
+    assert database.decode_cursor(cursor) == (timestamp, "abc")
+
+
+@pytest.mark.parametrize("cursor", ["", "%%%", "bm90IGpzb24", "eyJ0IjogMX0"])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        database.decode_cursor(cursor)
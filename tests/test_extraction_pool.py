@@ -0,0 +1,99 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from extraction_pool import ExtractionError, ExtractionPool
+from extractors import pdf_page_count
+
+
+def make_pool(workers, timeout):
+    return ExtractionPool(name="test", workers=workers, timeout=timeout, max_bytes=0, max_pages=0,
+                          parallel_min_bytes=0, stream_batch_pages=1)
+
+
+def run(pool, main):
+    try:
+        return asyncio.run(main())
+    finally:
+        pool.shutdown()
+
+
+def pid_is_alive(pid):
+    try:
+        os.waitpid(pid, os.WNOHANG)
+        os.kill(pid, 0)
+    except (ChildProcessError, ProcessLookupError):
+        return False
+    return True
+
+
+def test_timed_out_job_kills_only_its_worker():
+    pool = make_pool(workers=2, timeout=1.0)
+
+    async def main():
+        pool.start()
+        while pool.idle.qsize() < 2:
+            await asyncio.sleep(0.05)
+        pids = {worker.pid for worker in pool.live}
+        stuck = asyncio.ensure_future(pool._run(time.sleep, 30))
+        await asyncio.sleep(0.5)
+        # Still running on the other worker when the stuck one is killed
+        survivor = asyncio.ensure_future(pool._run(time.sleep, 0.8))
+        with pytest.raises(ExtractionError, match="timed out"):
+            await stuck
+        await survivor
+        # The next job still has two workers: the survivor and a fresh one
+        await pool._run(os.getpid)
+        return pids, {worker.pid for worker in pool.live}
+
+    pids, after = run(pool, main)
+    assert len(pids & after) == 1
+    killed = (pids - after).pop()
+    deadline = time.time() + 5
+    while pid_is_alive(killed) and time.time() < deadline:
+        time.sleep(0.05)
+    assert not pid_is_alive(killed)
+    stats = pool.stats()
+    assert (stats["timeouts"], stats["recycles"], stats["failed"]) == (1, 1, 0)
+
+
+def test_queued_time_does_not_count_against_the_timeout():
+    pool = make_pool(workers=1, timeout=1.0)
+
+    async def main():
+        await pool._run(os.getpid)
+        # Each job takes 0.8s; the second waits ~0.8s for the worker first
+        await asyncio.gather(pool._run(time.sleep, 0.8), pool._run(time.sleep, 0.8))
+
+    run(pool, main)
+    assert pool.stats()["timeouts"] == 0
+
+
+def test_pdf_stream_keeps_one_batch_per_worker_in_flight():
+    pool = ExtractionPool(name="test", workers=2, timeout=1.0, max_bytes=0, max_pages=0,
+                          parallel_min_bytes=0, stream_batch_pages=3)
+    active = []
+    peak = []
+
+    async def fake_run(fn, *args):
+        if fn is pdf_page_count:
+            return 20
+        _, start, end, _ = args
+        active.append(start)
+        peak.append(len(active))
+        # Later batches finish first; they must still be yielded in order
+        await asyncio.sleep(0.01 * (10 - start // 3))
+        active.remove(start)
+        return [f"page {index}" for index in range(start, end)]
+
+    pool._run = fake_run
+
+    async def main():
+        return [batch async for batch in pool.stream_pdf_pages(b"%PDF")]
+
+    batches = asyncio.run(main())
+    assert [start for start, _ in batches] == list(range(0, 20, 3))
+    assert [page for _, pages in batches for page in pages] == [f"page {index}" for index in range(20)]
+    assert max(peak) == 2
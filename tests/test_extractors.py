@@ -0,0 +1,58 @@
+import zipfile
+from io import BytesIO
+
+from extractors import extract_docx_xml
+
+NAMESPACES = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006" '
+    'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing" '
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:wps="http://schemas.microsoft.com/office/word/2010/wordprocessingShape" '
+    'xmlns:v="urn:schemas-microsoft-com:vml"'
+)
+
+
+def paragraph(text):
+    return f'<w:p><w:r><w:t>{text}</w:t></w:r></w:p>'
+
+
+def text_box(text):
+    """A text box as Word writes it: DrawingML, with a VML copy as the fallback"""
+    return (
+        '<w:r><mc:AlternateContent>'
+        '<mc:Choice Requires="wps"><w:drawing><wp:anchor><a:graphic><a:graphicData><wps:wsp><wps:txbx>'
+        f'<w:txbxContent>{paragraph(text)}</w:txbxContent>'
+        '</wps:txbx></wps:wsp></a:graphicData></a:graphic></wp:anchor></w:drawing></mc:Choice>'
+        '<mc:Fallback><w:pict><v:shape><v:textbox>'
+        f'<w:txbxContent>{paragraph(text)}</w:txbxContent>'
+        '</v:textbox></v:shape></w:pict></mc:Fallback>'
+        '</mc:AlternateContent></w:r>'
+    )
+
+
+def docx(body):
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('word/document.xml', f'<w:document {NAMESPACES}><w:body>{body}</w:body></w:document>')
+    return buffer.getvalue()
+
+
+def test_text_box_is_read_once_after_its_paragraph():
+    body = (
+        f'<w:p><w:r><w:t xml:space="preserve">Outer start </w:t></w:r>{text_box("Box text")}'
+        '<w:r><w:t>outer end</w:t></w:r></w:p>'
+        + paragraph('Kept')
+    )
+    assert extract_docx_xml(docx(body)).split('\n') == ['Outer start outer end', 'Box text', 'Kept']
+
+
+def test_text_box_in_table_cell_stays_in_its_cell():
+    body = (
+        '<w:tbl><w:tr>'
+        f'<w:tc><w:p><w:r><w:t>Fee</w:t></w:r>{text_box("see note")}</w:p></w:tc>'
+        f'<w:tc>{paragraph("$10")}</w:tc>'
+        '</w:tr></w:tbl>'
+        + paragraph('After')
+    )
+    assert extract_docx_xml(docx(body)).split('\n') == ['Fee see note\t$10', 'After']
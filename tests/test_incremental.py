@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+import incremental
+from config import config
+
+URL = "https://example.com/terms"
+PROMPT = "Find harmful clauses"
+
+CLAUSES = {
+    "1. Acceptance": "By using the service you accept these terms.",
+    "2. Payment": "Fees are billed monthly in advance.",
+    "3. Termination": "We may close your account at any time.",
+}
+
+
+def document(clauses):
+    return "\n\n".join(f"{heading}\n{body}" for heading, body in clauses.items())
+
+
+class StubAnalyzer:
+    """analyze_unit / analyze_document stand-in that records the text sent to the model"""
+
+    def __init__(self, summary, suffix=""):
+        self.summary = summary
+        self.suffix = suffix
+        self.calls = []
+
+    async def __call__(self, text):
+        self.calls.append(text)
+        headings = [line for line in text.split("\n") if line[:1].isdigit()]
+        return {"summary": self.summary, "sections": [{"title": heading + self.suffix} for heading in headings]}
+
+
+@pytest.fixture(autouse=True)
+def local_snapshots(monkeypatch):
+    async def no_db():
+        return None
+    monkeypatch.setattr(incremental, "get_db", no_db)
+    monkeypatch.setattr(incremental, "_local_snapshots", None)
+    monkeypatch.setattr(config, "ANALYSIS_CACHE_DIR", "")
+    # One clause per unit, so each clause is reused or re-analyzed on its own
+    monkeypatch.setattr(config, "INCREMENTAL_UNIT_CHARS", 1)
+    monkeypatch.setattr(config, "INCREMENTAL_FULL_PASS_RATIO", 0.5)
+
+
+def analyze(text):
+    """Returns: (outcome, texts sent as units, texts sent as whole documents)"""
+    unit, whole = StubAnalyzer("unit", suffix=" (revised)"), StubAnalyzer("whole")
+    outcome = asyncio.run(incremental.analyze_incrementally(URL, text, PROMPT, "model", unit, whole))
+    return outcome, unit.calls, whole.calls
+
+
+def titles(outcome):
+    return [section["title"] for section in outcome["structured"]["sections"]]
+
+
+def test_first_analysis_is_one_whole_document_pass():
+    outcome, units, whole = analyze(document(CLAUSES))
+    assert (units, whole) == ([], [document(CLAUSES)])
+    changes = outcome["changes"]
+    assert changes["first_analysis"] is True and changes["full_pass"] is True
+    assert outcome["structured"]["summary"] == "whole"
+    assert titles(outcome) == list(CLAUSES)
+
+
+def test_unchanged_document_is_not_sent_again():
+    analyze(document(CLAUSES))
+    outcome, units, whole = analyze(document(CLAUSES))
+    assert (units, whole) == ([], [])
+    changes = outcome["changes"]
+    assert changes["first_analysis"] is False and changes["full_pass"] is False
+    assert (changes["analyzed_units"], changes["analyzed_chars"], changes["unchanged"]) == (0, 0, 3)
+    assert (changes["added"], changes["changed"], changes["removed"]) == ([], [], [])
+    assert outcome["structured"]["summary"] == "whole"
+    assert titles(outcome) == list(CLAUSES)
+
+
+def test_changed_clause_is_the_only_one_reanalyzed():
+    analyze(document(CLAUSES))
+    edited = {**CLAUSES, "2. Payment": "Fees are billed yearly and are non-refundable."}
+
+    outcome, units, whole = analyze(document(edited))
+    assert (units, whole) == (["2. Payment\nFees are billed yearly and are non-refundable."], [])
+    changes = outcome["changes"]
+    assert changes["changed"] == ["2. Payment"]
+    assert (changes["added"], changes["removed"]) == ([], [])
+    assert (changes["reused_units"], changes["analyzed_units"]) == (0, 1)
+    assert changes["new_findings"]["sections"] == [{"title": "2. Payment (revised)"}]
+    # The whole-document result, plus what the changed clause turned up
+    assert outcome["structured"]["summary"] == "whole"
+    assert titles(outcome) == list(CLAUSES) + ["2. Payment (revised)"]
+
+    # Checking the edited version again reuses the clause's unit
+    outcome, units, whole = analyze(document(edited))
+    assert (units, whole) == ([], [])
+    assert outcome["changes"]["reused_units"] == 1
+    assert titles(outcome) == list(CLAUSES) + ["2. Payment (revised)"]
+
+
+def test_removed_clause_is_reported_without_model_calls():
+    analyze(document(CLAUSES))
+    shortened = {heading: body for heading, body in CLAUSES.items() if heading != "3. Termination"}
+
+    outcome, units, whole = analyze(document(shortened))
+    assert (units, whole) == ([], [])
+    changes = outcome["changes"]
+    assert changes["removed"] == ["3. Termination"]
+    assert (changes["added"], changes["changed"]) == ([], [])
+
+
+def test_mostly_changed_document_is_analyzed_whole_again():
+    analyze(document(CLAUSES))
+    rewritten = {heading: body + " Amended." for heading, body in CLAUSES.items()}
+
+    outcome, units, whole = analyze(document(rewritten))
+    assert (units, whole) == ([], [document(rewritten)])
+    changes = outcome["changes"]
+    assert changes["full_pass"] is True and changes["first_analysis"] is False
+    assert changes["changed"] == list(CLAUSES)
+
+
+def test_diff_pairs_clauses_by_heading():
+    previous = [
+        {"fingerprint": clause.fingerprint, "heading": clause.heading, "heading_key": clause.heading_key}
+        for clause in incremental.split_clauses(document(CLAUSES))
+    ]
+    current = incremental.split_clauses(document({
+        "1. Acceptance": CLAUSES["1. Acceptance"],
+        "2. Payment": "Fees are billed weekly.",
+        "4. Arbitration": "Disputes go to binding arbitration.",
+    }))
+    diff = incremental.diff_clauses(previous, current)
+    assert diff == {"added": ["4. Arbitration"], "changed": ["2. Payment"], "removed": ["3. Termination"], "unchanged": 1}
@@ -0,0 +1,33 @@
+from extractors import extract_html_page
+
+FILLER = ("The Company may update these terms at any time and will notify users of material "
+          "changes by email or through the service before they take effect. ")
+
+def legal_page():
+    return f"""<html><head><title>Terms</title></head><body>
+<header class="site-header"><a href="/">Home</a> <a href="/login">Log in</a></header>
+<nav><a href="/a">About</a> <a href="/b">Blog</a> <a href="/c">Careers</a></nav>
+<div id="cookie-banner">We use cookies. <a href="/cookies">Learn more</a></div>
+<article>
+  <section><header><h2>1. Acceptance</h2></header><p>{FILLER * 3}</p></section>
+  <section id="cookie-policy"><h2>7. Cookie Policy</h2><p>We store cookies to keep you signed in. {FILLER}</p></section>
+  <section class="consent"><h2>8. Your consent</h2><p>By using the service you waive class action rights. {FILLER}</p></section>
+  <section class="share"><h2>9. Sharing your data</h2><p>We share data with processors listed in Annex B. {FILLER}</p></section>
+</article>
+<footer><a href="/privacy">Privacy</a> <a href="/terms">Terms</a> Copyright 2026</footer>
+</body></html>""".encode()
+
+def test_legal_sections_named_like_chrome_are_kept():
+    page = extract_html_page(legal_page(), main_content=True)
+    text = page['text']
+    assert page['main_content'] is True
+    for heading in ('1. Acceptance', '7. Cookie Policy', '8. Your consent', '9. Sharing your data'):
+        assert heading in text
+    assert 'waive class action rights' in text
+
+def test_page_level_chrome_is_removed():
+    text = extract_html_page(legal_page(), main_content=True)['text']
+    assert 'We use cookies' not in text
+    assert 'Careers' not in text
+    assert 'Copyright 2026' not in text
+    assert 'Log in' not in text
@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import pytest
+
+import save_queue
+from save_queue import SaveQueue, SaveQueueFull
+
+
+class FakeDB:
+    """save_analyses_batch stand-in that fails the first `failures` calls"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+        self.saved = []
+        self.ids = 0
+
+    def new_analysis_id(self):
+        self.ids += 1
+        return f"id-{self.ids}"
+
+    async def save_analyses_batch(self, analyses):
+        self.calls.append([doc_id for doc_id, _ in analyses])
+        if len(self.calls) <= self.failures:
+            raise RuntimeError("backend unavailable")
+        self.saved.extend(analyses)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    def install(db):
+        async def get_db():
+            return db
+        monkeypatch.setattr(save_queue, "get_db", get_db)
+        return db
+    return install
+
+
+def make_queue(tmp_path, **overrides):
+    options = dict(max_size=10, batch_size=10, flush_interval=0.01, max_retries=2,
+                   retry_backoff=0.001, dead_letter_file=str(tmp_path / "dead.jsonl"))
+    options.update(overrides)
+    return SaveQueue(**options)
+
+
+def record(n):
+    return dict(timestamp="2024-05-01T12:00:00", agent="summary", analysis_type="url",
+                page_title=f"Terms {n}", page_url=f"https://example.com/{n}", result_text="{}")
+
+
+def test_failed_batch_is_retried_until_it_succeeds(tmp_path, fake_db):
+    db = fake_db(FakeDB(failures=2))
+    queue = make_queue(tmp_path)
+
+    async def main():
+        queue.start()
+        ids = [await queue.enqueue(**record(n)) for n in range(3)]
+        await queue.close(timeout=5)
+        return ids
+
+    ids = asyncio.run(main())
+    # Same batch each time, so a retry never writes a record twice
+    assert db.calls == [ids, ids, ids]
+    assert [doc_id for doc_id, _ in db.saved] == ids
+    stats = queue.stats()
+    assert (stats["written"], stats["retries"], stats["dead_lettered"]) == (3, 2, 0)
+    assert not (tmp_path / "dead.jsonl").exists()
+
+
+def test_batch_is_dead_lettered_after_the_last_retry(tmp_path, fake_db):
+    db = fake_db(FakeDB(failures=10))
+    queue = make_queue(tmp_path, max_retries=1)
+
+    async def main():
+        queue.start()
+        ids = [await queue.enqueue(**record(n)) for n in range(2)]
+        await queue.close(timeout=5)
+        return ids
+
+    ids = asyncio.run(main())
+    assert len(db.calls) == 2
+    dead = [json.loads(line) for line in (tmp_path / "dead.jsonl").read_text().splitlines()]
+    assert [entry["id"] for entry in dead] == ids
+    assert [entry["page_title"] for entry in dead] == ["Terms 0", "Terms 1"]
+    stats = queue.stats()
+    assert (stats["written"], stats["retries"], stats["dead_lettered"]) == (0, 1, 2)
+
+
+def test_close_flushes_everything_still_queued(tmp_path, fake_db):
+    db = fake_db(FakeDB())
+    # Neither the batch size nor the flush interval would flush before close
+    queue = make_queue(tmp_path, batch_size=100, flush_interval=60)
+
+    async def main():
+        queue.start()
+        ids = [await queue.enqueue(**record(n)) for n in range(5)]
+        await asyncio.sleep(0.01)
+        before = len(db.saved)
+        await queue.close(timeout=5)
+        with pytest.raises(SaveQueueFull):
+            await queue.enqueue(**record(5))
+        return ids, before
+
+    ids, before = asyncio.run(main())
+    assert before == 0
+    assert [doc_id for doc_id, _ in db.saved] == ids
+    assert queue.stats()["written"] == 5
+
+
+def test_close_dead_letters_what_it_cannot_flush_in_time(tmp_path, fake_db):
+    db = fake_db(FakeDB(failures=10))
+    queue = make_queue(tmp_path, max_retries=5, retry_backoff=10)
+
+    async def main():
+        queue.start()
+        ids = [await queue.enqueue(**record(n)) for n in range(2)]
+        await queue.close(timeout=0.2)
+        return ids
+
+    ids = asyncio.run(main())
+    assert len(db.calls) == 1
+    dead = [json.loads(line) for line in (tmp_path / "dead.jsonl").read_text().splitlines()]
+    assert [entry["id"] for entry in dead] == ids
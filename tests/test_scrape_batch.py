@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+import server
+
+
+class FakeResponse:
+    def __init__(self):
+        self.lines = []
+
+    async def send(self, data):
+        self.lines.append(json.loads(data))
+
+    async def eof(self):
+        pass
+
+
+class FakeRequest:
+    def __init__(self, body):
+        self.json = body
+        self.response = FakeResponse()
+
+    async def respond(self, **kwargs):
+        return self.response
+
+
+def test_batch_fetches_each_url_once_through_the_host_limiter(monkeypatch):
+    calls = []
+
+    async def scrape_page(url, host_limited=False, **options):
+        calls.append((url, host_limited))
+        await asyncio.sleep(0.01)
+        return {'title': url, 'length': 1}
+
+    monkeypatch.setattr(server, 'scrape_page', scrape_page)
+    request = FakeRequest({'urls': [
+        'https://example.com/terms',
+        'https://EXAMPLE.com/terms#top',
+        'https://example.com/privacy',
+        'https://example.com/terms',
+    ]})
+    asyncio.run(server.scrape_url_batch(request))
+
+    assert sorted(calls) == [('https://example.com/privacy', True), ('https://example.com/terms', True)]
+    results = sorted((line for line in request.response.lines if line['type'] == 'result'), key=lambda line: line['index'])
+    assert [line['index'] for line in results] == [0, 1, 2, 3]
+    assert [line['title'] for line in results] == [
+        'https://example.com/terms', 'https://example.com/terms',
+        'https://example.com/privacy', 'https://example.com/terms',
+    ]
+    assert request.response.lines[-1] == {'type': 'done', 'count': 4, 'failed': 0}
@@ -0,0 +1,95 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+
+def collect(flight, key, fn):
+    async def run():
+        return [item async for item in flight.stream(key, fn)]
+    return run()
+
+
+def test_concurrent_streams_share_one_upstream_call():
+    calls = []
+
+    async def upstream(channel):
+        calls.append(1)
+        for delta in ("{", '"a"', ": 1}"):
+            channel.publish(delta)
+            await asyncio.sleep(0.01)
+        return "done"
+
+    async def main():
+        flight = SingleFlight("test")
+        first = asyncio.ensure_future(collect(flight, "k", upstream))
+        await asyncio.sleep(0.015)
+        # Joins after the first delta was published, and still receives it
+        second = await collect(flight, "k", upstream)
+        first = await first
+        await asyncio.sleep(0)
+        return first, second, flight.stats()
+
+    first, second, stats = asyncio.run(main())
+    expected = [("chunk", "{"), ("chunk", '"a"'), ("chunk", ": 1}"), ("result", "done")]
+    assert first == expected
+    assert second == expected
+    assert len(calls) == 1
+    assert (stats["upstream_calls"], stats["collapsed"], stats["in_flight"]) == (1, 1, 0)
+
+
+def test_stream_joining_plain_call_gets_result_only():
+    async def upstream():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def never(channel):
+        raise AssertionError("should have joined the call in flight")
+
+    async def main():
+        flight = SingleFlight("test")
+        plain = asyncio.ensure_future(flight.do("k", upstream))
+        await asyncio.sleep(0)
+        streamed = await collect(flight, "k", never)
+        return await plain, streamed
+
+    assert asyncio.run(main()) == ("done", [("result", "done")])
+
+
+def test_upstream_error_reaches_every_subscriber():
+    async def upstream(channel):
+        channel.publish("partial")
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def main():
+        flight = SingleFlight("test")
+        outcomes = await asyncio.gather(
+            collect(flight, "k", upstream), collect(flight, "k", upstream), return_exceptions=True
+        )
+        return [type(outcome) for outcome in outcomes]
+
+    assert asyncio.run(main()) == [ValueError, ValueError]
+
+
+def test_last_subscriber_leaving_cancels_upstream():
+    cancelled = []
+
+    async def upstream(channel):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def main():
+        flight = SingleFlight("test")
+        reader = asyncio.ensure_future(collect(flight, "k", upstream))
+        await asyncio.sleep(0.01)
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        await asyncio.sleep(0)
+        return flight.stats()
+
+    stats = asyncio.run(main())
+    assert cancelled == [1]
+    assert stats["cancelled_upstream"] == 1
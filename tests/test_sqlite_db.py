@@ -0,0 +1,145 @@
+import asyncio
+import csv
+from datetime import datetime, timezone
+
+import pytest
+
+from config import config
+from migrate_csv_to_sqlite import migrate
+from sqlite_db import SQLiteAnalysisDB
+
+PAGE = "These terms govern your use of the service. " * 50
+
+
+def with_db(tmp_path, main):
+    async def run():
+        db = SQLiteAnalysisDB(str(tmp_path / "analyses.db"))
+        await db.initialize()
+        try:
+            return await main(db)
+        finally:
+            await db.close()
+    return asyncio.run(run())
+
+
+def save(db, page_url, page_content=None, timestamp="2024-05-01T12:00:00"):
+    return db.save_analysis(
+        timestamp=timestamp, agent="summary", analysis_type="url", page_title="Terms",
+        page_url=page_url, result_text="{}", page_content=page_content,
+    )
+
+
+def content_rows(db):
+    return db._read(lambda connection: connection.execute("SELECT ref FROM page_contents").fetchall())
+
+
+def test_save_get_list_and_delete_round_trip(tmp_path):
+    async def main(db):
+        doc_id = await db.save_analysis(
+            timestamp="2024-05-01T12:00:00Z", agent="risk", analysis_type="upload", page_title="Terms",
+            page_url="https://example.com/terms", result_text='{"summary": "ok"}', page_content=PAGE,
+            user_id="user-1", metadata={"model": "gpt", "chunks": 2},
+        )
+        other = await save(db, "https://example.com/other")
+        stored = await db.get_analysis(doc_id)
+        without_content = await db.get_analysis(doc_id, include_content=False)
+        by_user = await db.list_analyses(user_id="user-1", fields=["page_title", "page_url"])
+        by_agent = await db.list_analyses(agent="summary")
+        deleted = await db.delete_analysis(doc_id)
+        return doc_id, other, stored, without_content, by_user, by_agent, deleted, await db.get_analysis(doc_id)
+
+    doc_id, other, stored, without_content, by_user, by_agent, deleted, gone = with_db(tmp_path, main)
+    assert stored["timestamp"] == datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+    assert (stored["agent"], stored["analysis_type"], stored["page_title"]) == ("risk", "upload", "Terms")
+    assert (stored["page_url"], stored["result_text"]) == ("https://example.com/terms", '{"summary": "ok"}')
+    assert (stored["user_id"], stored["metadata"]) == ("user-1", {"model": "gpt", "chunks": 2})
+    assert (stored["page_content"], stored["page_content_chars"]) == (PAGE, len(PAGE))
+    assert "page_content" not in without_content
+    # Projections keep the timestamp the page cursor is built from
+    assert by_user == [{"id": doc_id, "timestamp": stored["timestamp"], "page_title": "Terms",
+                        "page_url": "https://example.com/terms"}]
+    assert [result["id"] for result in by_agent] == [other]
+    assert deleted is True and gone is None
+
+
+def test_shared_page_content_is_stored_once_and_removed_with_its_last_analysis(tmp_path):
+    async def main(db):
+        first = await save(db, "https://example.com/a", PAGE)
+        second = await save(db, "https://example.com/b", PAGE)
+        stored = len(await content_rows(db))
+
+        await db.delete_analysis(first)
+        kept = await db.get_analysis(second)
+        after_first = len(await content_rows(db))
+
+        await db.delete_analysis(second)
+        return stored, kept["page_content"], after_first, len(await content_rows(db))
+
+    stored, content, after_first, after_second = with_db(tmp_path, main)
+    assert (stored, after_first, after_second) == (1, 1, 0)
+    assert content == PAGE
+
+
+def test_cursor_pages_through_every_analysis_once_newest_first(tmp_path):
+    async def main(db):
+        # Two analyses share each timestamp, so pages must break ties by ID
+        for n in range(5):
+            await save(db, f"https://example.com/{n}", timestamp=f"2024-05-0{1 + n // 2}T12:00:00")
+        pages, cursor = [], None
+        while True:
+            results, cursor = await db.list_analyses_page(limit=2, cursor=cursor)
+            pages.append([(result["timestamp"], result["id"]) for result in results])
+            if cursor is None:
+                return pages, await db.list_analyses_page(limit=10)
+
+    pages, (everything, last_cursor) = with_db(tmp_path, main)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    seen = [entry for page in pages for entry in page]
+    assert seen == sorted(seen, reverse=True)
+    assert seen == [(result["timestamp"], result["id"]) for result in everything]
+    # A page that holds the rest has no next cursor
+    assert last_cursor is None
+
+
+def test_exactly_full_last_page_has_no_next_cursor(tmp_path):
+    async def main(db):
+        for n in range(2):
+            await save(db, f"https://example.com/{n}", timestamp=f"2024-05-0{1 + n}T12:00:00")
+        return await db.list_analyses_page(limit=2)
+
+    results, cursor = with_db(tmp_path, main)
+    assert len(results) == 2 and cursor is None
+
+
+def test_invalid_cursor_is_rejected(tmp_path):
+    async def main(db):
+        await save(db, "https://example.com/a")
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            await db.list_analyses_page(cursor="not-a-cursor")
+
+    with_db(tmp_path, main)
+
+
+def test_csv_migration_imports_rows_once(tmp_path):
+    path = tmp_path / "analysis_data.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(config.HEADERS)
+        writer.writerow(["2024-05-01T12:00:00", "summary", "url", "Terms", "https://example.com/a", '{"a": 1}'])
+        writer.writerow(["2024-05-02T12:00:00", "risk", "upload", "Privacy, \"v2\"", "", "line one\nline two"])
+        writer.writerow(["", "", "", "", "", ""])
+    db_path = str(tmp_path / "analyses.db")
+
+    # Importing the same file twice doesn't duplicate rows
+    assert asyncio.run(migrate(db_path, [str(path)])) == 0
+    assert asyncio.run(migrate(db_path, [str(path)])) == 0
+
+    async def main(db):
+        return await db.list_analyses()
+
+    results = with_db(tmp_path, main)
+    assert [(result["agent"], result["page_title"]) for result in results] == [
+        ("risk", 'Privacy, "v2"'), ("summary", "Terms"),
+    ]
+    assert results[0]["result_text"] == "line one\nline two"
+    assert all(result["id"].startswith("csv-") for result in results)
@@ -0,0 +1,57 @@
+from text_normalize import normalize_text, TextNormalizer
+
+
+def paginated(pages):
+    return '\f'.join(pages)
+
+
+def test_repeated_short_lines_inside_pages_are_kept():
+    text = "(a) first\n(a)\n(a)\n(a)\n$10\n$10\n$10\n12\n2024\nFee schedule"
+    for strip in (True, False):
+        assert normalize_text(text, strip_boilerplate=strip).split('\n') == text.split('\n')
+
+
+def test_running_headers_and_page_numbers_are_stripped_at_page_edges():
+    text = paginated([
+        "ACME Terms of Service\n1. Fees\n$10 per month\nPage 1 of 3",
+        "ACME Terms of Service\n2. Term\n12\nthe term is 12 months\n2",
+        "ACME Terms of Service\n3. Law\n2024\n- 3 -",
+    ])
+    assert normalize_text(text).split('\n') == [
+        "ACME Terms of Service", "1. Fees", "$10 per month",
+        "2. Term", "12", "the term is 12 months",
+        "3. Law", "2024",
+    ]
+
+
+def test_without_stripping_page_breaks_are_line_breaks():
+    text = paginated(["Header\nbody one\n1", "Header\nbody two\n2"])
+    assert normalize_text(text, strip_boilerplate=False).split('\n') == [
+        "Header", "body one", "1", "Header", "body two", "2",
+    ]
+
+
+def test_chunked_feed_matches_whole_text():
+    text = paginated([
+        "ACME\r\n1. Fees\t\u200bapply  now    or\u00a0never\r\n\r\n\r\n  Page 1",
+        "ACME\r\n(a) one\r\n(a) one\r\n2",
+    ] * 5)
+    expected = normalize_text(text)
+    for size in (1, 2, 3, 7, 64):
+        normalizer = TextNormalizer()
+        chunks = [normalizer.feed(text[i:i + size]) for i in range(0, len(text), size)]
+        assert ''.join(chunks) + normalizer.finish() == expected
+
+
+def test_only_runs_of_three_or_more_spaces_collapse():
+    text = "1. Fees\n  (a) indented  twice\n      (b) deep\tand\u00a0\u00a0nbsp   \n\n\n\nend"
+    assert normalize_text(text, strip_boilerplate=False).split('\n') == [
+        "1. Fees", "  (a) indented  twice", " (b) deep and\u00a0\u00a0nbsp", "", "end",
+    ]
+
+
+def test_scraped_text_collapses_all_whitespace():
+    text = "  Menu \u00a0 Home\n\t(a)  indented"
+    assert normalize_text(text, strip_boilerplate=False, collapse_whitespace=True).split('\n') == [
+        "Menu Home", "(a) indented",
+    ]
@@ -0,0 +1,169 @@
+"""
+Text normalization for ClauseCode AI
+One pass over the lines of uploaded, scraped or pasted text: unifies line
+breaks, removes invisible Unicode, collapses runs of 3+ spaces (tabs become
+spaces, indentation and NBSP survive; scraped HTML can collapse all
+whitespace instead) and keeps at most one blank line between paragraphs. For paginated text (pages separated by
+form feeds, as PDF extraction produces) it can also strip page furniture:
+page numbers and running headers/footers at the top or bottom of a page.
+Nothing else is ever deleted. Works on the whole text or incrementally on
+chunks, and has no server/config imports so extraction workers can use it too.
+"""
+import re
+from typing import Dict, List
+
+# Zero-width characters, bidi controls, word joiners, BOM and soft hyphens
+# (a character class is ~10x faster than str.translate with a dict here)
+_INVISIBLE_RE = re.compile('[\u200b-\u200f\u202a-\u202e\u2060-\u2064\ufeff\u00ad]')
+# Runs of 3+ spaces (a literal prefix lets re skip ahead: ~6x faster than ' {3,}')
+_SPACE_RUN_RE = re.compile('   +')
+# Everything str.splitlines() breaks on
+_LINE_BREAKS = frozenset('\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029')
+# Separates pages (extractors join PDF pages with it)
+PAGE_BREAK = '\f'
+# "12", "Page 3", "Page 3 of 20", "3 / 20", "- 7 -"
+_PAGE_NUMBER_START = frozenset('0123456789pP-')
+_PAGE_NUMBER_RE = re.compile(r'(?:page\s*)?\d{1,4}(?:\s*(?:of|/)\s*\d{1,4})?|-\s*\d{1,4}\s*-', re.IGNORECASE)
+
+# Lines up to this long at a page edge are running header/footer candidates
+BOILERPLATE_MAX_CHARS = 80
+# ...and are dropped once they have been at a page edge this many times
+BOILERPLATE_MAX_REPEATS = 1
+# Furniture is looked for this many lines deep at the top and bottom of a page
+PAGE_EDGE_LINES = 2
+
+
+class TextNormalizer:
+    """
+    Incremental normalizer: feed() chunks in order and concatenate what it
+    returns, then finish(). The result is the same however the text is split.
+
+    With strip_boilerplate, page furniture is removed from the edges of each
+    page (pages end at a form feed, or at finish()); a page's lines are held
+    back until the page is complete. With collapse_whitespace, every run of
+    whitespace (NBSP and indentation included) becomes one space and lines
+    are stripped, as scraped HTML needs.
+    """
+
+    def __init__(self, strip_boilerplate: bool = True, max_repeats: int = BOILERPLATE_MAX_REPEATS,
+                 collapse_whitespace: bool = False):
+        self.strip_boilerplate = strip_boilerplate
+        self.max_repeats = max_repeats
+        self.collapse_whitespace = collapse_whitespace
+        self.partial = ''
+        # Trailing spaces of the last chunk, held back in case the run continues
+        self.spaces = ''
+        self.page: List[str] = []
+        self.edge_seen: Dict[str, int] = {}
+        self.started = False
+        self.blank = False
+
+    def feed(self, chunk: str) -> str:
+        """Normalize the complete lines (or pages) in chunk; an unfinished last line is held back"""
+        if not chunk:
+            return ''
+        text = self.partial + self._clean(chunk)
+        if not text:
+            return ''
+        self.partial = ''
+        *pages, rest = text.split(PAGE_BREAK)
+        parts = []
+        for page in pages:
+            parts.append(self._lines(page.splitlines()))
+            parts.append(self._end_page())
+        lines = rest.splitlines()
+        if rest and rest[-1] == '\r':
+            # May be the first half of a \r\n split across chunks
+            self.partial = lines.pop() + '\r'
+        elif rest and rest[-1] not in _LINE_BREAKS:
+            self.partial = lines.pop()
+        parts.append(self._lines(lines))
+        return ''.join(parts)
+
+    def finish(self) -> str:
+        """Normalize whatever is left (the last page ends here)"""
+        partial, self.partial, self.spaces = self.partial, '', ''
+        return self._lines(partial.splitlines()) + self._end_page()
+
+    def _clean(self, chunk: str) -> str:
+        # Every invisible character is non-ASCII
+        if not chunk.isascii():
+            chunk = _INVISIBLE_RE.sub('', chunk)
+        if self.collapse_whitespace:
+            return chunk
+        chunk = self.spaces + chunk
+        kept = chunk.rstrip(' ')
+        self.spaces = chunk[len(kept):]
+        return _SPACE_RUN_RE.sub(' ', kept).replace('\t', ' ')
+
+    def _lines(self, lines: List[str]) -> str:
+        if self.collapse_whitespace:
+            normalized = [' '.join(raw.split()) for raw in lines]
+        else:
+            normalized = [raw.rstrip(' ') for raw in lines]
+        if self.strip_boilerplate:
+            self.page.extend(normalized)
+            return ''
+        return self._emit(normalized)
+
+    def _end_page(self) -> str:
+        # A page break is a line break; only the page's furniture goes
+        if not self.strip_boilerplate:
+            return ''
+        page, self.page = self.page, []
+        return self._emit(self._strip_furniture(page))
+
+    def _strip_furniture(self, page: List[str]) -> List[str]:
+        """Drop page numbers and repeated headers/footers from the top and bottom of a page"""
+        edges = (_edge(page, range(len(page))), _edge(page, range(len(page) - 1, -1, -1)))
+        # Each edge line counts once per page
+        for line in {page[index].strip() for edge in edges for index in edge}:
+            self.edge_seen[line] = self.edge_seen.get(line, 0) + 1
+        dropped = set()
+        for edge in edges:
+            for position, index in enumerate(edge):
+                if index in dropped or not self._is_furniture(page[index].strip(), outermost=position == 0):
+                    break
+                dropped.add(index)
+        if not dropped:
+            return page
+        return [line for index, line in enumerate(page) if index not in dropped]
+
+    def _is_furniture(self, line: str, outermost: bool) -> bool:
+        if not line or len(line) > BOILERPLATE_MAX_CHARS:
+            return False
+        if outermost and line[0] in _PAGE_NUMBER_START and _PAGE_NUMBER_RE.fullmatch(line):
+            return True
+        return self.edge_seen[line] > self.max_repeats
+
+    def _emit(self, lines: List[str]) -> str:
+        parts: List[str] = []
+        for line in lines:
+            if not line:
+                self.blank = self.started
+                continue
+            if self.started:
+                parts.append('\n\n' if self.blank else '\n')
+            parts.append(line)
+            self.started = True
+            self.blank = False
+        return ''.join(parts)
+
+
+def _edge(page: List[str], indexes: range) -> List[int]:
+    """The first PAGE_EDGE_LINES non-blank line indexes of page, in the order of indexes"""
+    edge = []
+    for index in indexes:
+        if page[index]:
+            edge.append(index)
+            if len(edge) == PAGE_EDGE_LINES:
+                break
+    return edge
+
+
+def normalize_text(text: str, strip_boilerplate: bool = True, collapse_whitespace: bool = False) -> str:
+    """Normalize a whole text in one pass (see TextNormalizer)"""
+    if not text:
+        return text
+    normalizer = TextNormalizer(strip_boilerplate=strip_boilerplate, collapse_whitespace=collapse_whitespace)
+    return normalizer.feed(text) + normalizer.finish()
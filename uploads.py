@@ -0,0 +1,248 @@
+"""
+Streaming upload handling for ClauseCode AI
+Parses multipart/form-data bodies incrementally as Sanic receives them and
+spools the uploaded file to memory (small files) or a temp file on disk, with
+the maximum size enforced while the upload is still arriving
+"""
+import os
+import re
+import hashlib
+import tempfile
+import logging
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+_BOUNDARY_RE = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+_FILENAME_RE = re.compile(r'filename="([^"]*)"', re.IGNORECASE)
+_NAME_RE = re.compile(r'(?<![\w*])name="([^"]*)"', re.IGNORECASE)
+
+
+class UploadError(Exception):
+    """Upload rejected; status is the HTTP status to return"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class MultipartStreamParser:
+    """
+    Incremental multipart/form-data parser
+
+    feed() returns events:
+      ("headers", {lowercased header: value})  - a new part starts
+      ("data", bytes)                           - part body bytes
+      ("end",)                                  - the current part is complete
+    """
+
+    def __init__(self, boundary: bytes):
+        self.delimiter = b"--" + boundary
+        self.body_delimiter = b"\r\n" + self.delimiter
+        self.buffer = bytearray()
+        self.state = "preamble"
+
+    def feed(self, chunk: bytes) -> List[Tuple]:
+        self.buffer += chunk
+        events: List[Tuple] = []
+        while True:
+            if self.state == "preamble":
+                index = self.buffer.find(self.delimiter)
+                if index < 0:
+                    # Keep only what could be the start of the delimiter
+                    del self.buffer[:max(0, len(self.buffer) - len(self.delimiter))]
+                    return events
+                del self.buffer[:index + len(self.delimiter)]
+                self.state = "after_delimiter"
+            elif self.state == "after_delimiter":
+                if len(self.buffer) < 2:
+                    return events
+                if self.buffer[:2] == b"--":
+                    self.state = "epilogue"
+                    continue
+                index = self.buffer.find(b"\r\n")
+                if index < 0:
+                    return events
+                del self.buffer[:index + 2]
+                self.state = "headers"
+            elif self.state == "headers":
+                index = self.buffer.find(b"\r\n\r\n")
+                if index < 0:
+                    return events
+                headers = {}
+                for line in bytes(self.buffer[:index]).decode("utf-8", "replace").split("\r\n"):
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                del self.buffer[:index + 4]
+                events.append(("headers", headers))
+                self.state = "body"
+            elif self.state == "body":
+                index = self.buffer.find(self.body_delimiter)
+                if index < 0:
+                    keep = len(self.body_delimiter) - 1
+                    if len(self.buffer) > keep:
+                        events.append(("data", bytes(self.buffer[:-keep])))
+                        del self.buffer[:-keep]
+                    return events
+                if index:
+                    events.append(("data", bytes(self.buffer[:index])))
+                events.append(("end",))
+                del self.buffer[:index + len(self.body_delimiter)]
+                self.state = "after_delimiter"
+            else:  # epilogue
+                self.buffer.clear()
+                return events
+
+
+class UploadBuffer:
+    """
+    Receives an uploaded file in memory and rolls over to a temp file on disk
+    once it grows past spool_bytes
+
+    source() gives extractors either the bytes (small files) or the temp file
+    path (large files), so large uploads are never held or copied in RAM.
+    The SHA-256 digest is computed as the data arrives.
+    """
+
+    def __init__(self, spool_bytes: int, tmp_dir: Optional[str] = None):
+        self.spool_bytes = spool_bytes
+        self.tmp_dir = tmp_dir or None
+        self.memory: Optional[BytesIO] = BytesIO()
+        self.file = None
+        self.path: Optional[str] = None
+        self.size = 0
+        self.hasher = hashlib.sha256()
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        self.hasher.update(data)
+        if self.memory is not None and self.memory.tell() + len(data) > self.spool_bytes:
+            self._rollover()
+        if self.memory is not None:
+            self.memory.write(data)
+        else:
+            self.file.write(data)
+
+    def _rollover(self):
+        handle, self.path = tempfile.mkstemp(prefix="upload-", suffix=".bin", dir=self.tmp_dir)
+        self.file = os.fdopen(handle, "wb")
+        self.file.write(self.memory.getbuffer())
+        self.memory = None
+
+    def finish(self):
+        if self.file is not None:
+            self.file.close()
+
+    def source(self) -> Union[bytes, str]:
+        """bytes for in-memory uploads, or the temp file path for spooled ones"""
+        if self.memory is not None:
+            return self.memory.getvalue()
+        return self.path
+
+    @property
+    def digest(self) -> str:
+        """Hex SHA-256 of everything written so far"""
+        return self.hasher.hexdigest()
+
+    @property
+    def on_disk(self) -> bool:
+        return self.path is not None
+
+    def close(self):
+        """Release memory and delete the temp file"""
+        if self.file is not None and not self.file.closed:
+            self.file.close()
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+        self.memory = None
+
+
+class ReceivedUpload:
+    """The uploaded file from a multipart request"""
+
+    def __init__(self, field_name: str, filename: str, buffer: UploadBuffer):
+        self.field_name = field_name
+        self.filename = filename
+        self.buffer = buffer
+
+    @property
+    def size(self) -> int:
+        return self.buffer.size
+
+    @property
+    def digest(self) -> str:
+        return self.buffer.digest
+
+    def source(self) -> Union[bytes, str]:
+        return self.buffer.source()
+
+    def close(self):
+        self.buffer.close()
+
+
+def _part_names(headers: Dict[str, str]) -> Tuple[Optional[str], Optional[str]]:
+    disposition = headers.get("content-disposition", "")
+    name = _NAME_RE.search(disposition)
+    filename = _FILENAME_RE.search(disposition)
+    return (name.group(1) if name else None, filename.group(1) if filename else None)
+
+
+async def receive_upload(request, field_name: str, max_bytes: int, spool_bytes: int,
+                         tmp_dir: Optional[str] = None) -> ReceivedUpload:
+    """
+    Stream a multipart request body (route declared with stream=True) and
+    spool the file in field_name, enforcing max_bytes as data arrives
+
+    Raises: UploadError (400 for malformed/missing file, 413 if too large)
+    """
+    content_type = request.headers.get("content-type", "")
+    match = _BOUNDARY_RE.search(content_type)
+    if "multipart/form-data" not in content_type.lower() or not match:
+        raise UploadError("Expected a multipart/form-data upload")
+
+    limit_message = f"File is too large. Maximum size is {max_bytes // (1024 * 1024)} MB."
+    content_length = request.headers.get("content-length")
+    # Allow some room for multipart headers and other form fields
+    if content_length and content_length.isdigit() and max_bytes and int(content_length) > max_bytes + 64 * 1024:
+        raise UploadError(limit_message, status=413)
+
+    parser = MultipartStreamParser(match.group(1).encode("latin-1"))
+    upload: Optional[ReceivedUpload] = None
+    current: Optional[UploadBuffer] = None
+    try:
+        while True:
+            chunk = await request.stream.read()
+            if chunk is None:
+                break
+            for event in parser.feed(chunk):
+                kind = event[0]
+                if kind == "headers":
+                    name, filename = _part_names(event[1])
+                    if upload is None and name == field_name and filename is not None:
+                        current = UploadBuffer(spool_bytes, tmp_dir)
+                        upload = ReceivedUpload(name, filename, current)
+                elif kind == "data" and current is not None:
+                    current.write(event[1])
+                    if max_bytes and current.size > max_bytes:
+                        raise UploadError(limit_message, status=413)
+                elif kind == "end" and current is not None:
+                    current.finish()
+                    current = None
+    except BaseException:
+        if upload is not None:
+            upload.close()
+        raise
+
+    if upload is None:
+        raise UploadError("No file in request")
+    if current is not None:
+        upload.close()
+        raise UploadError("Upload was incomplete")
+    return upload
+